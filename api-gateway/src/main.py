@@ -1,10 +1,12 @@
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 import os
 from .database import engine, Base
 from .routes import camera_routes, pipeline_routes, event_routes, identity_routes, auth_routes
 from .websockets.handler import router as websocket_router
+from .metrics import alert_latency
 
 # Cria as tabelas no banco de dados, se ainda não existirem
 Base.metadata.create_all(bind=engine)
@@ -45,4 +47,11 @@ app.include_router(websocket_router)
 @app.get("/api/health", tags=["Health"])
 def health_check():
     """ Endpoint simples para verificar se a API está online. """
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+# --- Métricas (Prometheus) ---
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """ Histogramas de latência ponta a ponta dos alertas (captura -> broadcast). """
+    return alert_latency.render()
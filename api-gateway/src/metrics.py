@@ -0,0 +1,58 @@
+import threading
+from typing import Dict, List, Tuple
+
+# Buckets (segundos) dos histogramas de latência ponta a ponta; iguais aos do frame-processing
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class LatencyHistograms:
+    """
+    Histogramas de latência por câmera e trecho, no formato texto do Prometheus.
+
+    Alimentado pelo listener de eventos do websocket: cada alerta traz as marcas
+    de tempo dos estágios do frame (captura, detecção, gravação...), e o trecho
+    'capture_to_alert' mede da captura até o broadcast aos clientes.
+    """
+    def __init__(self, name: str, help_text: str, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        self.lock = threading.Lock()
+        # (câmera, trecho) -> [contagens por bucket, total de observações, soma]
+        self.series: Dict[Tuple[str, str], list] = {}
+
+    def observe(self, camera_name: str, span: str, seconds: float):
+        seconds = max(seconds, 0.0)
+        with self.lock:
+            entry = self.series.get((camera_name, span))
+            if entry is None:
+                entry = self.series[(camera_name, span)] = [[0] * len(self.buckets), 0, 0.0]
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += 1
+            entry[2] += seconds
+
+    def render(self) -> str:
+        lines: List[str] = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            snapshot = [(key, list(entry[0]), entry[1], entry[2]) for key, entry in self.series.items()]
+        for (camera_name, span), bucket_counts, count, total in snapshot:
+            camera_label = camera_name.replace('\\', '\\\\').replace('"', '\\"')
+            labels = f'camera="{camera_label}",span="{span}"'
+            running = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                running += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {running}')
+            lines.append(f'{self.name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+# Os carimbos de tempo vêm de hosts diferentes (ingestão, processamento): assume relógios sincronizados
+alert_latency = LatencyHistograms(
+    'alert_latency_seconds',
+    'Latência dos alertas por trecho (capture_to_detect, capture_to_stored, capture_to_alert)'
+)
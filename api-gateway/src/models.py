@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, JSON, DateTime, ForeignKey, Text, Float
 from pgvector.sqlalchemy import VECTOR
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -11,6 +11,11 @@ class Camera(Base):
     name = Column(String, unique=True, nullable=False)
     rtsp_url = Column(Text, nullable=False)
     is_active = Column(Boolean, default=True)
+    # Limites de publicação aplicados pelo camera-ingestion-service antes do encode
+    max_fps = Column(Float, nullable=False, default=10.0, server_default="10")
+    max_width = Column(Integer, nullable=True)
+    max_height = Column(Integer, nullable=True)
+    jpeg_quality = Column(Integer, nullable=False, default=80, server_default="80")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
@@ -19,6 +24,8 @@ class Pipeline(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, unique=True, nullable=False)
     graph_data = Column(JSON, nullable=False)
+    # Extraída do nó videoInput ao salvar (get_camera_name_from_graph), para busca indexada
+    camera_name = Column(String, index=True, nullable=True)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
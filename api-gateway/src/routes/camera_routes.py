@@ -1,14 +1,17 @@
 import io
+import json
+import hashlib
 import cv2
-from fastapi import APIRouter, Depends, HTTPException, Response
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from .. import models
 from ..auth import auth
 from ..database import get_db
-from pydantic import BaseModel
+from ..websockets.handler import RabbitMQManager, get_rabbit_manager
+from pydantic import BaseModel, Field
 
 router = APIRouter(
     prefix="/api/cameras",
@@ -20,6 +23,11 @@ class CameraBase(BaseModel):
     name: str
     rtsp_url: str
     is_active: bool = True
+    # Limites aplicados pela ingestão antes de codificar e publicar cada frame
+    max_fps: float = Field(10.0, gt=0, le=60)
+    max_width: Optional[int] = Field(None, ge=16)
+    max_height: Optional[int] = Field(None, ge=16)
+    jpeg_quality: int = Field(80, ge=1, le=100)
 
 class CameraCreate(CameraBase):
     pass
@@ -32,14 +40,29 @@ class CameraResponse(CameraBase):
 class TestCameraPayload(BaseModel):
     rtsp_url: str
 
+def serialize_camera(db_camera) -> dict:
+    """ Mesmo formato do GET /api/cameras, usado também nos eventos camera.* """
+    return CameraResponse.model_validate(db_camera).model_dump(mode='json')
+
 # --- Endpoints ---
 @router.get("", response_model=List[CameraResponse], dependencies=[Depends(auth.get_current_user)])
-def get_all_cameras(db: Session = Depends(get_db)):
+def get_all_cameras(request: Request, response: Response, db: Session = Depends(get_db)):
     cameras = db.query(models.Camera).order_by(models.Camera.name).all()
-    return cameras
+    payload = [serialize_camera(camera) for camera in cameras]
+
+    # ETag permite que o polling da ingestão receba 304 quando nada mudou
+    etag = '"' + hashlib.sha1(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest() + '"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return payload
 
 @router.post("", status_code=201, response_model=CameraResponse, dependencies=[Depends(auth.get_current_admin_user)])
-def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
+async def create_camera(
+    camera: CameraCreate,
+    db: Session = Depends(get_db),
+    rabbit: RabbitMQManager = Depends(get_rabbit_manager)
+):
     db_camera = models.Camera(**camera.dict())
     db.add(db_camera)
     try:
@@ -48,15 +71,51 @@ def create_camera(camera: CameraCreate, db: Session = Depends(get_db)):
     except Exception:
         db.rollback()
         raise HTTPException(status_code=409, detail="Câmera com este nome já existe.")
+
+    await rabbit.publish_camera_event('created', serialize_camera(db_camera))
+    return db_camera
+
+@router.put("/{camera_id}", response_model=CameraResponse, dependencies=[Depends(auth.get_current_admin_user)])
+async def update_camera(
+    camera_id: int,
+    camera_update: CameraCreate,
+    db: Session = Depends(get_db),
+    rabbit: RabbitMQManager = Depends(get_rabbit_manager)
+):
+    db_camera = db.query(models.Camera).filter(models.Camera.id == camera_id).first()
+    if not db_camera:
+        raise HTTPException(status_code=404, detail="Câmera não encontrada.")
+
+    previous_name = db_camera.name
+    for key, value in camera_update.model_dump().items():
+        setattr(db_camera, key, value)
+    try:
+        db.commit()
+        db.refresh(db_camera)
+    except Exception:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Câmera com este nome já existe.")
+
+    event = serialize_camera(db_camera)
+    if previous_name != db_camera.name:
+        event['previous_name'] = previous_name
+    await rabbit.publish_camera_event('updated', event)
     return db_camera
 
 @router.delete("/{camera_id}", status_code=204, dependencies=[Depends(auth.get_current_admin_user)])
-def delete_camera(camera_id: int, db: Session = Depends(get_db)):
+async def delete_camera(
+    camera_id: int,
+    db: Session = Depends(get_db),
+    rabbit: RabbitMQManager = Depends(get_rabbit_manager)
+):
     db_camera = db.query(models.Camera).filter(models.Camera.id == camera_id).first()
     if not db_camera:
         raise HTTPException(status_code=404, detail="Câmera não encontrada.")
+    camera_name = db_camera.name
     db.delete(db_camera)
     db.commit()
+
+    await rabbit.publish_camera_event('deleted', {'name': camera_name})
     return Response(status_code=204)
 
 @router.post("/test", dependencies=[Depends(auth.get_current_admin_user)])
@@ -2,7 +2,6 @@
 
 from fastapi import APIRouter, Depends, HTTPException, Response, Query
 from sqlalchemy.orm import Session
-from sqlalchemy.sql import expression
 from typing import List, Dict, Any, Optional
 from pydantic import BaseModel
 
@@ -37,6 +36,7 @@ class PipelineCreate(PipelineBase):
 
 class PipelineResponse(PipelineBase):
     id: int
+    camera_name: Optional[str] = None
     class Config:
         from_attributes = True
 
@@ -50,12 +50,13 @@ async def create_pipeline(
     rabbit: RabbitMQManager = Depends(get_rabbit_manager)
 ):
     db_pipeline = models.Pipeline(**pipeline.dict())
+    db_pipeline.camera_name = get_camera_name_from_graph(pipeline.graph_data)
     db.add(db_pipeline)
     db.commit()
     db.refresh(db_pipeline)
     
     # Notificação Inteligente com 'await'
-    camera_name = get_camera_name_from_graph(db_pipeline.graph_data)
+    camera_name = db_pipeline.camera_name
     if camera_name:
         await rabbit.publish_config_update(camera_name)
         
@@ -70,13 +71,29 @@ def get_pipelines(
 ):
     query = db.query(models.Pipeline)
     if camera_name:
+        # Busca pelo índice de pipelines.camera_name
         query = query.filter(
-            models.Pipeline.is_active == True,
-            expression.cast(models.Pipeline.graph_data, models.JSONB)['nodes'].astext.like(f'%{{"camera_name": "{camera_name}"%')
+            models.Pipeline.camera_name == camera_name,
+            models.Pipeline.is_active == True
         )
     pipelines = query.order_by(models.Pipeline.name).all()
     return pipelines
 
+# Declarada antes de /{pipeline_id} para não ser capturada por ela
+@router.get("/active-by-camera", response_model=Dict[str, List[PipelineResponse]], dependencies=[Depends(auth.get_current_user)])
+def get_active_pipelines_by_camera(db: Session = Depends(get_db)):
+    """ Todos os pipelines ativos agrupados por câmera, para o pré-carregamento dos workers. """
+    pipelines = (
+        db.query(models.Pipeline)
+        .filter(models.Pipeline.is_active == True, models.Pipeline.camera_name.isnot(None))
+        .order_by(models.Pipeline.camera_name, models.Pipeline.name)
+        .all()
+    )
+    by_camera: Dict[str, List[models.Pipeline]] = {}
+    for pipeline in pipelines:
+        by_camera.setdefault(pipeline.camera_name, []).append(pipeline)
+    return by_camera
+
 @router.get("/{pipeline_id}", response_model=PipelineResponse, dependencies=[Depends(auth.get_current_user)])
 def get_pipeline_by_id(pipeline_id: int, db: Session = Depends(get_db)):
     pipeline = db.query(models.Pipeline).filter(models.Pipeline.id == pipeline_id).first()
@@ -95,18 +112,19 @@ async def update_pipeline(
     if not db_pipeline:
         raise HTTPException(status_code=404, detail="Pipeline não encontrado.")
     
-    old_camera_name = get_camera_name_from_graph(db_pipeline.graph_data)
+    old_camera_name = db_pipeline.camera_name or get_camera_name_from_graph(db_pipeline.graph_data)
 
     # Atualiza os dados
     update_data = pipeline_update.model_dump()
     for key, value in update_data.items():
         setattr(db_pipeline, key, value)
+    db_pipeline.camera_name = get_camera_name_from_graph(pipeline_update.graph_data)
         
     db.commit()
     db.refresh(db_pipeline)
     
     # Notificação Inteligente com 'await'
-    new_camera_name = get_camera_name_from_graph(db_pipeline.graph_data)
+    new_camera_name = db_pipeline.camera_name
     if new_camera_name:
         await rabbit.publish_config_update(new_camera_name)
     if old_camera_name and old_camera_name != new_camera_name:
@@ -124,7 +142,7 @@ async def delete_pipeline(
     if not db_pipeline:
         raise HTTPException(status_code=404, detail="Pipeline não encontrado.")
     
-    camera_name = get_camera_name_from_graph(db_pipeline.graph_data)
+    camera_name = db_pipeline.camera_name or get_camera_name_from_graph(db_pipeline.graph_data)
 
     db.delete(db_pipeline)
     db.commit()
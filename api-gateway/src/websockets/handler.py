@@ -1,10 +1,13 @@
 import asyncio
+import json
 import logging
 import os
+import time
 from typing import List
 from fastapi import WebSocket, WebSocketDisconnect, APIRouter, Depends, Query
 from .. import auth, models
 from ..database import get_db
+from ..metrics import alert_latency
 from sqlalchemy.orm import Session
 import aio_pika
 
@@ -26,6 +29,7 @@ class RabbitMQManager:
         self.active_connections: List[WebSocket] = []
         self.connection: aio_pika.Connection = None
         self.channel: aio_pika.Channel = None
+        self.config_exchange: aio_pika.Exchange = None
 
     async def connect_to_rabbitmq(self, loop):
         # ... (seu método aqui)
@@ -33,7 +37,9 @@ class RabbitMQManager:
             try:
                 self.connection = await aio_pika.connect_robust(RABBITMQ_URL, loop=loop)
                 self.channel = await self.connection.channel()
-                await self.channel.declare_exchange(CONFIG_EXCHANGE_NAME, aio_pika.ExchangeType.TOPIC, durable=False)
+                self.config_exchange = await self.channel.declare_exchange(
+                    CONFIG_EXCHANGE_NAME, aio_pika.ExchangeType.TOPIC, durable=False
+                )
                 logger.info("Conectado ao RabbitMQ com sucesso.")
                 return
             except aio_pika.exceptions.AMQPConnectionError as e:
@@ -51,9 +57,32 @@ class RabbitMQManager:
         async with self.connection:
             async for message in queue:
                 async with message.process():
-                    body = message.body.decode()
+                    body = self._record_alert_latency(message.body.decode())
                     await self.broadcast(body)
 
+    def _record_alert_latency(self, body: str) -> str:
+        """
+        Marca o instante do broadcast nos estágios do evento e alimenta os
+        histogramas de latência (captura -> detecção / gravação / alerta).
+        Mensagens sem rastreamento passam inalteradas.
+        """
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return body
+        stages = payload.get('stages') if isinstance(payload, dict) else None
+        if not isinstance(stages, dict) or 'captured' not in stages:
+            return body
+
+        stages['broadcast'] = time.time()
+        camera_name = str(payload.get('camera_name', ''))
+        captured = stages['captured']
+        for span, stage in (('capture_to_detect', 'detected'), ('capture_to_stored', 'event_stored'),
+                            ('capture_to_alert', 'broadcast')):
+            if stage in stages:
+                alert_latency.observe(camera_name, span, stages[stage] - captured)
+        return json.dumps(payload)
+
     async def connect_websocket(self, websocket: WebSocket):
         await websocket.accept()
         self.active_connections.append(websocket)
@@ -77,23 +106,31 @@ class RabbitMQManager:
                 pass
         self.active_connections = living_connections
     
-    async def publish_config_update(self, camera_name: str):
-        # ... (seu método aqui)
-        if not self.channel:
-            logger.error("Não é possível publicar a atualização de configuração: canal do RabbitMQ indisponível.")
-            return
-            
+    async def _publish_config_event(self, routing_key: str, body: bytes) -> bool:
+        """ Publica um evento no exchange de configuração (tópico 'config_events'). """
+        if not self.config_exchange:
+            logger.error(f"Não é possível publicar '{routing_key}': canal do RabbitMQ indisponível.")
+            return False
+
         try:
-            routing_key = 'pipeline.updated'
-            message = camera_name.encode('utf-8')
-            
-            await self.channel.default_exchange.publish(
-                aio_pika.Message(body=message),
-                routing_key=routing_key
-            )
-            logger.info(f"Notificação de atualização enviada para a câmera '{camera_name}'")
+            await self.config_exchange.publish(aio_pika.Message(body=body), routing_key=routing_key)
+            return True
         except Exception as e:
-            logger.error(f"Falha ao publicar mensagem de atualização de configuração: {e}")
+            logger.error(f"Falha ao publicar evento de configuração '{routing_key}': {e}")
+            return False
+
+    async def publish_config_update(self, camera_name: str):
+        if await self._publish_config_event('pipeline.updated', camera_name.encode('utf-8')):
+            logger.info(f"Notificação de atualização enviada para a câmera '{camera_name}'")
+
+    async def publish_camera_event(self, event: str, camera: dict):
+        """
+        Publica 'camera.created', 'camera.updated' ou 'camera.deleted' com a
+        configuração da câmera em JSON, para que a ingestão reaja sem esperar o polling.
+        """
+        body = json.dumps(camera, default=str).encode('utf-8')
+        if await self._publish_config_event(f'camera.{event}', body):
+            logger.info(f"Evento 'camera.{event}' publicado para a câmera '{camera.get('name')}'")
 
 
 # --- Instância Global e Injeção de Dependência ---
@@ -0,0 +1,76 @@
+import json
+import time
+import logging
+import threading
+import pika
+
+CONFIG_EXCHANGE = 'config_events'
+
+
+class CameraEventListener:
+    """
+    Assina os eventos camera.created / camera.updated / camera.deleted publicados
+    pelo api-gateway no exchange 'config_events' e repassa cada um para `on_event`.
+
+    Roda em uma thread própria com conexão própria (conexões pika não são
+    thread-safe) e reconecta sozinho. Eventos perdidos enquanto a conexão estava
+    caída são cobertos por `on_connected` e pelo polling periódico da API.
+    """
+    def __init__(self, rabbit_connection_params, on_event, on_connected=None, reconnect_delay=5):
+        self.rabbit_connection_params = rabbit_connection_params
+        self.on_event = on_event
+        self.on_connected = on_connected
+        self.reconnect_delay = reconnect_delay
+        self.running = False
+
+    def start(self):
+        self.running = True
+        threading.Thread(target=self._run, name="camera-events", daemon=True).start()
+
+    def _on_message(self, ch, method, properties, body):
+        event = method.routing_key.split('.', 1)[-1]
+        try:
+            camera = json.loads(body)
+        except ValueError:
+            logging.error(f"Invalid camera event payload on '{method.routing_key}': {body[:200]!r}")
+            return
+        if not isinstance(camera, dict) or 'name' not in camera:
+            logging.error(f"Camera event '{method.routing_key}' without a camera name: {body[:200]!r}")
+            return
+        try:
+            self.on_event(event, camera)
+        except Exception as e:
+            logging.error(f"Failed to apply camera event '{method.routing_key}': {e}", exc_info=True)
+
+    def _run(self):
+        while self.running:
+            connection = None
+            try:
+                connection = pika.BlockingConnection(self.rabbit_connection_params)
+                channel = connection.channel()
+                channel.exchange_declare(exchange=CONFIG_EXCHANGE, exchange_type='topic')
+                queue_name = channel.queue_declare(queue='', exclusive=True).method.queue
+                channel.queue_bind(exchange=CONFIG_EXCHANGE, queue=queue_name, routing_key='camera.*')
+                channel.basic_consume(queue=queue_name, on_message_callback=self._on_message, auto_ack=True)
+                logging.info("Listening for camera configuration events")
+                if self.on_connected:
+                    # Permite ressincronizar o que pode ter mudado enquanto estava desconectado
+                    self.on_connected()
+
+                while self.running:
+                    connection.process_data_events(time_limit=1)
+            except pika.exceptions.AMQPError as e:
+                logging.warning(f"Camera event listener lost RabbitMQ connection: {e}. "
+                                f"Retrying in {self.reconnect_delay} seconds...")
+                time.sleep(self.reconnect_delay)
+            except Exception as e:
+                # A thread não pode morrer: sem ela a sincronização fica só no polling
+                logging.error(f"Unexpected error in camera event listener: {e}. "
+                              f"Restarting in {self.reconnect_delay} seconds...", exc_info=True)
+                time.sleep(self.reconnect_delay)
+            finally:
+                if connection and connection.is_open:
+                    connection.close()
+
+    def stop(self):
+        self.running = False
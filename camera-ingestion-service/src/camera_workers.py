@@ -0,0 +1,227 @@
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+
+# Resolução assumida para câmeras sem max_width/max_height ao estimar a carga
+_NATIVE_PIXELS = 1920 * 1080
+
+
+def camera_load(config):
+    """Estimativa relativa do custo de uma câmera (frames/s x megapixels publicados)."""
+    fps = float(config.get('max_fps') or 10)
+    width = config.get('max_width')
+    height = config.get('max_height')
+    if width and height:
+        pixels = min(width * height, _NATIVE_PIXELS)
+    elif width or height:
+        pixels = min((width or height) ** 2 * 9 / 16, _NATIVE_PIXELS)
+    else:
+        pixels = _NATIVE_PIXELS
+    return fps * pixels / 1e6
+
+
+def _run_capture(capture_target, config, stop_event, previous=None):
+    """Thread de captura; com `previous`, espera a captura anterior da câmera terminar (ring SHM, conexão)."""
+    if previous is not None:
+        previous.join()
+    capture_target(config, stop_event)
+
+
+def _worker_main(worker_id, capture_target, command_queue, status_queue, heartbeat_interval):
+    """
+    Loop de um processo worker: recebe comandos do supervisor e roda uma thread
+    de captura (capture_target) por câmera atribuída.
+
+    O loop também envia os heartbeats, então nunca espera uma captura terminar:
+    as paradas só são sinalizadas, e capturas que morreram sem pedido de parada
+    (stream caiu, erro inesperado) são reiniciadas.
+    """
+    logging.info(f"Camera worker {worker_id} started (pid {os.getpid()})")
+    running = {}
+    stopping = {}  # camera_name -> thread de captura sinalizada e ainda terminando
+
+    def start(config):
+        name = config['name']
+        stop_event = threading.Event()
+        thread = threading.Thread(target=_run_capture, args=(capture_target, config, stop_event, stopping.get(name)),
+                                  daemon=True)
+        running[name] = {'thread': thread, 'stop_event': stop_event, 'config': config}
+        thread.start()
+
+    while True:
+        try:
+            command, payload = command_queue.get(timeout=heartbeat_interval)
+        except queue.Empty:
+            command, payload = None, None
+
+        if command == 'start' and payload['name'] not in running:
+            start(payload)
+        elif command == 'stop' and payload in running:
+            entry = running.pop(payload)
+            entry['stop_event'].set()
+            stopping[payload] = entry['thread']
+        elif command == 'shutdown':
+            for entry in running.values():
+                entry['stop_event'].set()
+            for thread in [entry['thread'] for entry in running.values()] + list(stopping.values()):
+                thread.join()
+            break
+
+        for name, thread in list(stopping.items()):
+            if not thread.is_alive():
+                del stopping[name]
+        for name, entry in list(running.items()):
+            if not entry['thread'].is_alive() and not entry['stop_event'].is_set():
+                logging.warning(f"Capture thread for {name} exited in worker {worker_id}; restarting it")
+                start(entry['config'])
+
+        status_queue.put({
+            'worker_id': worker_id,
+            'pid': os.getpid(),
+            'time': time.time(),
+            'cameras': {name: entry['thread'].is_alive() for name, entry in running.items()},
+        })
+
+    logging.info(f"Camera worker {worker_id} stopped")
+
+
+class CameraWorkerPool:
+    """
+    Distribui as câmeras entre um conjunto fixo de processos worker, para que o
+    encode e a conversão de frames não fiquem limitados a um único GIL.
+
+    O supervisor atribui cada câmera ao worker com menor carga estimada, recebe
+    heartbeats de saúde dos workers e recria automaticamente os que morrerem ou
+    pararem de responder, reenviando as câmeras que estavam com eles.
+    """
+    def __init__(self, num_workers, capture_target, heartbeat_interval=5.0, heartbeat_timeout=30.0,
+                 health_log_interval=60.0):
+        self.num_workers = num_workers
+        self.capture_target = capture_target
+        self.heartbeat_interval = heartbeat_interval
+        self.heartbeat_timeout = heartbeat_timeout
+        self.health_log_interval = health_log_interval
+
+        # 'spawn' evita herdar locks e threads do supervisor no fork
+        self.context = multiprocessing.get_context('spawn')
+        self.status_queue = self.context.Queue()
+        self.workers = {}
+        self.camera_assignments = {}  # camera_name -> worker_id
+        self.lock = threading.RLock()
+        self.running = False
+
+    def start(self):
+        self.running = True
+        for worker_id in range(self.num_workers):
+            self._spawn_worker(worker_id, cameras={})
+        threading.Thread(target=self._monitor_loop, name="camera-worker-monitor", daemon=True).start()
+        logging.info(f"Camera worker pool started with {self.num_workers} processes")
+
+    def _spawn_worker(self, worker_id, cameras):
+        command_queue = self.context.Queue()
+        process = self.context.Process(
+            target=_worker_main,
+            args=(worker_id, self.capture_target, command_queue, self.status_queue, self.heartbeat_interval),
+            name=f"camera-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        self.workers[worker_id] = {
+            'process': process,
+            'command_queue': command_queue,
+            'cameras': cameras,
+            'last_heartbeat': time.time(),
+            'camera_status': {},
+            'restarts': self.workers.get(worker_id, {}).get('restarts', -1) + 1,
+        }
+        for config in cameras.values():
+            command_queue.put(('start', config))
+
+    def _worker_load(self, worker_id):
+        return sum(camera_load(config) for config in self.workers[worker_id]['cameras'].values())
+
+    def start_camera(self, config):
+        with self.lock:
+            name = config['name']
+            if name in self.camera_assignments:
+                return
+            worker_id = min(self.workers, key=self._worker_load)
+            self.workers[worker_id]['cameras'][name] = config
+            self.camera_assignments[name] = worker_id
+            self.workers[worker_id]['command_queue'].put(('start', config))
+            logging.info(f"Camera {name} assigned to worker {worker_id} "
+                         f"(load {self._worker_load(worker_id):.1f})")
+
+    def stop_camera(self, name):
+        with self.lock:
+            worker_id = self.camera_assignments.pop(name, None)
+            if worker_id is None:
+                return
+            self.workers[worker_id]['cameras'].pop(name, None)
+            self.workers[worker_id]['camera_status'].pop(name, None)
+            self.workers[worker_id]['command_queue'].put(('stop', name))
+
+    def health(self):
+        """Resumo de saúde do pool: por worker, pid, vivo, câmeras e idade do último heartbeat."""
+        now = time.time()
+        with self.lock:
+            return {
+                worker_id: {
+                    'pid': worker['process'].pid,
+                    'alive': worker['process'].is_alive(),
+                    'heartbeat_age': round(now - worker['last_heartbeat'], 1),
+                    'restarts': worker['restarts'],
+                    'load': round(self._worker_load(worker_id), 2),
+                    'cameras': dict(worker['camera_status']) or {name: None for name in worker['cameras']},
+                }
+                for worker_id, worker in self.workers.items()
+            }
+
+    def _drain_status(self):
+        while True:
+            try:
+                status = self.status_queue.get_nowait()
+            except queue.Empty:
+                return
+            worker = self.workers.get(status['worker_id'])
+            if worker and worker['process'].pid == status['pid']:
+                worker['last_heartbeat'] = status['time']
+                worker['camera_status'] = status['cameras']
+
+    def _monitor_loop(self):
+        last_health_log = time.time()
+        while self.running:
+            time.sleep(self.heartbeat_interval)
+            with self.lock:
+                if not self.running:
+                    break
+                self._drain_status()
+                now = time.time()
+                for worker_id, worker in list(self.workers.items()):
+                    process = worker['process']
+                    stale = now - worker['last_heartbeat'] > self.heartbeat_timeout
+                    if process.is_alive() and not stale:
+                        continue
+
+                    reason = 'unresponsive' if process.is_alive() else f"exit code {process.exitcode}"
+                    logging.error(f"Camera worker {worker_id} (pid {process.pid}) is {reason}; "
+                                  f"respawning with {len(worker['cameras'])} cameras")
+                    if process.is_alive():
+                        process.kill()
+                    process.join(timeout=5)
+                    self._spawn_worker(worker_id, worker['cameras'])
+
+            if time.time() - last_health_log >= self.health_log_interval:
+                logging.info(f"Camera worker pool health: {self.health()}")
+                last_health_log = time.time()
+
+    def shutdown(self):
+        with self.lock:
+            self.running = False
+            for worker in self.workers.values():
+                worker['command_queue'].put(('shutdown', None))
+            for worker in self.workers.values():
+                worker['process'].join(timeout=10)
@@ -0,0 +1,96 @@
+import cv2
+import time
+import logging
+import threading
+
+
+class LatestFrameGrabber:
+    """
+    Lê um stream de vídeo em uma thread dedicada, mantendo apenas o frame mais recente.
+
+    A thread leitora chama grab() continuamente para drenar o buffer do OpenCV/FFmpeg,
+    sem decodificar os frames. Só quando o publicador pede um frame (read_latest) o
+    próximo frame capturado é decodificado com retrieve(); frames antigos nunca são
+    decodificados nem publicados, então a latência fica limitada mesmo sob carga.
+    """
+    def __init__(self, url, camera_name, reconnect_delay=5):
+        self.url = url
+        self.camera_name = camera_name
+        self.reconnect_delay = reconnect_delay
+
+        self.cap = None
+        self.condition = threading.Condition()
+        self.frame_requested = False
+        self.frame = None
+        self.frame_time = None
+        self.frames_grabbed = 0
+        self.running = False
+        self.thread = None
+
+    def _open(self):
+        cap = cv2.VideoCapture(self.url)
+        # Nem todos os backends suportam, mas quando suportam reduz o atraso na origem
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        return cap
+
+    def start(self):
+        """Abre o stream e inicia a thread leitora. Retorna False se não foi possível abrir."""
+        self.cap = self._open()
+        if not self.cap.isOpened():
+            self.cap.release()
+            return False
+
+        self.running = True
+        self.thread = threading.Thread(target=self._reader_loop, name=f"grabber-{self.camera_name}", daemon=True)
+        self.thread.start()
+        return True
+
+    def _reader_loop(self):
+        while self.running:
+            if not self.cap.grab():
+                logging.warning(f"Failed to grab frame from {self.camera_name}. Reconnecting in {self.reconnect_delay}s...")
+                self.cap.release()
+                time.sleep(self.reconnect_delay)
+                if self.running:
+                    self.cap = self._open()
+                continue
+
+            grabbed_at = time.time()
+            self.frames_grabbed += 1
+
+            if not self.frame_requested:
+                continue
+
+            ret, frame = self.cap.retrieve()
+            with self.condition:
+                if ret:
+                    self.frame = frame
+                    self.frame_time = grabbed_at
+                    self.frame_requested = False
+                    self.condition.notify_all()
+
+        self.cap.release()
+
+    def read_latest(self, timeout=1.0):
+        """
+        Pede o próximo frame capturado e espera por ele.
+
+        :return: (frame, timestamp de captura), ou (None, None) se nenhum frame
+                 chegou dentro do timeout (ex.: stream reconectando).
+        """
+        with self.condition:
+            self.frame = None
+            self.frame_requested = True
+            self.condition.wait_for(lambda: self.frame is not None or not self.running, timeout=timeout)
+            frame, frame_time = self.frame, self.frame_time
+            self.frame = None
+            if frame is None:
+                self.frame_requested = False
+            return frame, frame_time
+
+    def stop(self):
+        self.running = False
+        with self.condition:
+            self.condition.notify_all()
+        if self.thread:
+            self.thread.join(timeout=self.reconnect_delay + 5)
@@ -0,0 +1,78 @@
+import os
+import json
+import time
+import uuid
+import logging
+
+import cv2
+import pika
+
+from frame_codec import encode_frame_message, CODEC_JPEG, CODEC_RAW_SHM, CONTENT_TYPE, LEGACY_CONTENT_TYPE
+from frame_queues import FRAMES_EXCHANGE, shard_routing_key
+
+# 'binary' (envelope do frame_codec) ou 'json' (formato legado, durante a migração)
+FRAME_FORMAT = os.getenv('FRAME_FORMAT', 'binary').lower()
+DEFAULT_JPEG_QUALITY = int(os.getenv('DEFAULT_JPEG_QUALITY', '80'))
+
+
+def publish_frame(channel, frame, camera_name, sequence=0, ring=None, timestamp=None,
+                  jpeg_quality=DEFAULT_JPEG_QUALITY, metadata=None):
+    """
+    Codifica e publica um frame no exchange de frames (shard da câmera).
+
+    Com `ring`, o frame bruto vai para a memória compartilhada e só o descritor
+    trafega pelo broker. Retorna False se a publicação falhou.
+    """
+    timestamp = timestamp or time.time()
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, int(jpeg_quality)]
+    metadata = dict(metadata) if metadata else {}
+    # Identificador e marcas de tempo por estágio acompanham o frame até o evento
+    # (processamento, banco, websocket) para medir a latência ponta a ponta
+    metadata['frame_id'] = uuid.uuid4().hex
+    height, width = frame.shape[:2]
+
+    # Encode (ou cópia para a memória compartilhada) primeiro: 'published' é marcado
+    # logo antes do basic_publish, e o encode conta como tempo da ingestão, não do broker
+    descriptor = ring.write(frame) if ring else None
+    buffer = None
+    if not descriptor:
+        _, buffer = cv2.imencode('.jpg', frame, encode_params)
+    metadata['stages'] = {'published': time.time()}
+
+    if descriptor:
+        # Só o descritor do slot trafega pelo broker
+        metadata['shm'] = descriptor
+        body = encode_frame_message(
+            camera_name, b'', timestamp,
+            sequence=sequence, codec=CODEC_RAW_SHM, width=width, height=height,
+            metadata=metadata
+        )
+        content_type = CONTENT_TYPE
+    elif FRAME_FORMAT == 'json':
+        body = json.dumps({
+            'camera_name': camera_name,
+            'timestamp': timestamp,
+            'frame': buffer.tobytes().hex(),
+            'frame_id': metadata['frame_id'],
+            'stages': metadata['stages']
+        })
+        content_type = LEGACY_CONTENT_TYPE
+    else:
+        body = encode_frame_message(
+            camera_name, buffer, timestamp,
+            sequence=sequence, codec=CODEC_JPEG, width=width, height=height,
+            metadata=metadata
+        )
+        content_type = CONTENT_TYPE
+
+    try:
+        channel.basic_publish(
+            exchange=FRAMES_EXCHANGE,
+            routing_key=shard_routing_key(camera_name),
+            body=body,
+            properties=pika.BasicProperties(delivery_mode=1, content_type=content_type)
+        )
+        return True
+    except Exception as e:
+        logging.error(f"Failed to publish frame from {camera_name}: {e}")
+        return False
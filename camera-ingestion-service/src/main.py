@@ -7,51 +7,86 @@ import logging
 import threading
 import requests
 
+from frame_publisher import publish_frame, DEFAULT_JPEG_QUALITY
+from shm_transport import SharedFrameRing
+from frame_grabber import LatestFrameGrabber
+from motion_gate import MotionGate
+from camera_workers import CameraWorkerPool
+from camera_events import CameraEventListener
+from frame_queues import declare_frame_topology
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'localhost')
 RABBITMQ_USER = os.getenv('RABBITMQ_USER', 'guest')
 RABBITMQ_PASS = os.getenv('RABBITMQ_PASS', 'guest')
 API_GATEWAY_URL = os.getenv('API_GATEWAY_URL')
+# 'rabbitmq' (JPEG no corpo da mensagem) ou 'shm' (frame bruto em memória compartilhada,
+# apenas quando ingestão e processamento rodam no mesmo host)
+FRAME_TRANSPORT = os.getenv('FRAME_TRANSPORT', 'rabbitmq').lower()
+SHM_RING_SLOTS = int(os.getenv('SHM_RING_SLOTS', '16'))
+SHM_MAX_FRAME_BYTES = int(os.getenv('SHM_MAX_FRAME_BYTES', str(1920 * 1080 * 3)))
+# Taxa de publicação padrão, usada quando a câmera não define max_fps;
+# a leitura do stream roda livre em outra thread
+TARGET_FPS = float(os.getenv('TARGET_FPS', '10'))
+# Suprime a publicação de frames sem movimento (com um heartbeat periódico)
+MOTION_GATING = os.getenv('MOTION_GATING', 'false').lower() == 'true'
+MOTION_HEARTBEAT_SECONDS = float(os.getenv('MOTION_HEARTBEAT_SECONDS', '10'))
+MOTION_MIN_AREA_RATIO = float(os.getenv('MOTION_MIN_AREA_RATIO', '0.002'))
+MOTION_ANALYSIS_WIDTH = int(os.getenv('MOTION_ANALYSIS_WIDTH', '160'))
+# 0 = uma thread por câmera neste processo; N > 0 = câmeras distribuídas entre N processos
+INGESTION_WORKERS = int(os.getenv('INGESTION_WORKERS', '0'))
+# Mudanças de câmera chegam por eventos do api-gateway; o polling da API é só a rede de segurança
+CAMERA_SYNC_INTERVAL = float(os.getenv('CAMERA_SYNC_INTERVAL', '300'))
+CAMERA_SYNC_RETRY_DELAY = 30
 
 if not API_GATEWAY_URL:
     raise ValueError("API_GATEWAY_URL environment variable not set.")
 
 running_cameras = {}
+camera_pool = None
+# Última configuração conhecida de cada câmera (nome -> config), vinda do polling ou dos eventos
+known_cameras = {}
+cameras_etag = None
+sync_lock = threading.Lock()
+sync_requested = threading.Event()
+
+def get_rabbitmq_params():
+    credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
+    return pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials, heartbeat=600)
 
 def get_rabbitmq_connection():
     max_retries = 10
     retry_delay = 5
     for i in range(max_retries):
         try:
-            credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
-            connection = pika.BlockingConnection(pika.ConnectionParameters(host=RABBITMQ_HOST, credentials=credentials, heartbeat=600))
+            connection = pika.BlockingConnection(get_rabbitmq_params())
             return connection
         except pika.exceptions.AMQPConnectionError as e:
             logging.warning(f"RabbitMQ connection failed (attempt {i+1}/{max_retries}): {e}. Retrying in {retry_delay}s...")
             time.sleep(retry_delay)
     raise Exception("Could not connect to RabbitMQ.")
 
-def publish_frame(channel, frame, camera_name):
-    _, buffer = cv2.imencode('.jpg', frame)
-    message = {
-        'camera_name': camera_name,
-        'timestamp': time.time(),
-        'frame': buffer.tobytes().hex()
-    }
-    try:
-        channel.basic_publish(
-            exchange='',
-            routing_key='frames_queue',
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=1)
-        )
-    except Exception as e:
-        logging.error(f"Failed to publish frame from {camera_name}: {e}")
+def resize_to_limits(frame, max_width=None, max_height=None):
+    """Reduz o frame (mantendo a proporção) para caber em max_width x max_height."""
+    height, width = frame.shape[:2]
+    scale = 1.0
+    if max_width and width > max_width:
+        scale = max_width / width
+    if max_height and height > max_height:
+        scale = min(scale, max_height / height)
+    if scale >= 1.0:
+        return frame
+    new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+    return cv2.resize(frame, new_size, interpolation=cv2.INTER_AREA)
 
 def capture_camera(config, stop_event):
     camera_name = config['name']
     url = config['rtsp_url']
+    target_fps = float(config.get('max_fps') or TARGET_FPS)
+    max_width = config.get('max_width')
+    max_height = config.get('max_height')
+    jpeg_quality = config.get('jpeg_quality') or DEFAULT_JPEG_QUALITY
     
     try:
         url_int = int(url)
@@ -61,82 +96,205 @@ def capture_camera(config, stop_event):
         
     connection = get_rabbitmq_connection()
     channel = connection.channel()
-    channel.queue_declare(queue='frames_queue', durable=False)
+    declare_frame_topology(channel)
 
-    logging.info(f"Starting capture for camera: {camera_name} at {url}")
-    cap = cv2.VideoCapture(url)
+    logging.info(f"Starting capture for camera: {camera_name} at {url} "
+                 f"({target_fps} fps, max {max_width or '-'}x{max_height or '-'}, JPEG q{jpeg_quality})")
+    grabber = LatestFrameGrabber(url, camera_name)
     
-    if not cap.isOpened():
+    if not grabber.start():
         logging.error(f"Error opening video stream for {camera_name}")
         connection.close()
         return
 
+    sequence = 0
+    ring = None
+    if FRAME_TRANSPORT == 'shm':
+        ring = SharedFrameRing(camera_name, slots=SHM_RING_SLOTS, max_frame_bytes=SHM_MAX_FRAME_BYTES)
+
+    motion_gate = None
+    if MOTION_GATING:
+        motion_gate = MotionGate(
+            analysis_width=MOTION_ANALYSIS_WIDTH,
+            min_area_ratio=MOTION_MIN_AREA_RATIO,
+            heartbeat_seconds=MOTION_HEARTBEAT_SECONDS
+        )
+
+    frame_interval = 1.0 / target_fps
+    next_publish = time.monotonic()
+
     while not stop_event.is_set():
-        ret, frame = cap.read()
-        if not ret:
-            logging.warning(f"Failed to grab frame from {camera_name}. Reconnecting in 5s...")
-            cap.release()
-            time.sleep(5)
-            cap = cv2.VideoCapture(url)
+        # Sempre o frame mais recente do stream; os intermediários são descartados sem decodificar
+        frame, captured_at = grabber.read_latest(timeout=1.0)
+        if frame is None:
             continue
-            
-        publish_frame(channel, frame, camera_name)
-        time.sleep(0.1)
 
-    cap.release()
+        # Reduz antes do encode: pixels acima do que o modelo usa só custam CPU e banda
+        frame = resize_to_limits(frame, max_width, max_height)
+
+        metadata = None
+        should_publish = True
+        if motion_gate:
+            should_publish, motion = motion_gate.check(frame, captured_at)
+            metadata = {'motion': motion} if motion else None
+
+        # A sequência só avança com o frame publicado: uma lacuna no consumidor
+        # significa frame descartado pelas filas, não falha de publicação
+        if should_publish and publish_frame(channel, frame, camera_name, sequence, ring,
+                                            timestamp=captured_at, jpeg_quality=jpeg_quality,
+                                            metadata=metadata):
+            sequence += 1
+
+        next_publish += frame_interval
+        delay = next_publish - time.monotonic()
+        if delay > 0:
+            stop_event.wait(delay)
+        else:
+            # Atrasado (encode/publicação lentos): não tenta compensar publicando em rajada
+            next_publish = time.monotonic()
+
+    grabber.stop()
+    if motion_gate:
+        logging.info(f"Motion gating for {camera_name}: {motion_gate.frames_suppressed} of "
+                     f"{motion_gate.frames_checked} frames suppressed")
+    if ring:
+        ring.close()
     connection.close()
     logging.info(f"Capture stopped for camera: {camera_name}")
 
+def run_capture(config, stop_event, previous=None):
+    """Thread de captura; com `previous`, espera a captura anterior da câmera terminar (ring SHM, conexão)."""
+    if previous is not None:
+        previous.join()
+    capture_camera(config, stop_event)
+
+def start_camera(config, previous=None):
+    name = config['name']
+    if camera_pool:
+        logging.info(f"Starting camera in worker pool: {name}")
+        camera_pool.start_camera(config)
+        running_cameras[name] = {'config': config}
+        return
+
+    logging.info(f"Starting camera thread for: {name}")
+    stop_event = threading.Event()
+    thread = threading.Thread(target=run_capture, args=(config, stop_event, previous))
+    running_cameras[name] = {'thread': thread, 'stop_event': stop_event, 'config': config}
+    thread.start()
+
+def stop_camera(name):
+    """
+    Sinaliza a parada da captura sem esperá-la (pode levar até os retries de conexão).
+
+    :return: a thread de captura, para ser aguardada fora do sync_lock, ou None.
+    """
+    entry = running_cameras.pop(name)
+    if camera_pool:
+        logging.info(f"Stopping camera in worker pool: {name}")
+        camera_pool.stop_camera(name)
+        return None
+    logging.info(f"Stopping camera thread for: {name}")
+    entry['stop_event'].set()
+    return entry['thread']
+
+def reconcile_cameras():
+    """
+    Aplica known_cameras às capturas em execução. Deve ser chamado com sync_lock.
+
+    :return: threads de captura paradas, a aguardar depois de liberar o sync_lock.
+    """
+    active_cameras = {name: cam for name, cam in known_cameras.items() if cam.get('is_active')}
+
+    # Câmaras a parar (removidas, desativadas ou com configuração alterada)
+    stopped = {}
+    for name in list(running_cameras.keys()):
+        if name not in active_cameras or active_cameras[name] != running_cameras[name]['config']:
+            stopped[name] = stop_camera(name)
+
+    # Câmaras a iniciar; uma câmera reconfigurada só captura depois que a anterior terminar
+    for name, config in active_cameras.items():
+        if name not in running_cameras:
+            start_camera(config, previous=stopped.get(name))
+    return [thread for thread in stopped.values() if thread is not None]
+
+def join_stopped(threads):
+    for thread in threads:
+        thread.join()
+
+def handle_camera_event(event, camera):
+    """Aplica imediatamente um evento camera.created/updated/deleted do api-gateway."""
+    logging.info(f"Camera event '{event}' for {camera.get('name')}")
+    with sync_lock:
+        previous_name = camera.pop('previous_name', None)
+        if previous_name:
+            known_cameras.pop(previous_name, None)
+        if event == 'deleted':
+            known_cameras.pop(camera['name'], None)
+        else:
+            known_cameras[camera['name']] = camera
+        stopped = reconcile_cameras()
+    join_stopped(stopped)
+
+def fetch_cameras():
+    """
+    Busca a lista de câmeras na API, usando o ETag da última resposta.
+
+    :return: lista de câmeras, ou None se nada mudou desde a última busca (304).
+    :raises ValueError: se a API respondeu com erro ou com dados inválidos.
+    """
+    global cameras_etag
+    headers = {'If-None-Match': cameras_etag} if cameras_etag else {}
+    response = requests.get(f"{API_GATEWAY_URL}/api/cameras", headers=headers, timeout=10)
+
+    if response.status_code == 304:
+        return None
+    if response.status_code != 200:
+        raise ValueError(f"API returned non-200 status code: {response.status_code}. Response: {response.text}")
+
+    try:
+        camera_list = response.json()
+    except json.JSONDecodeError:
+        raise ValueError(f"Failed to decode JSON from API response. Response text: {response.text}")
+    if not isinstance(camera_list, list):
+        raise ValueError(f"API returned non-list data: {camera_list}")
+
+    cameras_etag = response.headers.get('ETag')
+    return camera_list
+
 def sync_cameras():
-    global running_cameras
+    global known_cameras
     
     while True:
+        sync_requested.clear()
+        interval = CAMERA_SYNC_INTERVAL
         try:
             logging.info("Syncing camera configurations from API...")
-            response = requests.get(f"{API_GATEWAY_URL}/api/cameras", timeout=10)
-            
-            if response.status_code == 200:
-                try:
-                    camera_list = response.json()
-                    if not isinstance(camera_list, list):
-                        logging.error(f"API returned non-list data: {camera_list}")
-                        time.sleep(30)
-                        continue
-
-                    active_cameras = {cam['name']: cam for cam in camera_list if cam.get('is_active')}
-                except json.JSONDecodeError:
-                    logging.error(f"Failed to decode JSON from API response. Response text: {response.text}")
-                    time.sleep(30)
-                    continue
-            else:
-                logging.error(f"API returned non-200 status code: {response.status_code}. Response: {response.text}")
-                time.sleep(30)
-                continue
-
-            # Câmaras a parar
-            for name in list(running_cameras.keys()):
-                if name not in active_cameras:
-                    logging.info(f"Stopping camera thread for: {name}")
-                    running_cameras[name]['stop_event'].set()
-                    running_cameras[name]['thread'].join()
-                    del running_cameras[name]
-            
-            # Câmaras a iniciar
-            for name, config in active_cameras.items():
-                if name not in running_cameras:
-                    logging.info(f"Starting camera thread for: {name}")
-                    stop_event = threading.Event()
-                    thread = threading.Thread(target=capture_camera, args=(config, stop_event))
-                    running_cameras[name] = {'thread': thread, 'stop_event': stop_event}
-                    thread.start()
-                    
-        except requests.RequestException as e:
+            camera_list = fetch_cameras()
+            if camera_list is not None:
+                with sync_lock:
+                    known_cameras = {cam['name']: cam for cam in camera_list}
+                    stopped = reconcile_cameras()
+                join_stopped(stopped)
+        except (requests.RequestException, ValueError) as e:
             logging.error(f"Could not sync cameras from API: {e}")
+            interval = CAMERA_SYNC_RETRY_DELAY
         
-        time.sleep(30)
+        sync_requested.wait(interval)
 
 def main():
-    sync_cameras()
+    global camera_pool
+    if INGESTION_WORKERS > 0:
+        camera_pool = CameraWorkerPool(INGESTION_WORKERS, capture_camera)
+        camera_pool.start()
+    event_listener = CameraEventListener(get_rabbitmq_params(), handle_camera_event,
+                                         on_connected=sync_requested.set)
+    event_listener.start()
+    try:
+        sync_cameras()
+    finally:
+        event_listener.stop()
+        if camera_pool:
+            camera_pool.shutdown()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+import cv2
+
+
+class MotionGate:
+    """
+    Detector de movimento barato usado para decidir se um frame deve ser publicado.
+
+    Trabalha sobre uma cópia reduzida em tons de cinza com subtração de fundo (MOG2).
+    Quando nada muda na cena o frame é suprimido, exceto por um frame de "heartbeat"
+    a cada `heartbeat_seconds`, para que o processamento continue vendo a câmera.
+    """
+    def __init__(self, analysis_width=160, min_area_ratio=0.002, heartbeat_seconds=10.0, warmup_frames=25):
+        self.analysis_width = analysis_width
+        self.min_area_ratio = min_area_ratio
+        self.heartbeat_seconds = heartbeat_seconds
+        self.warmup_frames = warmup_frames
+
+        self.subtractor = cv2.createBackgroundSubtractorMOG2(history=300, varThreshold=25, detectShadows=False)
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+        self.last_published = None
+        self.frames_checked = 0
+        self.frames_suppressed = 0
+
+    def _find_regions(self, frame):
+        height, width = frame.shape[:2]
+        scale = min(1.0, self.analysis_width / width)
+        small = cv2.resize(frame, (max(1, int(width * scale)), max(1, int(height * scale))),
+                           interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        gray = cv2.GaussianBlur(gray, (5, 5), 0)
+
+        mask = self.subtractor.apply(gray)
+        _, mask = cv2.threshold(mask, 127, 255, cv2.THRESH_BINARY)
+        mask = cv2.dilate(mask, self.kernel, iterations=2)
+
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        min_area = self.min_area_ratio * gray.shape[0] * gray.shape[1]
+
+        regions = []
+        for contour in contours:
+            if cv2.contourArea(contour) < min_area:
+                continue
+            x, y, w, h = cv2.boundingRect(contour)
+            # Converte para as coordenadas do frame publicado
+            regions.append([int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale)])
+        return regions
+
+    def check(self, frame, now):
+        """
+        Avalia o frame.
+
+        :return: (publicar, metadados de movimento) — os metadados vão no envelope
+                 do frame: {'regions': [[x1, y1, x2, y2], ...], 'heartbeat': bool}.
+        """
+        self.frames_checked += 1
+        regions = self._find_regions(frame)
+
+        # Enquanto o modelo de fundo aprende a cena, tudo passa
+        has_motion = bool(regions) or self.frames_checked <= self.warmup_frames
+        heartbeat = (not has_motion and
+                     (self.last_published is None or now - self.last_published >= self.heartbeat_seconds))
+
+        if not has_motion and not heartbeat:
+            self.frames_suppressed += 1
+            return False, None
+
+        self.last_published = now
+        return True, {'regions': regions, 'heartbeat': heartbeat}
@@ -0,0 +1,411 @@
+"""
+Synthetic multi-camera load generator.
+
+Publishes N camera streams - synthetic moving scenes or a looped video - with
+the same encoding, envelope and shard routing as the real ingestion
+(frame_publisher.publish_frame), to find out how many cameras a
+frame-processing worker keeps up with.
+
+Targets:
+  broker     RabbitMQ (RABBITMQ_HOST/USER/PASS), consumed by the real
+             frame-processing workers. Shard queue depth is sampled during
+             the run; with --consumer-metrics (the worker's /metrics URL) the
+             consumer's processed/dropped/stale frame counters are read too.
+  inprocess  In-process stand-in for the broker: bounded shard queues with the
+             same drop-head / TTL policy and a consumer that decodes each frame
+             and spends --process-ms on it, detecting drops from sequence gaps
+             like the real consumer. Needs no infrastructure.
+
+Run from camera-ingestion-service/src:
+
+    python -m tools.load_generator --cameras 16 --fps 10 --width 1280 --height 720 --duration 60
+    python -m tools.load_generator --target inprocess --cameras 8 --process-ms 40 --video clip.mp4
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from urllib.request import urlopen
+
+import cv2
+import numpy as np
+import pika
+
+from frame_codec import decode_frame_message, FrameDecodeError, CODEC_JPEG
+from frame_publisher import publish_frame
+from frame_queues import (FRAME_SHARDS, FRAMES_QUEUE_MAX_LENGTH, FRAMES_MESSAGE_TTL_MS,
+                          declare_frame_topology, shard_queue_name)
+
+# Distinct frames cycled by each stream (synthetic scene or decoded video)
+SCENE_FRAMES = 60
+
+
+def synthetic_scene(width, height, count=SCENE_FRAMES, seed=0):
+    """Noisy background with a few moving boxes: realistic JPEG sizes and motion."""
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    cv2.GaussianBlur(background, (5, 5), 0, dst=background)
+    boxes = [(rng.integers(0, width), rng.integers(0, height), rng.integers(-8, 9), rng.integers(-8, 9))
+             for _ in range(4)]
+    box_w, box_h = max(8, width // 12), max(16, height // 6)
+    frames = []
+    for index in range(count):
+        frame = background.copy()
+        for x, y, dx, dy in boxes:
+            left = int(x + dx * index) % max(1, width - box_w)
+            top = int(y + dy * index) % max(1, height - box_h)
+            cv2.rectangle(frame, (left, top), (left + box_w, top + box_h), (200, 180, 160), -1)
+        frames.append(frame)
+    return frames
+
+
+def video_frames(path, width, height, count=SCENE_FRAMES):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        raise SystemExit(f"Could not open video '{path}'")
+    frames = []
+    while len(frames) < count:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        frames.append(cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA))
+    capture.release()
+    if not frames:
+        raise SystemExit(f"No frames decoded from '{path}'")
+    return frames
+
+
+class InProcessBroker:
+    """
+    Stand-in for the frames exchange and its shard queues: x-max-length with
+    drop-head and a per-message TTL, as declared by frame_queues.
+    """
+    def __init__(self, shards=FRAME_SHARDS, max_length=FRAMES_QUEUE_MAX_LENGTH, ttl_ms=FRAMES_MESSAGE_TTL_MS):
+        self.queues = {str(shard): deque() for shard in range(shards)}
+        self.max_length = max_length
+        self.ttl = ttl_ms / 1000
+        self.condition = threading.Condition()
+        self.overflowed = 0
+        self.expired = 0
+
+    def channel(self):
+        return self
+
+    def basic_publish(self, exchange, routing_key, body, properties=None):
+        with self.condition:
+            queue = self.queues[routing_key]
+            queue.append((time.monotonic(), body))
+            if len(queue) > self.max_length:
+                queue.popleft()
+                self.overflowed += 1
+            self.condition.notify()
+
+    def get(self, timeout=0.5):
+        """Next message from any shard (oldest first), skipping expired ones."""
+        with self.condition:
+            deadline = time.monotonic() + timeout
+            while True:
+                now = time.monotonic()
+                for queue in self.queues.values():
+                    while queue and now - queue[0][0] > self.ttl:
+                        queue.popleft()
+                        self.expired += 1
+                ready = [queue for queue in self.queues.values() if queue]
+                if ready:
+                    return min(ready, key=lambda queue: queue[0][0]).popleft()[1]
+                if now >= deadline:
+                    return None
+                self.condition.wait(deadline - now)
+
+    def depth(self):
+        with self.condition:
+            return sum(len(queue) for queue in self.queues.values())
+
+
+class InProcessConsumer:
+    """
+    Decodes frames like frame-processing and simulates the pipeline cost.
+
+    Sequence gaps are checked at dequeue time, in broker order, before the
+    simulated work: with several workers frames of a camera finish out of order,
+    which the real consumer avoids with its per-camera lanes.
+    """
+    def __init__(self, broker, process_ms, workers):
+        self.broker = broker
+        self.process_seconds = process_ms / 1000
+        self.workers = workers
+        self.lock = threading.Lock()
+        # Dequeue and sequence check happen together, one worker at a time
+        self.dequeue_lock = threading.Lock()
+        self.last_sequence = {}
+        self.consumed = 0
+        self.gaps = 0
+        self.stop_event = threading.Event()
+
+    def start(self):
+        for index in range(self.workers):
+            threading.Thread(target=self._loop, name=f"loadgen-consumer-{index}", daemon=True).start()
+
+    def _next_message(self):
+        with self.dequeue_lock:
+            body = self.broker.get()
+            if body is None:
+                return None
+            try:
+                message = decode_frame_message(body, accept_legacy=True)
+            except FrameDecodeError as e:
+                logging.error(f"Invalid frame message: {e}")
+                return None
+            sequence = message['sequence']
+            if sequence is not None:
+                last = self.last_sequence.get(message['camera_name'])
+                if last is not None and sequence > last + 1:
+                    with self.lock:
+                        self.gaps += sequence - last - 1
+                self.last_sequence[message['camera_name']] = max(sequence, last or 0)
+            return message
+
+    def _loop(self):
+        while not self.stop_event.is_set():
+            message = self._next_message()
+            if message is None:
+                continue
+            if message['codec'] == CODEC_JPEG:
+                cv2.imdecode(np.frombuffer(message['payload'], np.uint8), cv2.IMREAD_COLOR)
+            if self.process_seconds:
+                time.sleep(self.process_seconds)
+            with self.lock:
+                self.consumed += 1
+
+    def stats(self):
+        with self.lock:
+            return {'consumed': self.consumed, 'dropped_seen_by_consumer': self.gaps}
+
+
+def get_rabbitmq_params():
+    credentials = pika.PlainCredentials(os.getenv('RABBITMQ_USER', 'guest'), os.getenv('RABBITMQ_PASS', 'guest'))
+    return pika.ConnectionParameters(host=os.getenv('RABBITMQ_HOST', 'localhost'), credentials=credentials,
+                                     heartbeat=600)
+
+
+class BrokerProbe:
+    """Samples the shard queues' depth with passive declarations (own connection)."""
+    def __init__(self, params):
+        self.connection = pika.BlockingConnection(params)
+        self.channel = self.connection.channel()
+
+    def depth(self):
+        return sum(
+            self.channel.queue_declare(queue=shard_queue_name(shard), passive=True).method.message_count
+            for shard in range(FRAME_SHARDS)
+        )
+
+    def close(self):
+        if self.connection.is_open:
+            self.connection.close()
+
+
+_FRAMES_TOTAL = re.compile(r'^frames_total\{outcome="(\w+)"\}\s+([0-9.eE+-]+)$', re.MULTILINE)
+
+
+def consumer_counters(url):
+    """Frame outcome counters from a frame-processing /metrics endpoint."""
+    try:
+        text = urlopen(url, timeout=5).read().decode('utf-8')
+    except OSError as e:
+        logging.warning(f"Could not read consumer metrics from {url}: {e}")
+        return None
+    return {outcome: float(value) for outcome, value in _FRAMES_TOTAL.findall(text)}
+
+
+class CameraStream(threading.Thread):
+    """One synthetic camera publishing at a fixed rate, paced like capture_camera."""
+    def __init__(self, name, frames, fps, jpeg_quality, channel_factory, stop_event):
+        super().__init__(name=f"loadgen-{name}", daemon=True)
+        self.camera_name = name
+        self.frames = frames
+        self.fps = fps
+        self.jpeg_quality = jpeg_quality
+        self.channel_factory = channel_factory
+        self.stop_event = stop_event
+        self.published = 0
+        self.failed = 0
+        self.late = 0  # publications that missed their slot (generator saturated)
+
+    def run(self):
+        channel = self.channel_factory()
+        interval = 1.0 / self.fps
+        next_publish = time.monotonic()
+        sequence = 0
+        index = 0
+        while not self.stop_event.is_set():
+            frame = self.frames[index % len(self.frames)]
+            index += 1
+            # As in capture_camera: failed publications don't consume a sequence number,
+            # so consumer-side gaps are only frames dropped by the queues
+            if publish_frame(channel, frame, self.camera_name, sequence, jpeg_quality=self.jpeg_quality):
+                self.published += 1
+                sequence += 1
+            else:
+                self.failed += 1
+
+            next_publish += interval
+            delay = next_publish - time.monotonic()
+            if delay > 0:
+                self.stop_event.wait(delay)
+            else:
+                self.late += 1
+                next_publish = time.monotonic()
+
+
+def slope(samples):
+    """Least-squares growth rate (messages/s) of (time, depth) samples."""
+    if len(samples) < 2:
+        return 0.0
+    mean_t = sum(t for t, _ in samples) / len(samples)
+    mean_d = sum(d for _, d in samples) / len(samples)
+    var = sum((t - mean_t) ** 2 for t, _ in samples)
+    return sum((t - mean_t) * (d - mean_d) for t, d in samples) / var if var else 0.0
+
+
+def run(args):
+    if args.video:
+        frames = video_frames(args.video, args.width, args.height)
+    else:
+        frames = synthetic_scene(args.width, args.height)
+
+    stop_event = threading.Event()
+    consumer = None
+    probe = None
+    if args.target == 'inprocess':
+        broker = InProcessBroker()
+        consumer = InProcessConsumer(broker, args.process_ms, args.consumer_workers)
+        consumer.start()
+        channel_factory = broker.channel
+        depth = broker.depth
+    else:
+        params = get_rabbitmq_params()
+        setup = pika.BlockingConnection(params)
+        declare_frame_topology(setup.channel())
+        setup.close()
+        connections = []
+
+        def channel_factory():
+            # pika connections are not thread-safe: one per camera thread
+            connection = pika.BlockingConnection(params)
+            connections.append(connection)
+            return connection.channel()
+        probe = BrokerProbe(params)
+        depth = probe.depth
+
+    counters_start = consumer_counters(args.consumer_metrics) if args.consumer_metrics else None
+
+    streams = [
+        CameraStream(f"{args.camera_prefix}{index}", frames, args.fps, args.jpeg_quality, channel_factory, stop_event)
+        for index in range(args.cameras)
+    ]
+    started = time.monotonic()
+    for stream in streams:
+        stream.start()
+
+    samples = []
+    try:
+        while True:
+            elapsed = time.monotonic() - started
+            if elapsed >= args.duration:
+                break
+            time.sleep(min(args.report_interval, args.duration - elapsed))
+            elapsed = time.monotonic() - started
+            samples.append((elapsed, depth()))
+            published = sum(stream.published for stream in streams)
+            line = f"[{elapsed:6.1f}s] published {published} ({published / elapsed:.1f} fps), queue depth {samples[-1][1]}"
+            if consumer:
+                line += f", consumed {consumer.stats()['consumed']}"
+            print(line, flush=True)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop_event.set()
+        for stream in streams:
+            stream.join(timeout=5)
+    duration = time.monotonic() - started
+
+    published = sum(stream.published for stream in streams)
+    report = {
+        'target': args.target,
+        'cameras': args.cameras,
+        'resolution': f"{args.width}x{args.height}",
+        'duration_seconds': duration,
+        'target_fps': args.cameras * args.fps,
+        'published': published,
+        'publish_fps': published / duration,
+        'publish_failures': sum(stream.failed for stream in streams),
+        'late_publications': sum(stream.late for stream in streams),
+        'queue_depth_final': samples[-1][1] if samples else depth(),
+        'queue_depth_growth_per_second': slope(samples),
+    }
+    if consumer:
+        stats = consumer.stats()
+        consumer.stop_event.set()
+        dropped = broker.overflowed + broker.expired
+        report.update({
+            'consumed': stats['consumed'],
+            'consumer_fps': stats['consumed'] / duration,
+            'dropped_overflow': broker.overflowed,
+            'dropped_expired': broker.expired,
+            'dropped_seen_by_consumer': stats['dropped_seen_by_consumer'],
+            'drop_rate': dropped / published if published else 0.0,
+        })
+    if counters_start is not None:
+        counters_end = consumer_counters(args.consumer_metrics)
+        if counters_end is not None:
+            delta = {outcome: counters_end.get(outcome, 0) - counters_start.get(outcome, 0) for outcome in counters_end}
+            lost = delta.get('dropped', 0) + delta.get('stale', 0) + delta.get('superseded', 0)
+            report.update({
+                'consumer_counters': delta,
+                'consumer_fps': delta.get('processed', 0) / duration,
+                'drop_rate': lost / published if published else 0.0,
+            })
+    if probe:
+        probe.close()
+        for connection in connections:
+            if connection.is_open:
+                connection.close()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Publish synthetic camera streams to size frame processing.")
+    parser.add_argument('--cameras', type=int, default=4, help="Number of simulated cameras")
+    parser.add_argument('--fps', type=float, default=10, help="Frames per second per camera")
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--jpeg-quality', type=int, default=80)
+    parser.add_argument('--video', help="Loop frames of this video instead of the synthetic scene")
+    parser.add_argument('--duration', type=float, default=60, help="Seconds to run")
+    parser.add_argument('--camera-prefix', default='loadgen-', help="Prefix of the generated camera names")
+    parser.add_argument('--target', choices=('broker', 'inprocess'), default='broker')
+    parser.add_argument('--consumer-metrics', help="frame-processing /metrics URL (broker target)")
+    parser.add_argument('--process-ms', type=float, default=50, help="Simulated cost per frame (inprocess)")
+    parser.add_argument('--consumer-workers', type=int, default=1, help="Simulated consumer threads (inprocess)")
+    parser.add_argument('--report-interval', type=float, default=5)
+    parser.add_argument('--json', help="Also write the final report to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    report = run(args)
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
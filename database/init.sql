@@ -13,23 +13,34 @@ CREATE TABLE cameras (
     name VARCHAR(100) NOT NULL UNIQUE,
     rtsp_url TEXT NOT NULL,
     is_active BOOLEAN DEFAULT true,
+    max_fps REAL NOT NULL DEFAULT 10,
+    max_width INTEGER,
+    max_height INTEGER,
+    jpeg_quality INTEGER NOT NULL DEFAULT 80,
     created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
     updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL
 );
 
 COMMENT ON TABLE cameras IS 'Armazena as configurações das câmaras de vídeo geridas pela UI.';
+COMMENT ON COLUMN cameras.max_fps IS 'Taxa máxima de frames publicados pela ingestão.';
+COMMENT ON COLUMN cameras.max_width IS 'Largura máxima do frame publicado (NULL = resolução nativa).';
+COMMENT ON COLUMN cameras.max_height IS 'Altura máxima do frame publicado (NULL = resolução nativa).';
+COMMENT ON COLUMN cameras.jpeg_quality IS 'Qualidade JPEG (1-100) usada na publicação dos frames.';
 
 -- Tabela para armazenar as definições dos pipelines
 CREATE TABLE pipelines (
     id SERIAL PRIMARY KEY,
     name VARCHAR(100) NOT NULL UNIQUE,
     graph_data JSONB NOT NULL,
+    camera_name VARCHAR(100),
     is_active BOOLEAN DEFAULT true,
     created_at TIMESTAMPTZ DEFAULT NOW() NOT NULL,
     updated_at TIMESTAMPTZ DEFAULT NOW() NOT NULL
 );
 
 COMMENT ON TABLE pipelines IS 'Armazena as definições de pipeline de visão computacional criadas pelo usuário.';
+COMMENT ON COLUMN pipelines.camera_name IS 'Câmera do nó videoInput do grafo, extraída pela API ao salvar o pipeline.';
+CREATE INDEX IF NOT EXISTS ix_pipelines_camera_name ON pipelines (camera_name);
 
 -- Função de Trigger para atualizar o campo 'updated_at' automaticamente
 CREATE OR REPLACE FUNCTION trigger_set_timestamp()
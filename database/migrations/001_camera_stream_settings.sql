@@ -0,0 +1,8 @@
+-- Adiciona os limites de publicação por câmera em bancos criados antes deles
+-- existirem no init.sql. Pode ser executado mais de uma vez.
+\c jarvis_vision;
+
+ALTER TABLE cameras ADD COLUMN IF NOT EXISTS max_fps REAL NOT NULL DEFAULT 10;
+ALTER TABLE cameras ADD COLUMN IF NOT EXISTS max_width INTEGER;
+ALTER TABLE cameras ADD COLUMN IF NOT EXISTS max_height INTEGER;
+ALTER TABLE cameras ADD COLUMN IF NOT EXISTS jpeg_quality INTEGER NOT NULL DEFAULT 80;
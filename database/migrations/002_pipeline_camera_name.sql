@@ -0,0 +1,17 @@
+-- Extrai a câmera de cada pipeline para uma coluna indexada, usada pela API
+-- para buscar os pipelines de uma câmera sem varrer o graph_data.
+-- Pode ser executado mais de uma vez.
+\c jarvis_vision;
+
+ALTER TABLE pipelines ADD COLUMN IF NOT EXISTS camera_name VARCHAR(100);
+
+UPDATE pipelines p
+SET camera_name = (
+    SELECT node -> 'data' ->> 'camera_name'
+    FROM jsonb_array_elements(p.graph_data -> 'nodes') AS node
+    WHERE node ->> 'type' = 'videoInput'
+    LIMIT 1
+)
+WHERE p.camera_name IS NULL;
+
+CREATE INDEX IF NOT EXISTS ix_pipelines_camera_name ON pipelines (camera_name);
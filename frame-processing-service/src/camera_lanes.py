@@ -0,0 +1,101 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class CameraLaneExecutor:
+    """
+    Runs frame jobs on a bounded thread pool while keeping each camera serialized.
+
+    Every camera has a "lane" (a FIFO of pending jobs). At most one job per lane
+    runs at a time, so trackers and other per-camera state always see frames in
+    order, while jobs from different cameras run in parallel on the pool.
+    The number of queued jobs is bounded by the consumer's prefetch count.
+
+    With `coalesce=True`, when a lane has several jobs waiting only the newest
+    one runs; the older ones are superseded and their `discard` callback is
+    called instead (jobs without a discard callback are never skipped).
+
+    `release_cameras()` hands cameras over to another worker: their waiting jobs
+    are dropped through their `release` callback and the running ones finish.
+    """
+    def __init__(self, max_workers, coalesce=False):
+        self.max_workers = max_workers
+        self.coalesce = coalesce
+        self.pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="frame-worker")
+        self.lanes = {}  # camera_name -> deque of pending jobs
+        self.active = set()  # cameras with a job currently running
+        self.lock = threading.Lock()
+        self.lane_idle = threading.Condition(self.lock)
+
+    def submit(self, camera_name, job, discard=None, release=None):
+        """
+        Queue `job` (a callable without arguments) on the camera's lane. `release`
+        is called instead of the job if the camera is released before it runs.
+        """
+        with self.lock:
+            self.lanes.setdefault(camera_name, deque()).append((job, discard, release))
+            if camera_name in self.active:
+                return
+            self.active.add(camera_name)
+        self.pool.submit(self._drain_lane, camera_name)
+
+    def _drain_lane(self, camera_name):
+        while True:
+            superseded = []
+            with self.lock:
+                lane = self.lanes.get(camera_name)
+                if not lane:
+                    self.active.discard(camera_name)
+                    self.lanes.pop(camera_name, None)
+                    self.lane_idle.notify_all()
+                    return
+                if self.coalesce:
+                    while len(lane) > 1 and lane[0][1] is not None:
+                        superseded.append(lane.popleft()[1])
+                job, _, _ = lane.popleft()
+            try:
+                for discard in superseded:
+                    discard()
+                job()
+            except Exception as e:
+                logger.error(f"Unhandled error in frame job for camera '{camera_name}': {e}", exc_info=True)
+
+    def release_cameras(self, predicate, timeout=10.0):
+        """
+        Stop handling the cameras for which `predicate(camera_name)` is true: waiting
+        jobs that have a `release` callback are removed and the callback is called
+        (on the calling thread), then this waits up to `timeout` seconds for the
+        jobs already running on those cameras.
+
+        :return: number of jobs released.
+        """
+        released = []
+        with self.lock:
+            for camera_name, lane in self.lanes.items():
+                if not predicate(camera_name):
+                    continue
+                kept = deque(entry for entry in lane if entry[2] is None)
+                released.extend(entry[2] for entry in lane if entry[2] is not None)
+                self.lanes[camera_name] = kept
+        for release in released:
+            try:
+                release()
+            except Exception as e:
+                logger.error(f"Error releasing frame job: {e}", exc_info=True)
+        with self.lock:
+            busy = lambda: [camera_name for camera_name in self.active if predicate(camera_name)]
+            if not self.lane_idle.wait_for(lambda: not busy(), timeout=timeout):
+                logger.warning(f"Frames still running for released cameras after {timeout}s: {busy()}")
+        return len(released)
+
+    def pending(self):
+        """Number of jobs waiting (not running) per camera."""
+        with self.lock:
+            return {camera_name: len(lane) for camera_name, lane in self.lanes.items() if lane}
+
+    def shutdown(self, wait=True):
+        self.pool.shutdown(wait=wait)
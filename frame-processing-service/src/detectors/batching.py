@@ -0,0 +1,128 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+
+from metrics import REGISTRY
+
+
+class BatchInferenceService:
+    """
+    Agrupa frames de câmeras diferentes que usam o mesmo modelo em uma única
+    chamada de predict() (micro-batching).
+
+    Cada modelo tem uma fila e uma thread própria: a thread espera o primeiro
+    frame, junta os que chegarem até `max_wait_ms` ou `max_batch_size`, roda um
+    predict em lote e devolve a cada chamador as suas detecções (via Future).
+    Só faz diferença quando várias câmeras são processadas em paralelo
+    (CONSUMER_WORKERS > 1); com um frame por vez cada lote tem tamanho 1.
+    """
+    def __init__(self, max_batch_size=8, max_wait_ms=15):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queues = {}  # model_filename -> queue.Queue de (frame, future, enqueued_at)
+        self.batch_disabled = set()  # modelos cujo backend não aceitou lotes
+        self.stats_by_model = {}
+        self.lock = threading.Lock()
+
+    def detect(self, detector, frame):
+        """Mesma saída de detector.detect(frame), mas executada em lote com outras câmeras."""
+        return self.submit(detector, frame).result()
+
+    def submit(self, detector, frame):
+        future = Future()
+        self._queue_for(detector).put((frame, future, time.monotonic()))
+        return future
+
+    def _queue_for(self, detector):
+        model_filename = detector.model_filename
+        with self.lock:
+            if model_filename not in self.queues:
+                self.queues[model_filename] = queue.Queue()
+                self.stats_by_model[model_filename] = {
+                    'batches': 0, 'frames': 0, 'max_batch_size': 0,
+                    'wait_ms_total': 0.0, 'max_wait_ms': 0.0,
+                }
+                threading.Thread(
+                    target=self._batch_loop,
+                    args=(detector, self.queues[model_filename]),
+                    name=f"batch-{model_filename}",
+                    daemon=True
+                ).start()
+            return self.queues[model_filename]
+
+    def _collect(self, requests):
+        """Espera o primeiro frame e junta os seguintes até o prazo ou o tamanho máximo."""
+        batch = [requests.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(requests.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _batch_loop(self, detector, requests):
+        model_filename = detector.model_filename
+        while True:
+            batch = self._collect(requests)
+            frames = [frame for frame, _, _ in batch]
+            started = time.monotonic()
+
+            try:
+                if len(frames) > 1 and model_filename not in self.batch_disabled:
+                    results = self._detect_batch(detector, frames)
+                else:
+                    results = [detector.detect(frame) for frame in frames]
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future, _), detections in zip(batch, results):
+                future.set_result(detections)
+            self._record(model_filename, [started - enqueued_at for _, _, enqueued_at in batch])
+
+    def _detect_batch(self, detector, frames):
+        try:
+            return detector.detect_batch(frames)
+        except Exception as e:
+            # Ex.: engine TensorRT exportado com batch fixo em 1
+            logging.warning(f"Batched inference failed for model '{detector.model_filename}': {e}. "
+                            f"Falling back to one frame per call for this model.")
+            self.batch_disabled.add(detector.model_filename)
+            return [detector.detect(frame) for frame in frames]
+
+    def _record(self, model_filename, waits):
+        labels = (('model', model_filename),)
+        REGISTRY.observe('inference_batch_size', labels, len(waits))
+        REGISTRY.observe_many('inference_batch_wait_seconds', [(labels, wait) for wait in waits])
+        with self.lock:
+            stats = self.stats_by_model[model_filename]
+            stats['batches'] += 1
+            stats['frames'] += len(waits)
+            stats['max_batch_size'] = max(stats['max_batch_size'], len(waits))
+            stats['wait_ms_total'] += sum(waits) * 1000
+            stats['max_wait_ms'] = max(stats['max_wait_ms'], max(waits) * 1000)
+
+    def stats(self):
+        """
+        Estatísticas por modelo desde o início: lotes, frames, tamanho médio/máximo
+        do lote e espera média/máxima (ms) de um frame até entrar no predict.
+        """
+        with self.lock:
+            return {
+                model_filename: {
+                    'batches': stats['batches'],
+                    'frames': stats['frames'],
+                    'avg_batch_size': round(stats['frames'] / stats['batches'], 2) if stats['batches'] else 0,
+                    'max_batch_size': stats['max_batch_size'],
+                    'avg_wait_ms': round(stats['wait_ms_total'] / stats['frames'], 2) if stats['frames'] else 0,
+                    'max_wait_ms': round(stats['max_wait_ms'], 2),
+                }
+                for model_filename, stats in self.stats_by_model.items()
+            }
@@ -1,6 +1,7 @@
 import logging
 import os
 import time
+import threading
 from ultralytics import YOLO
 
 MODELS_PATH = os.getenv("MODELS_PATH", "/app/models")
@@ -11,6 +12,10 @@ class ObjectDetector:
     Gerencia um cache de classe para reter modelos carregados e otimizados.
     """
     _model_cache = {}
+    # Um lock de inferência por modelo: a mesma instância YOLO é compartilhada entre
+    # câmeras e predict() não é thread-safe
+    _predict_locks = {}
+    _cache_lock = threading.Lock()
 
     def __init__(self, model_filename: str):
         """
@@ -24,12 +29,15 @@ class ObjectDetector:
         self.model_filename = model_filename
         
         # Usa o cache de classe se o modelo já foi carregado e otimizado
-        if model_filename in ObjectDetector._model_cache:
-            self.model = ObjectDetector._model_cache[model_filename]
-            logging.debug(f"Modelo '{model_filename}' carregado do cache.")
-        else:
-            self.model = self._load_and_optimize_model()
-            ObjectDetector._model_cache[model_filename] = self.model
+        with ObjectDetector._cache_lock:
+            if model_filename in ObjectDetector._model_cache:
+                self.model = ObjectDetector._model_cache[model_filename]
+                logging.debug(f"Modelo '{model_filename}' carregado do cache.")
+            else:
+                self.model = self._load_and_optimize_model()
+                ObjectDetector._model_cache[model_filename] = self.model
+                ObjectDetector._predict_locks[model_filename] = threading.Lock()
+            self.predict_lock = ObjectDetector._predict_locks[model_filename]
 
     def _load_and_optimize_model(self):
         """
@@ -70,23 +78,41 @@ class ObjectDetector:
         """
         Realiza a detecção de objetos no frame.
         """
-        results = self.model.predict(
-            source=frame,
-            classes=classes_to_detect,
-            conf=confidence_threshold,
-            verbose=False # Evita logs excessivos do YOLO a cada frame
-        )
+        with self.predict_lock:
+            results = self.model.predict(
+                source=frame,
+                classes=classes_to_detect,
+                conf=confidence_threshold,
+                verbose=False # Evita logs excessivos do YOLO a cada frame
+            )
         
         detections = []
         for r in results:
-            for box in r.boxes:
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                detections.append({
-                    "box": [x1, y1, x2, y2],
-                    "confidence": float(box.conf),
-                    "class_name": self.model.names[int(box.cls)],
-                    "class_id": int(box.cls)
-                })
+            detections.extend(self._parse_result(r))
         return detections
 
+    def detect_batch(self, frames, classes_to_detect=None, confidence_threshold=0.5):
+        """
+        Detecção em lote: um único predict() para vários frames (de tamanhos possivelmente
+        diferentes). Retorna uma lista de detecções por frame, na mesma ordem.
+        """
+        with self.predict_lock:
+            results = self.model.predict(
+                source=list(frames),
+                classes=classes_to_detect,
+                conf=confidence_threshold,
+                verbose=False
+            )
+        return [self._parse_result(r) for r in results]
 
+    def _parse_result(self, r):
+        detections = []
+        for box in r.boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            detections.append({
+                "box": [x1, y1, x2, y2],
+                "confidence": float(box.conf),
+                "class_name": self.model.names[int(box.cls)],
+                "class_id": int(box.cls)
+            })
+        return detections
@@ -0,0 +1,50 @@
+import time
+
+
+class WallClock:
+    """ Relógio de parede: o padrão dos trackers e nós usados fora do executor. """
+    def now(self):
+        return time.time()
+
+
+WALL_CLOCK = WallClock()
+
+
+class FrameClock:
+    """
+    Relógio de tempo de frame de uma câmera.
+
+    now() devolve o timestamp de captura do frame em processamento (vindo de
+    frame_metadata), e não a hora em que ele é processado: tempos de permanência,
+    loitering e velocidades dependem só do ritmo do vídeo, de modo que um arquivo
+    gravado pode ser reprocessado mais rápido que o tempo real com o mesmo resultado.
+
+    O relógio nunca anda para trás (frames fora de ordem repetem o último instante).
+    Frames sem timestamp avançam pelo tempo de parede decorrido desde o último frame.
+    Usado apenas pela thread que processa a câmera.
+    """
+    def __init__(self):
+        self._now = None
+        self._advanced_at = None  # time.monotonic() do último advance()
+
+    def advance(self, timestamp=None):
+        """ Move o relógio para o frame atual e retorna o novo instante. """
+        monotonic_now = time.monotonic()
+        if timestamp is None:
+            if self._now is None:
+                timestamp = time.time()
+            else:
+                timestamp = self._now + (monotonic_now - self._advanced_at)
+        if self._now is None or timestamp > self._now:
+            self._now = timestamp
+        self._advanced_at = monotonic_now
+        return self._now
+
+    def now(self):
+        # Antes do primeiro frame não há tempo de frame: usa o relógio de parede
+        return self._now if self._now is not None else time.time()
+
+
+def clock_from(shared_tools):
+    """ Relógio do frame em shared_tools, ou o relógio de parede quando não há um. """
+    return shared_tools.get('clock') or WALL_CLOCK
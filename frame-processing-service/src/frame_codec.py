@@ -0,0 +1,136 @@
+"""
+Binary frame envelope exchanged between camera-ingestion-service and
+frame-processing-service.
+
+Each message body is a small fixed header followed by the camera name, an
+optional JSON metadata blob and the encoded frame bytes, so frames travel
+without the hex/JSON inflation of the legacy format:
+
+    magic       2s   b'VF'
+    version     B
+    codec       B    CODEC_*
+    width       H
+    height      H
+    sequence    I    per-camera publish counter
+    timestamp   d    capture time (epoch seconds)
+    name_len    H
+    meta_len    I
+    camera_name      name_len bytes (utf-8)
+    metadata         meta_len bytes (JSON object, optional)
+    payload          remaining bytes
+
+This module is duplicated in both services; keep the copies identical.
+"""
+import json
+import struct
+
+MAGIC = b'VF'
+VERSION = 1
+
+CODEC_JPEG = 1
+# Raw frame left in a shared memory ring (shm_transport); the payload is empty
+# and metadata['shm'] holds the slot descriptor.
+CODEC_RAW_SHM = 2
+
+CONTENT_TYPE = 'application/x-vision-frame'
+LEGACY_CONTENT_TYPE = 'application/json'
+
+_HEADER = struct.Struct('!2sBBHHIdHI')
+HEADER_SIZE = _HEADER.size
+
+
+class FrameDecodeError(ValueError):
+    """Mensagem de frame inválida ou em uma versão não suportada."""
+
+
+def encode_frame_message(camera_name, payload, timestamp, sequence=0, codec=CODEC_JPEG,
+                         width=0, height=0, metadata=None):
+    """
+    Monta o envelope binário de um frame.
+
+    :param payload: Bytes do frame já codificado (ex.: JPEG).
+    :param metadata: Dicionário opcional com informações extras (pequeno, serializado em JSON).
+    :return: bytes prontos para serem usados como corpo da mensagem AMQP.
+    """
+    name_bytes = camera_name.encode('utf-8')
+    meta_bytes = json.dumps(metadata, separators=(',', ':')).encode('utf-8') if metadata else b''
+    header = _HEADER.pack(
+        MAGIC, VERSION, codec, width, height,
+        sequence & 0xFFFFFFFF, timestamp, len(name_bytes), len(meta_bytes)
+    )
+    return b''.join((header, name_bytes, meta_bytes, payload))
+
+
+def is_binary_frame(body):
+    """Indica se o corpo da mensagem usa o envelope binário."""
+    return body[:2] == MAGIC
+
+
+def decode_frame_message(body, accept_legacy=True):
+    """
+    Decodifica uma mensagem de frame.
+
+    Aceita o envelope binário e, se `accept_legacy` estiver ativo, o formato
+    antigo JSON com o frame em hexadecimal.
+
+    :return: dict com camera_name, timestamp, sequence, codec, width, height,
+             metadata e payload (memoryview sobre o corpo, sem cópia).
+    """
+    if is_binary_frame(body):
+        return _decode_binary(body)
+    if accept_legacy:
+        return _decode_legacy(body)
+    raise FrameDecodeError("Mensagem não está no formato binário de frame")
+
+
+def _decode_binary(body):
+    if len(body) < HEADER_SIZE:
+        raise FrameDecodeError(f"Mensagem truncada ({len(body)} bytes)")
+
+    (_, version, codec, width, height, sequence,
+     timestamp, name_len, meta_len) = _HEADER.unpack_from(body, 0)
+    if version > VERSION:
+        raise FrameDecodeError(f"Versão de envelope não suportada: {version}")
+
+    view = memoryview(body)
+    offset = HEADER_SIZE
+    end_of_name = offset + name_len
+    end_of_meta = end_of_name + meta_len
+    if end_of_meta > len(body):
+        raise FrameDecodeError("Cabeçalho indica tamanho maior que a mensagem")
+
+    metadata = {}
+    if meta_len:
+        try:
+            metadata = json.loads(bytes(view[end_of_name:end_of_meta]))
+        except ValueError as e:
+            raise FrameDecodeError(f"Metadados inválidos: {e}") from e
+
+    return {
+        'camera_name': bytes(view[offset:end_of_name]).decode('utf-8'),
+        'timestamp': timestamp,
+        'sequence': sequence,
+        'codec': codec,
+        'width': width,
+        'height': height,
+        'metadata': metadata,
+        'payload': view[end_of_meta:],
+    }
+
+
+def _decode_legacy(body):
+    try:
+        message = json.loads(body)
+        return {
+            'camera_name': message['camera_name'],
+            'timestamp': message.get('timestamp'),
+            'sequence': None,
+            'codec': CODEC_JPEG,
+            'width': 0,
+            'height': 0,
+            # Rastreamento ponta a ponta (frame_id, estágios), quando o publicador envia
+            'metadata': {key: message[key] for key in ('frame_id', 'stages') if key in message},
+            'payload': bytes.fromhex(message['frame']),
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        raise FrameDecodeError(f"Mensagem legada inválida: {e}") from e
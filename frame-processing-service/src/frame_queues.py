@@ -0,0 +1,57 @@
+"""
+RabbitMQ topology for frame messages.
+
+Frames are published to a direct exchange with the camera's shard number as
+routing key. Each shard has its own queue, so all frames of a camera land in
+the same queue and therefore on the same frame-processing worker (tracker state
+stays continuous), while different shards can be consumed by different workers.
+Shard queues use single-active-consumer, so even while workers rebalance only
+one of them receives a given shard at a time.
+
+Shard queues are bounded: when processing falls behind, RabbitMQ drops the
+oldest frames (overflow=drop-head) and frames older than the message TTL expire,
+so a backlog never turns into minutes of stale video. The consumer counts the
+dropped frames from gaps in the per-camera sequence numbers.
+
+Both services declare the topology with the same arguments (a mismatch makes
+RabbitMQ reject the declaration). This module is duplicated in both services;
+keep the copies identical.
+"""
+import os
+import zlib
+
+FRAMES_EXCHANGE = 'frames'
+FRAME_SHARDS = int(os.getenv('FRAME_SHARDS', '1'))
+FRAMES_QUEUE_MAX_LENGTH = int(os.getenv('FRAMES_QUEUE_MAX_LENGTH', '100'))
+FRAMES_MESSAGE_TTL_MS = int(os.getenv('FRAMES_MESSAGE_TTL_MS', '10000'))
+
+
+def shard_for_camera(camera_name, shards=FRAME_SHARDS):
+    """Shard (estável entre processos e reinícios) de uma câmera."""
+    return zlib.crc32(camera_name.encode('utf-8')) % shards
+
+
+def shard_routing_key(camera_name, shards=FRAME_SHARDS):
+    return str(shard_for_camera(camera_name, shards))
+
+
+def shard_queue_name(shard):
+    return f"frames.shard.{shard}"
+
+
+def declare_frame_topology(channel, shards=FRAME_SHARDS):
+    """Declara o exchange de frames e as filas de cada shard (idempotente)."""
+    channel.exchange_declare(exchange=FRAMES_EXCHANGE, exchange_type='direct', durable=False)
+    for shard in range(shards):
+        queue = shard_queue_name(shard)
+        channel.queue_declare(
+            queue=queue,
+            durable=False,
+            arguments={
+                'x-single-active-consumer': True,
+                'x-max-length': FRAMES_QUEUE_MAX_LENGTH,
+                'x-message-ttl': FRAMES_MESSAGE_TTL_MS,
+                'x-overflow': 'drop-head',
+            }
+        )
+        channel.queue_bind(exchange=FRAMES_EXCHANGE, queue=queue, routing_key=str(shard))
@@ -1,11 +1,18 @@
 import pika
 import os
-import json
 import logging
 import time
+import threading
+import functools
 import numpy as np
 import cv2
 from pipeline_executor import PipelineExecutor
+from camera_lanes import CameraLaneExecutor
+from frame_codec import decode_frame_message, FrameDecodeError, CODEC_RAW_SHM
+from shm_transport import SharedFrameReader
+from frame_queues import declare_frame_topology, shard_for_camera
+from shard_coordinator import ShardCoordinator, ShardSubscriptions
+from metrics import REGISTRY, TRACER, MetricsServer
 
 # Configuration from environment variables (infrastructure only)
 RABBITMQ_HOST = os.getenv('RABBITMQ_HOST', 'rabbitmq')
@@ -17,6 +24,20 @@ MODELS_PATH = os.getenv("MODELS_PATH", "/app/models")
 USE_GPU = os.getenv("USE_GPU", "true").lower() == "true"
 MAX_PROCESSING_TIME = float(os.getenv("MAX_PROCESSING_TIME", "5.0"))
 PERFORMANCE_LOG_INTERVAL = int(os.getenv("PERFORMANCE_LOG_INTERVAL", "100"))
+# Keeps accepting the legacy JSON+hex frame messages while ingestion is migrated
+ACCEPT_LEGACY_FRAMES = os.getenv("ACCEPT_LEGACY_FRAMES", "true").lower() == "true"
+# 1 = frames processed inline on the connection thread (one at a time);
+# N > 1 = N worker threads, cameras in parallel, each camera still in order
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
+# Unacked frames RabbitMQ may deliver ahead; 0 = automatic (1 inline, 2 per worker otherwise)
+PREFETCH_COUNT = int(os.getenv("PREFETCH_COUNT", "0")) or (1 if CONSUMER_WORKERS <= 1 else 2 * CONSUMER_WORKERS)
+# Frames older than this (capture -> start of processing) are acked and skipped; 0 = disabled
+FRAME_MAX_AGE_MS = float(os.getenv("FRAME_MAX_AGE_MS", "0"))
+# With CONSUMER_WORKERS > 1, process only the newest of a camera's waiting frames
+COALESCE_FRAMES = os.getenv("COALESCE_FRAMES", "true").lower() == "true"
+# HTTP endpoint with Prometheus metrics (/metrics) and on-demand camera traces (/trace); 0 = disabled
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+TRACE_MAX_FRAMES = int(os.getenv("TRACE_MAX_FRAMES", "100"))
 
 # Configure logging with more detail
 logging.basicConfig(
@@ -38,16 +59,33 @@ class FrameProcessingService:
     def __init__(self):
         self.connection_params = self._get_rabbitmq_connection_params()
         self.executor = PipelineExecutor(self.connection_params)
+        self.shm_reader = SharedFrameReader()
+        self.shard_coordinator = ShardCoordinator(self.connection_params)
+        self.lanes = CameraLaneExecutor(CONSUMER_WORKERS, coalesce=COALESCE_FRAMES) if CONSUMER_WORKERS > 1 else None
+        self.connection = None
+        self.stats_lock = threading.Lock()
         self.stats = {
             'frames_processed': 0,
             'frames_failed': 0,
+            'frames_dropped': 0,
+            'dropped_by_camera': {},
+            'shm_overruns': 0,
+            'frames_stale': 0,
+            'frames_superseded': 0,
+            'skipped_by_camera': {},
             'start_time': time.time(),
             'last_frame_time': 0
         }
         
+        # Last sequence number seen per camera, to detect frames dropped by the
+        # bounded frame queues (drop-head / TTL) between publish and consume
+        self.last_sequence = {}
+        
         # Ensure log directory exists
         os.makedirs('/app/logs', exist_ok=True)
         
+        REGISTRY.add_collector(self._collect_metrics)
+        
     def _get_rabbitmq_connection_params(self):
         """Get RabbitMQ connection parameters with retry configuration."""
         credentials = pika.PlainCredentials(RABBITMQ_USER, RABBITMQ_PASS)
@@ -59,66 +97,280 @@ class FrameProcessingService:
             blocked_connection_timeout=300
         )
 
+    def _count(self, key, amount=1):
+        """Increment a stats counter (called from the connection thread and from workers)."""
+        with self.stats_lock:
+            self.stats[key] += amount
+
+    def _skip_frame(self, camera_name, reason):
+        """Count a frame skipped without processing ('stale' or 'superseded')."""
+        with self.stats_lock:
+            self.stats[f'frames_{reason}'] += 1
+            by_camera = self.stats['skipped_by_camera'].setdefault(camera_name, {'stale': 0, 'superseded': 0})
+            by_camera[reason] += 1
+
     def _log_performance_stats(self):
         """Log performance statistics periodically."""
         runtime = time.time() - self.stats['start_time']
         fps = self.stats['frames_processed'] / runtime if runtime > 0 else 0
+        pending = f", Pending per camera: {self.lanes.pending()}" if self.lanes else ""
+        batching = f", Inference batches: {self.executor.batcher.stats()}" if self.executor.batcher else ""
         
         logger.info(f"Performance Stats - "
                    f"Frames processed: {self.stats['frames_processed']}, "
                    f"Failed: {self.stats['frames_failed']}, "
+                   f"Dropped (backpressure): {self.stats['frames_dropped']} {self.stats['dropped_by_camera']}, "
+                   f"Skipped (stale/superseded): {self.stats['frames_stale']}/{self.stats['frames_superseded']} "
+                   f"{self.stats['skipped_by_camera']}, "
+                   f"SHM overruns: {self.stats['shm_overruns']}, "
                    f"FPS: {fps:.2f}, "
-                   f"Runtime: {runtime:.1f}s")
+                   f"Runtime: {runtime:.1f}s{pending}{batching}, "
+                   f"Side effects: {self.executor.side_effects.stats()}")
     
+    def _collect_metrics(self):
+        """Expose the service counters (kept in self.stats) on the metrics endpoint."""
+        with self.stats_lock:
+            outcomes = [
+                ((('outcome', outcome),), self.stats[f'frames_{outcome}'])
+                for outcome in ('processed', 'failed', 'dropped', 'stale', 'superseded')
+            ]
+            shm_overruns = self.stats['shm_overruns']
+        families = [
+            ('frames_total', 'counter', 'Frames received by outcome', outcomes),
+            ('shm_overruns_total', 'counter', 'Shared memory frames overwritten before they were read',
+             [((), shm_overruns)]),
+        ]
+        side_effects = self.executor.side_effects.stats()
+        families.append(('side_effect_queue_depth', 'gauge', 'Side-effect jobs waiting for a worker',
+                         [((), side_effects.pop('queue_depth'))]))
+        families.append(('side_effect_jobs_total', 'counter', 'Side-effect jobs by kind and outcome', [
+            ((('kind', kind), ('outcome', outcome)), count)
+            for kind, counters in side_effects.items() for outcome, count in counters.items()
+        ]))
+        if self.lanes:
+            families.append(('frames_pending', 'gauge', 'Frames waiting in each camera lane', [
+                ((('camera', camera_name),), count) for camera_name, count in self.lanes.pending().items()
+            ]))
+        return families
+
+    def _track_sequence(self, camera_name, sequence, redelivered=False):
+        """Count frames missing between the last sequence seen for a camera and this one."""
+        if sequence is None:
+            return
+        last = self.last_sequence.get(camera_name)
+        if last is not None:
+            delta = (sequence - last) & 0xFFFFFFFF
+            if delta == 0:
+                return
+            if delta >= 0x80000000:
+                # Older than the last one: a redelivered frame is ignored; otherwise the
+                # camera (or ingestion) restarted and the count re-baselines from here
+                if redelivered:
+                    return
+            elif delta > 1:
+                dropped = delta - 1
+                with self.stats_lock:
+                    self.stats['frames_dropped'] += dropped
+                    by_camera = self.stats['dropped_by_camera']
+                    by_camera[camera_name] = by_camera.get(camera_name, 0) + dropped
+        self.last_sequence[camera_name] = sequence
+
+    def _on_shard_change(self, shard):
+        """
+        A shard was acquired or is being released (called before its consumer is cancelled).
+
+        Frames of the shard's cameras still waiting in the lanes go back to the queue
+        for the new owner, and the ones running finish first, so a camera is never
+        processed by two workers at once. The last sequences are forgotten: frames
+        handled by another worker meanwhile are not drops, so the first frame after
+        the change re-baselines instead of counting a gap.
+        """
+        in_shard = lambda camera_name: shard_for_camera(camera_name) == shard
+        if self.lanes:
+            requeued = self.lanes.release_cameras(in_shard)
+            if requeued:
+                logger.info(f"Returned {requeued} pending frames of shard {shard} to the queue")
+        for camera_name in [name for name in self.last_sequence if in_shard(name)]:
+            del self.last_sequence[camera_name]
+
     def _process_frame_callback(self, ch, method, properties, body):
-        """Process frame with user-configured pipeline parameters."""
+        """
+        Runs on the connection thread: parse the envelope and either process the
+        frame inline or hand it to the camera's lane in the worker pool.
+        """
         start_time = time.time()
+        parse_start = time.perf_counter()
         
         try:
-            # Parse message
-            message = json.loads(body)
-            camera_name = message['camera_name']
-            frame_timestamp = message.get('timestamp', time.time())
+            # Parse message (binary envelope, or legacy JSON during rollout)
+            message = decode_frame_message(body, accept_legacy=ACCEPT_LEGACY_FRAMES)
+        except FrameDecodeError as e:
+            logger.error(f"Failed to decode frame message: {e}")
+            self._count('frames_failed')
+            ch.basic_ack(delivery_tag=method.delivery_tag)
+            return
+        parse_seconds = time.perf_counter() - parse_start
+
+        self._track_sequence(message['camera_name'], message['sequence'], method.redelivered)
+
+        if not self.lanes:
+            try:
+                self._process_frame(message, start_time, parse_seconds)
+            finally:
+                # Always acknowledge the message
+                ack_start = time.perf_counter()
+                ch.basic_ack(delivery_tag=method.delivery_tag)
+                self._observe_ack(message['camera_name'], time.perf_counter() - ack_start)
+            return
+
+        ack = functools.partial(self._ack_from_worker, self.connection, ch, method.delivery_tag,
+                                message['camera_name'])
+
+        def job():
+            try:
+                self._process_frame(message, start_time, parse_seconds)
+            finally:
+                ack()
+
+        def discard():
+            # A newer frame of the same camera is already waiting
+            self._skip_frame(message['camera_name'], 'superseded')
+            ack()
+
+        def release():
+            # Shard handed to another worker; runs on the connection thread (ShardSubscriptions.sync)
+            if ch.is_open:
+                ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+
+        self.lanes.submit(message['camera_name'], job, discard, release)
+
+    def _ack_from_worker(self, connection, channel, delivery_tag, camera_name):
+        """Schedule the ack on the connection thread (pika channels are not thread-safe)."""
+        scheduled = time.perf_counter()
+
+        def ack():
+            if channel.is_open:
+                channel.basic_ack(delivery_tag=delivery_tag)
+                # Includes the wait for the connection thread to pick the callback up
+                self._observe_ack(camera_name, time.perf_counter() - scheduled)
+        try:
+            connection.add_callback_threadsafe(ack)
+        except Exception as e:
+            # Connection already gone: RabbitMQ redelivers the unacked frame
+            logger.debug(f"Could not schedule ack for delivery {delivery_tag}: {e}")
+
+    def _observe_frame_latency(self, camera_name, timeline):
+        """Capture->detect / capture->processed and broker wait histograms for one frame."""
+        captured = timeline['captured']
+        spans = [('capture_to_processed', timeline['processed'] - captured)]
+        if 'detected' in timeline:
+            spans.append(('capture_to_detect', timeline['detected'] - captured))
+        if 'published' in timeline:
+            spans.append(('publish_to_receive', timeline['received'] - timeline['published']))
+        REGISTRY.observe_many('frame_latency_seconds', [
+            ((('camera', camera_name), ('span', span)), max(seconds, 0.0)) for span, seconds in spans
+        ])
+
+    def _observe_ack(self, camera_name, seconds):
+        REGISTRY.observe('frame_stage_seconds', (('camera', camera_name), ('stage', 'ack')), seconds)
+
+    def _process_frame(self, message, start_time, parse_seconds=0.0):
+        """Process frame with user-configured pipeline parameters."""
+        camera_name = message['camera_name']
+        # Time between the delivery and a worker picking the frame up (0 when processed inline)
+        queue_wait = time.time() - start_time
+        
+        # Freshness deadline: skip frames that waited too long instead of grinding through a backlog
+        if FRAME_MAX_AGE_MS > 0 and message['timestamp']:
+            age_ms = (time.time() - message['timestamp']) * 1000
+            if age_ms > FRAME_MAX_AGE_MS:
+                self._skip_frame(camera_name, 'stale')
+                logger.debug(f"Skipping stale frame from camera '{camera_name}' ({age_ms:.0f} ms old)")
+                return
+        
+        try:
+            frame_timestamp = message['timestamp'] or time.time()
             
-            # Decode frame
-            frame_bytes = bytes.fromhex(message['frame'])
-            frame = cv2.imdecode(np.frombuffer(frame_bytes, np.uint8), cv2.IMREAD_COLOR)
+            decode_start = time.perf_counter()
+            if message['codec'] == CODEC_RAW_SHM:
+                # Co-located ingestion: the frame is copied out of the shared memory ring
+                # (a memcpy, cheaper than the JPEG decode it replaces), so the writer
+                # reusing the slot can't change it under detection or the saved evidence
+                shm_descriptor = message['metadata'].get('shm')
+                frame = self.shm_reader.read(shm_descriptor) if shm_descriptor else None
+                if frame is not None:
+                    frame = frame.copy()
+                    # The writer invalidates the slot before overwriting it: still current
+                    # after the copy means the copy is the complete, intended frame
+                    if not self.shm_reader.is_current(shm_descriptor):
+                        self._count('shm_overruns')
+                        logger.warning(f"Shared memory slot for camera '{camera_name}' was overwritten "
+                                       f"before the frame was read; increase SHM_RING_SLOTS")
+                        return
+            else:
+                # Decode frame straight from the message buffer (no intermediate copy)
+                frame = cv2.imdecode(np.frombuffer(message['payload'], np.uint8), cv2.IMREAD_COLOR)
             
             if frame is None:
                 logger.error(f"Failed to decode frame from camera '{camera_name}'")
-                self.stats['frames_failed'] += 1
+                self._count('frames_failed')
                 return
+            decode_seconds = time.perf_counter() - decode_start
+            
+            # Wall-clock stage timestamps (epoch seconds); 'published' comes from ingestion,
+            # 'detected' is added by objectDetection and later stages by the data sink
+            timeline = dict(message['metadata'].get('stages') or {})
+            timeline.update(captured=frame_timestamp, received=start_time)
             
             # Add frame metadata (infrastructure info only)
             frame_metadata = {
                 'camera_name': camera_name,
                 'timestamp': frame_timestamp,
+                'sequence': message['sequence'],
                 'processing_start': start_time,
-                'frame_shape': frame.shape
+                'frame_shape': frame.shape,
+                # Motion regions / heartbeat flag when ingestion runs with motion gating
+                'motion': message['metadata'].get('motion'),
+                # End-to-end tracking: carried to the events DB and the websocket alert
+                'frame_id': message['metadata'].get('frame_id') or
+                            f"{camera_name}:{message['sequence']}:{int(frame_timestamp * 1000)}",
+                'stages': timeline,
             }
             
             # Execute pipeline with user-configured parameters from frontend
             # All processing params (confidence, classes, etc.) come from pipeline config
-            result = self.executor.execute(frame, camera_name, frame_metadata)
+            # Per-frame span breakdown only while a trace of this camera was requested
+            trace = [] if TRACER.active(camera_name) else None
+            pipeline_start = time.perf_counter()
+            result = self.executor.execute(frame, camera_name, frame_metadata, trace)
+            pipeline_seconds = time.perf_counter() - pipeline_start
+            
+            timeline['processed'] = time.time()
+            
+            stage_spans = (('parse', parse_seconds), ('queue_wait', queue_wait),
+                           ('decode', decode_seconds), ('pipeline', pipeline_seconds))
+            REGISTRY.observe_many('frame_stage_seconds', [
+                ((('camera', camera_name), ('stage', stage)), seconds) for stage, seconds in stage_spans
+            ])
+            self._observe_frame_latency(camera_name, timeline)
+            if trace is not None:
+                TRACER.record(camera_name, {'frame_id': frame_metadata['frame_id'], 'sequence': message['sequence'],
+                                            'timestamp': frame_timestamp}, list(stage_spans) + trace)
             
             # Update statistics
-            self.stats['frames_processed'] += 1
-            self.stats['last_frame_time'] = time.time()
+            with self.stats_lock:
+                self.stats['frames_processed'] += 1
+                self.stats['last_frame_time'] = time.time()
+                log_stats = self.stats['frames_processed'] % PERFORMANCE_LOG_INTERVAL == 0
             
             # Log performance every N frames (configured in infrastructure)
-            if self.stats['frames_processed'] % PERFORMANCE_LOG_INTERVAL == 0:
+            if log_stats:
                 self._log_performance_stats()
                 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to decode JSON message: {e}")
-            self.stats['frames_failed'] += 1
         except Exception as e:
             logger.error(f"Unexpected error processing frame: {e}", exc_info=True)
-            self.stats['frames_failed'] += 1
+            self._count('frames_failed')
         finally:
-            # Always acknowledge the message
-            ch.basic_ack(delivery_tag=method.delivery_tag)
-            
             # Check if processing exceeds infrastructure limits
             processing_time = time.time() - start_time
             if processing_time > MAX_PROCESSING_TIME:
@@ -131,26 +383,36 @@ class FrameProcessingService:
         logger.info(f"Connected to API Gateway: {API_GATEWAY_URL}")
         logger.info(f"Models path: {MODELS_PATH}")
         logger.info(f"GPU enabled: {USE_GPU}")
+        logger.info(f"Worker id: {self.shard_coordinator.worker_id}")
+        logger.info(f"Consumer workers: {CONSUMER_WORKERS}, prefetch: {PREFETCH_COUNT}")
+        self.shard_coordinator.start()
+        if METRICS_PORT:
+            try:
+                MetricsServer(REGISTRY, TRACER, METRICS_PORT, TRACE_MAX_FRAMES).start()
+            except OSError as e:
+                logger.error(f"Could not start metrics endpoint on port {METRICS_PORT}: {e}")
         
         while True:
             connection = None
             try:
                 logger.info("Connecting to RabbitMQ...")
                 connection = pika.BlockingConnection(self.connection_params)
+                self.connection = connection
                 channel = connection.channel()
                 
-                # Declare queue with durability
-                channel.queue_declare(queue='frames_queue', durable=True)
-                channel.basic_qos(prefetch_count=1)
+                # Same frame exchange/shard queues declared by the ingestion service
+                declare_frame_topology(channel)
+                channel.basic_qos(prefetch_count=PREFETCH_COUNT)
                 
-                # Set up consumer
-                channel.basic_consume(
-                    queue='frames_queue', 
-                    on_message_callback=self._process_frame_callback
-                )
+                # Consume only the shards this worker currently owns; ownership
+                # changes when other workers join or leave
+                subscriptions = ShardSubscriptions(channel, self._process_frame_callback,
+                                                   on_ownership_change=self._on_shard_change)
                 
                 logger.info("Ready to process frames with user-configured pipelines. Press CTRL+C to exit")
-                channel.start_consuming()
+                while True:
+                    subscriptions.sync(self.shard_coordinator.owned_shards())
+                    connection.process_data_events(time_limit=1)
                 
             except pika.exceptions.AMQPConnectionError as e:
                 logger.warning(f"RabbitMQ connection lost: {e}. Reconnecting in 5 seconds...")
@@ -165,6 +427,10 @@ class FrameProcessingService:
                 if connection and connection.is_open:
                     connection.close()
         
+        self.shard_coordinator.stop()
+        if self.lanes:
+            self.lanes.shutdown()
+
         # Final performance report
         self._log_performance_stats()
         logger.info("Frame Processing Service stopped")
@@ -0,0 +1,304 @@
+import json
+import logging
+import os
+import threading
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_QUANTILES = (0.5, 0.95, 0.99)
+# Samples kept per latency series; quantiles are computed over this window
+METRICS_WINDOW = int(os.getenv("METRICS_WINDOW", "1024"))
+# Buckets (seconds) of the end-to-end latency histograms
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Buckets of the inference micro-batching histograms (frames per batch, seconds waited)
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32)
+BATCH_WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.015, 0.025, 0.05, 0.1, 0.25)
+
+
+class LatencySummary:
+    """Count, sum and quantiles over the most recent `window` observations."""
+    def __init__(self, window):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def quantiles(self):
+        ordered = sorted(self.samples)
+        if not ordered:
+            return {q: 0.0 for q in SUMMARY_QUANTILES}
+        last = len(ordered) - 1
+        return {q: ordered[min(last, int(round(q * last)))] for q in SUMMARY_QUANTILES}
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts (Prometheus histogram) over the whole uptime."""
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.bucket_counts[index] += 1
+                break
+        self.count += 1
+        self.total += value
+
+    def cumulative(self):
+        running = 0
+        for bound, count in zip(self.buckets, self.bucket_counts):
+            running += count
+            yield bound, running
+
+
+def _format_labels(labels, extra=()):
+    pairs = tuple(labels) + tuple(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    )
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class MetricsRegistry:
+    """
+    In-process metrics rendered in the Prometheus text exposition format.
+
+    Series are identified by a metric name and a tuple of (label, value) pairs.
+    Latencies are kept as summaries over a sliding window of samples, so the
+    p50/p95/p99 reflect recent behaviour rather than the whole uptime; names
+    described as 'histogram' keep cumulative buckets instead, which Prometheus
+    can aggregate across workers (used for the end-to-end SLO latencies).
+    Collectors registered with `add_collector` are called at scrape time and
+    return extra (name, type, help, [(labels, value), ...]) families, for
+    values that already live elsewhere (service stats, queue depths).
+    """
+    def __init__(self, window=1024):
+        self.window = window
+        self.lock = threading.Lock()
+        self.families = {}  # name -> (type, help)
+        self.buckets = {}  # histogram name -> bucket upper bounds
+        self.summaries = {}  # name -> {labels: LatencySummary or LatencyHistogram}
+        self.counters = {}  # name -> {labels: value}
+        self.collectors = []
+
+    def describe(self, name, metric_type, help_text, buckets=None):
+        self.families[name] = (metric_type, help_text)
+        if metric_type == 'histogram':
+            self.buckets[name] = tuple(sorted(buckets))
+
+    def observe(self, name, labels, value):
+        self.observe_many(name, ((labels, value),))
+
+    def observe_many(self, name, observations):
+        """Record several (labels, value) observations under a single lock acquisition."""
+        with self.lock:
+            series = self.summaries.setdefault(name, {})
+            buckets = self.buckets.get(name)
+            for labels, value in observations:
+                summary = series.get(labels)
+                if summary is None:
+                    summary = LatencyHistogram(buckets) if buckets else LatencySummary(self.window)
+                    series[labels] = summary
+                summary.observe(value)
+
+    def inc(self, name, labels=(), amount=1):
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[labels] = series.get(labels, 0) + amount
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self):
+        lines = []
+
+        def header(name, default_type):
+            metric_type, help_text = self.families.get(name, (default_type, name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+
+        with self.lock:
+            summaries = {
+                name: [(labels, summary.quantiles(), summary.count, summary.total)
+                       for labels, summary in series.items()]
+                for name, series in self.summaries.items() if name not in self.buckets
+            }
+            histograms = {
+                name: [(labels, list(histogram.cumulative()), histogram.count, histogram.total)
+                       for labels, histogram in series.items()]
+                for name, series in self.summaries.items() if name in self.buckets
+            }
+            counters = {name: list(series.items()) for name, series in self.counters.items()}
+
+        for name in sorted(summaries):
+            header(name, 'summary')
+            for labels, quantiles, count, total in summaries[name]:
+                for q, value in quantiles.items():
+                    lines.append(f"{name}{_format_labels(labels, (('quantile', q),))} {value:.6f}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for name in sorted(histograms):
+            header(name, 'histogram')
+            for labels, cumulative, count, total in histograms[name]:
+                for bound, running in cumulative:
+                    lines.append(f"{name}_bucket{_format_labels(labels, (('le', bound),))} {running}")
+                lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+        for name in sorted(counters):
+            header(name, 'counter')
+            for labels, value in counters[name]:
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        for collector in self.collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class FrameTracer:
+    """
+    On-demand per-frame span breakdown for a single camera.
+
+    `capture(camera, frames, timeout)` arms the tracer and blocks until that
+    many frames of the camera were recorded (or the timeout expires). While
+    armed, the frame path builds a span list for the camera's frames and hands
+    it to `record`; otherwise `active()` is a single dict lookup.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.sessions = {}  # camera_name -> {'remaining': n, 'frames': [...], 'done': Event}
+
+    def active(self, camera_name):
+        return camera_name in self.sessions
+
+    def record(self, camera_name, frame_info, spans):
+        with self.lock:
+            session = self.sessions.get(camera_name)
+            if session is None:
+                return
+            entry = dict(frame_info)
+            entry['spans_ms'] = [{'name': name, 'ms': round(seconds * 1000, 3)} for name, seconds in spans]
+            session['frames'].append(entry)
+            session['remaining'] -= 1
+            if session['remaining'] <= 0:
+                del self.sessions[camera_name]
+                session['done'].set()
+        logger.info(f"Trace {camera_name}: {json.dumps(entry)}")
+
+    def capture(self, camera_name, frames, timeout):
+        with self.lock:
+            session = self.sessions.get(camera_name)
+            if session is None:
+                session = {'remaining': frames, 'frames': [], 'done': threading.Event()}
+                self.sessions[camera_name] = session
+        session['done'].wait(timeout)
+        with self.lock:
+            if self.sessions.get(camera_name) is session:
+                del self.sessions[camera_name]
+            return list(session['frames'])
+
+
+class MetricsServer:
+    """
+    Serves `GET /metrics` (Prometheus text) and
+    `GET /trace?camera=<name>&frames=<n>&timeout=<s>` (JSON span breakdown).
+    """
+    def __init__(self, registry, tracer, port, max_trace_frames=100):
+        self.registry = registry
+        self.tracer = tracer
+        self.port = port
+        self.max_trace_frames = max_trace_frames
+
+    def start(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == '/metrics':
+                    self._reply(200, 'text/plain; version=0.0.4', server.registry.render())
+                elif url.path == '/trace':
+                    self._trace(parse_qs(url.query))
+                else:
+                    self._reply(404, 'text/plain', 'not found\n')
+
+            def _trace(self, query):
+                camera_name = query.get('camera', [None])[0]
+                if not camera_name:
+                    self._reply(400, 'text/plain', "missing 'camera' parameter\n")
+                    return
+                try:
+                    frames = min(int(query.get('frames', ['10'])[0]), server.max_trace_frames)
+                    timeout = float(query.get('timeout', ['30'])[0])
+                except ValueError:
+                    self._reply(400, 'text/plain', "'frames' and 'timeout' must be numbers\n")
+                    return
+                traced = server.tracer.capture(camera_name, max(frames, 1), timeout)
+                body = json.dumps({'camera_name': camera_name, 'frames': traced}, indent=2)
+                self._reply(200, 'application/json', body + "\n")
+
+            def _reply(self, status, content_type, body):
+                payload = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug("metrics http: " + format % args)
+
+        httpd = ThreadingHTTPServer(('0.0.0.0', self.port), Handler)
+        httpd.daemon_threads = True
+        threading.Thread(target=httpd.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Metrics endpoint listening on :{self.port} (/metrics, /trace)")
+        return httpd
+
+
+# Process-wide instances: the executor records node latencies, the service
+# records frame stages, and the HTTP server exposes both
+REGISTRY = MetricsRegistry(METRICS_WINDOW)
+TRACER = FrameTracer()
+
+REGISTRY.describe('frame_stage_seconds', 'summary',
+                  'Time spent per frame in each service stage (parse, queue_wait, decode, pipeline, ack)')
+REGISTRY.describe('node_latency_seconds', 'summary',
+                  'Execution time of each pipeline node per frame')
+# Capture timestamps come from the ingestion host: spans crossing services assume synced clocks
+REGISTRY.describe('frame_latency_seconds', 'histogram',
+                  'End-to-end frame latency by span (publish_to_receive, capture_to_detect, '
+                  'capture_to_processed, capture_to_stored)',
+                  buckets=LATENCY_BUCKETS)
+REGISTRY.describe('inference_batch_size', 'histogram',
+                  'Frames per micro-batched predict() call, by model (INFERENCE_BATCHING)',
+                  buckets=BATCH_SIZE_BUCKETS)
+REGISTRY.describe('inference_batch_wait_seconds', 'histogram',
+                  'Time a frame waited for its inference batch to start, by model (INFERENCE_BATCHING)',
+                  buckets=BATCH_WAIT_BUCKETS)
+REGISTRY.describe('nodes_skipped_total', 'counter',
+                  'Node executions skipped because the node had no detections to process')
@@ -1,7 +1,28 @@
 class BaseNode:
     """
     Classe base para todos os nós de processamento do pipeline.
+
+    Uma instância vive enquanto o par pipeline/câmera existir, então estado
+    incremental (históricos por track, contadores) acumula entre frames.
+    Ciclo de vida: setup() uma vez antes do primeiro frame, on_config_change()
+    quando o usuário altera o nó, teardown() quando o nó sai do pipeline.
     """
+    # Declarações usadas pelo escalonador paralelo (pipeline/executors/parallel.py):
+    # THREAD_SAFE   - pode executar ao mesmo tempo que outros nós do mesmo frame
+    #                 (só mexe no próprio estado e em chaves próprias de shared_tools;
+#                 nunca altera input_data nem as detecções recebidas)
+    # RELEASES_GIL  - o trabalho pesado roda fora do GIL (OpenCV, torch, ONNX, I/O)
+    # Só nós com as duas declarações vão para o pool de threads compartilhado.
+    THREAD_SAFE = False
+    RELEASES_GIL = False
+    # Declarações usadas pelo plano compilado (pipeline/plan.py) para pular nós:
+    # PURE_ON_DETECTIONS - sem detecções na entrada, execute() não tem efeito e
+    #                      devolve empty_result(); o plano nem chama o nó
+    # TICK_INTERVAL      - segundos entre chamadas de tick() enquanto o nó é pulado,
+    #                      para expirar estado por tempo (None = sem tick)
+    PURE_ON_DETECTIONS = False
+    TICK_INTERVAL = None
+
     def __init__(self, node_info: dict):
         self.node_id = node_info['id']
         self.node_type = node_info['type']
@@ -14,7 +35,38 @@ class BaseNode:
 
         :param frame: O frame de vídeo original.
         :param input_data: Dicionário com os resultados dos nós que se conectam a este.
+            Somente leitura, assim como as detecções dentro dele: são compartilhados com
+            os outros nós alimentados pelos mesmos predecessores. Para anotar uma
+            detecção, devolva uma cópia (ex.: {**det, 'chave': valor}).
         :param shared_tools: Dicionário com ferramentas compartilhadas (modelos, etc.).
         :return: Um dicionário com os resultados deste nó.
         """
-        raise NotImplementedError("Cada nó deve implementar o método 'execute'")
\ No newline at end of file
+        raise NotImplementedError("Cada nó deve implementar o método 'execute'")
+
+    def empty_result(self) -> dict:
+        """ Resultado do nó quando é pulado por não haver detecções na entrada. """
+        return {}
+
+    def tick(self, now: float):
+        """ Manutenção periódica (limpeza de históricos) enquanto o nó é pulado. """
+        pass
+
+    def setup(self):
+        """
+        Carrega recursos pesados (modelos, conexões). Chamado uma vez, antes do
+        primeiro execute(); o construtor deve ficar leve.
+        """
+        pass
+
+    def teardown(self):
+        """ Libera os recursos do nó. Chamado quando o nó é removido ou substituído. """
+        pass
+
+    def on_config_change(self, new_config: dict) -> bool:
+        """
+        Aplica uma nova configuração do frontend mantendo o estado acumulado.
+
+        :return: False se o nó não consegue se reconfigurar e deve ser recriado.
+        """
+        self.config = new_config
+        return True
@@ -4,23 +4,30 @@ import cv2
 import os
 import time
 from datetime import datetime
-import psycopg2
+from side_effects import SideEffectDispatcher
+from metrics import REGISTRY
 from .base_node import BaseNode
 
+# Fila declarada pelo api-gateway para os eventos em tempo real
+WEBSOCKET_QUEUE_NAME = 'websocket_events'
+
 class DataSinkNode(BaseNode):
     """
     Salva um evento no banco de dados se receber alguma detecção.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+    PURE_ON_DETECTIONS = True
+
     def __init__(self, node_info):
         super().__init__(node_info)
-        # Cada nó que acessa o DB precisa de sua própria conexão
         self.db_url = os.getenv('EVENTS_DB_URL')
         self.media_path = os.getenv('MEDIA_PATH')
+        # Só usado se o executor não fornecer um dispatcher de efeitos colaterais
+        self.inline_side_effects = None
 
-    def _save_media(self, frame, camera_name):
+    def _save_media(self, frame, filename):
         try:
-            timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
-            filename = f"{camera_name}_{timestamp_str}.jpg"
             full_path = os.path.join(self.media_path, filename)
             
             cv2.imwrite(full_path, frame)
@@ -40,30 +47,67 @@ class DataSinkNode(BaseNode):
             event_type = self.config.get('event_type', 'Generic Detection')
             message = f"{len(detections)} objeto(s) do tipo '{event_type}' detectados."
             
-            media_file_path = self._save_media(frame, camera_name)
-            
-            sql = """
-                INSERT INTO events (pipeline_id, timestamp, camera_name, event_type, message, media_path, details)
-                VALUES (%s, NOW(), %s, %s, %s, %s, %s);
-            """
-            details_json = json.dumps({'detections': detections})
+            # Nome do arquivo definido agora, com o horário da detecção e não o da gravação
+            timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            filename = f"{camera_name}_{timestamp_str}.jpg"
+            # Rastreamento ponta a ponta: o evento leva o id do frame e as marcas de tempo dos estágios
+            frame_metadata = shared_tools.get('frame_metadata') or {}
+            stages = dict(frame_metadata.get('stages') or {})
+            stages['event_queued'] = time.time()
+            frame_id = frame_metadata.get('frame_id')
+            event = {
+                'pipeline_id': pipeline_id, 'camera_name': camera_name, 'event_type': event_type,
+                'message': message, 'frame_id': frame_id, 'stages': stages,
+                'details': json.dumps({'detections': detections, 'frame_id': frame_id, 'stages': stages}),
+            }
+
+            side_effects = shared_tools.get('side_effects')
+            if side_effects is None:
+                if self.inline_side_effects is None:
+                    self.inline_side_effects = SideEffectDispatcher(workers=0)
+                side_effects = self.inline_side_effects
+
+            # O frame pode ser uma view sobre memória compartilhada reaproveitada
+            # pelo próximo frame: o job recebe uma cópia
+            side_effects.submit('data_sink', self._save_event, side_effects, frame.copy(), filename, event)
+
+        return {}
+
+    def _save_event(self, context, side_effects, frame, filename, event):
+        """ Job do dispatcher: grava a mídia e o evento; falhas do banco geram nova tentativa. """
+        media_file_path = self._save_media(frame, filename)
+        
+        sql = """
+            INSERT INTO events (pipeline_id, timestamp, camera_name, event_type, message, media_path, details)
+            VALUES (%s, NOW(), %s, %s, %s, %s, %s);
+        """
+        conn = context.db_connection(self.db_url)
+        # 'with conn' delimita a transação (commit/rollback) sem fechar a conexão
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(sql, (event['pipeline_id'], event['camera_name'], event['event_type'],
+                                  event['message'], media_file_path, event['details']))
+        logging.info(f"Node {self.node_id}: Event '{event['event_type']}' saved to database.")
+
+        stages = dict(event['stages'], event_stored=time.time())
+        if 'captured' in stages:
+            REGISTRY.observe('frame_latency_seconds',
+                             (('camera', event['camera_name']), ('span', 'capture_to_stored')),
+                             max(stages['event_stored'] - stages['captured'], 0.0))
 
-            try:
-                with psycopg2.connect(self.db_url) as conn:
-                    with conn.cursor() as cur:
-                        cur.execute(sql, (pipeline_id, camera_name, event_type, message, media_file_path, details_json))
-                
-                # Publica no websocket para atualização em tempo real
-                ws_payload = {
-                    'pipeline_id': pipeline_id, 'camera_name': camera_name, 
-                    'event_type': event_type, 'timestamp': time.time()
-                }
-                shared_tools['rabbit_channel'].basic_publish(
-                    exchange='ws_exchange', routing_key='', body=json.dumps(ws_payload)
-                )
+        # Publica no websocket para atualização em tempo real; job separado para
+        # que uma falha do broker não repita a gravação do evento
+        ws_payload = {
+            'pipeline_id': event['pipeline_id'], 'camera_name': event['camera_name'],
+            'event_type': event['event_type'], 'timestamp': time.time(),
+            'frame_id': event['frame_id'], 'stages': stages,
+        }
+        side_effects.submit('websocket_event', _publish_websocket_event, ws_payload)
 
-                logging.info(f"Node {self.node_id}: Event '{event_type}' saved to database.")
-            except Exception as e:
-                logging.error(f"Failed to save event to database: {e}")
 
-        return {}
\ No newline at end of file
+def _publish_websocket_event(context, payload):
+    """ Entrega o evento à fila consumida pelo api-gateway, que o repassa aos clientes websocket. """
+    payload['stages']['alert_published'] = time.time()
+    context.rabbit_channel().basic_publish(
+        exchange='', routing_key=WEBSOCKET_QUEUE_NAME, body=json.dumps(payload)
+    )
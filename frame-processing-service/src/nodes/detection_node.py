@@ -1,6 +1,8 @@
 import logging
+import time
 import numpy as np
 from .base_node import BaseNode
+from pipeline.detection_stage import detection_signature
 
 class ObjectDetectionNode(BaseNode):
     """
@@ -13,6 +15,9 @@ class ObjectDetectionNode(BaseNode):
     - enable_tracking: Enable object tracking for trajectory analysis
     - min_track_length: Minimum track length for trajectory analysis
     """
+    # Não é THREAD_SAFE: atualiza o tracker compartilhado do pipeline
+    RELEASES_GIL = True
+
     def execute(self, frame, input_data, shared_tools):
         logging.debug(f"Node {self.node_id}: Running enhanced object detection with user settings.")
         
@@ -23,9 +28,51 @@ class ObjectDetectionNode(BaseNode):
         if not detector:
             logging.error(f"Model {model_filename} not loaded. Skipping detection.")
             return {'detections': []}
-        
-        # Run detection
-        detections = detector.detect(frame)
+
+        enable_tracking = self.config.get('enable_tracking', True)
+        stage = shared_tools.get('detection_stage')
+        if stage is not None:
+            # Pipelines da mesma câmera com a mesma configuração compartilham detecção e tracker
+            signature = detection_signature(self.config)
+            tracker = stage.tracker_for(signature) if enable_tracking else None
+            detections, tracked_objects = stage.run(
+                signature,
+                lambda: self._detect_and_track(
+                    frame, stage.raw_detections(model_filename, lambda: self._infer(detector, frame, shared_tools)),
+                    tracker
+                )
+            )
+        else:
+            tracker = shared_tools.get('tracker') if enable_tracking else None
+            detections, tracked_objects = self._detect_and_track(
+                frame, self._infer(detector, frame, shared_tools), tracker
+            )
+
+        # Marca de tempo da primeira detecção do frame (latência captura -> detecção)
+        stages = shared_tools.get('frame_metadata', {}).get('stages')
+        if stages is not None:
+            stages.setdefault('detected', time.time())
+
+        if tracker is not None:
+            # Nós seguintes (ex.: loitering) usam este tracker já atualizado, sem atualizá-lo de novo
+            shared_tools['tracker'] = tracker
+            shared_tools['tracked_objects'] = tracked_objects
+
+        logging.debug(f"Node {self.node_id}: Found {len(detections)} detections with enhanced tracking.")
+        return {'detections': detections}
+
+    def _infer(self, detector, frame, shared_tools):
+        # Run detection (micro-batched with other cameras when batching is enabled)
+        batcher = shared_tools.get('batcher')
+        return batcher.detect(detector, frame) if batcher else detector.detect(frame)
+
+    def _detect_and_track(self, frame, raw_detections, tracker):
+        """
+        Filtra a saída do modelo pela configuração do usuário e atualiza o tracker.
+
+        :return: (detecções, objetos rastreados {track_id: bbox} ou None sem tracking)
+        """
+        detections = [dict(d) for d in raw_detections]
         
         # Filter by user-selected classes from frontend
         selected_classes = self.config.get('classes')
@@ -36,52 +83,50 @@ class ObjectDetectionNode(BaseNode):
         confidence_threshold = float(self.config.get('confidence', 0.5))
         detections = [d for d in detections if d['confidence'] >= confidence_threshold]
 
+        if tracker is None:
+            return detections, None
+
         # NOVO: Enhanced tracking para análise de trajetória (baseado nos vídeos)
-        enable_tracking = self.config.get('enable_tracking', True)
-        if enable_tracking and 'tracker' in shared_tools:
-            tracker = shared_tools['tracker']
-            
-            # Update tracker com frame para melhor Re-ID
-            tracked_objects = tracker.update(detections, frame)
+        # Update tracker com frame para melhor Re-ID
+        tracked_objects = tracker.update(detections, frame)
+        
+        # Adicionar informações de tracking às detecções
+        for detection in detections:
+            # Encontrar objeto correspondente no tracker
+            detection_center = self._get_detection_center(detection['box'])
             
-            # Adicionar informações de tracking às detecções
-            for detection in detections:
-                # Encontrar objeto correspondente no tracker
-                detection_center = self._get_detection_center(detection['box'])
+            for track_id, track_bbox in tracked_objects.items():
+                track_center = self._get_bbox_center(track_bbox)
                 
-                for track_id, track_bbox in tracked_objects.items():
-                    track_center = self._get_bbox_center(track_bbox)
+                # Se detecção corresponde ao track (distância mínima)
+                if self._calculate_distance(detection_center, track_center) < 50:
+                    detection['track_id'] = track_id
                     
-                    # Se detecção corresponde ao track (distância mínima)
-                    if self._calculate_distance(detection_center, track_center) < 50:
-                        detection['track_id'] = track_id
-                        
-                        # NOVO: Adicionar análise de trajetória (dos vídeos)
-                        if hasattr(tracker, 'trackers'):
-                            for track_obj in tracker.trackers:
-                                if track_obj.id == track_id:
-                                    # Informações de movimento
-                                    detection['speed'] = getattr(track_obj, 'speed', 0.0)
-                                    detection['direction'] = getattr(track_obj, 'direction', 0.0)
-                                    detection['trajectory_length'] = len(getattr(track_obj, 'trajectory', []))
-                                    
-                                    # Padrão de movimento
-                                    movement_pattern = getattr(track_obj, 'get_movement_pattern', lambda: None)
-                                    if callable(movement_pattern):
-                                        pattern = movement_pattern()
-                                        if pattern:
-                                            detection['movement_pattern'] = pattern.value
-                                    
-                                    # Análise de trajetória
-                                    trajectory_analysis = getattr(track_obj, 'get_trajectory_analysis', lambda: None)
-                                    if callable(trajectory_analysis):
-                                        analysis = trajectory_analysis()
-                                        if analysis:
-                                            detection['trajectory_analysis'] = analysis
-                                    break
+                    # NOVO: Adicionar análise de trajetória (dos vídeos)
+                    if hasattr(tracker, 'trackers'):
+                        for track_obj in tracker.trackers:
+                            if track_obj.id == track_id:
+                                # Informações de movimento
+                                detection['speed'] = getattr(track_obj, 'speed', 0.0)
+                                detection['direction'] = getattr(track_obj, 'direction', 0.0)
+                                detection['trajectory_length'] = len(getattr(track_obj, 'trajectory', []))
+                                
+                                # Padrão de movimento
+                                movement_pattern = getattr(track_obj, 'get_movement_pattern', lambda: None)
+                                if callable(movement_pattern):
+                                    pattern = movement_pattern()
+                                    if pattern:
+                                        detection['movement_pattern'] = pattern.value
+                                
+                                # Análise de trajetória
+                                trajectory_analysis = getattr(track_obj, 'get_trajectory_analysis', lambda: None)
+                                if callable(trajectory_analysis):
+                                    analysis = trajectory_analysis()
+                                    if analysis:
+                                        detection['trajectory_analysis'] = analysis
+                                break
 
-        logging.debug(f"Node {self.node_id}: Found {len(detections)} detections with enhanced tracking.")
-        return {'detections': detections}
+        return detections, tracked_objects
     
     def _get_detection_center(self, bbox):
         """Calcula centro da detecção"""
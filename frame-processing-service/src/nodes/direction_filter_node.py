@@ -1,7 +1,7 @@
 import logging
 import numpy as np
 import math
-import time
+from frame_clock import clock_from
 from .base_node import BaseNode
 
 class DirectionFilterNode(BaseNode):
@@ -15,6 +15,10 @@ class DirectionFilterNode(BaseNode):
     - Traffic flow analysis
     - Multiple crossing lines support
     """
+    THREAD_SAFE = True
+    PURE_ON_DETECTIONS = True
+    TICK_INTERVAL = 10
+
     def __init__(self, node_config):
         super().__init__(node_config)
         self.crossing_history = {}  # Track objects crossing lines
@@ -47,9 +51,11 @@ class DirectionFilterNode(BaseNode):
         
         filtered_detections = []
         wrong_way_detections = []
-        current_time = time.time()
+        current_time = clock_from(shared_tools).now()  # tempo de captura do frame
         
         for det in detections:
+            # Cópia: os dicts da entrada são compartilhados com ramos irmãos (possivelmente em outras threads)
+            det = dict(det)
             track_id = det.get('track_id')
             if not track_id:
                 # If no tracking info, pass through
@@ -128,11 +134,8 @@ class DirectionFilterNode(BaseNode):
         # Clean up old crossing history
         self._cleanup_old_crossings(current_time)
         
-        # Add traffic analytics to shared context
-        if 'traffic_analytics' not in shared_tools:
-            shared_tools['traffic_analytics'] = {}
-        
-        shared_tools['traffic_analytics'][self.node_id] = {
+        # Add traffic analytics to shared context (setdefault: other branches may run concurrently)
+        shared_tools.setdefault('traffic_analytics', {})[self.node_id] = {
             **self.traffic_stats,
             'wrong_way_ratio': (self.traffic_stats['wrong_direction'] / 
                                max(self.traffic_stats['total_crossings'], 1)) * 100
@@ -154,6 +157,12 @@ class DirectionFilterNode(BaseNode):
         
         return result
     
+    def empty_result(self):
+        return {'detections': []}
+
+    def tick(self, now):
+        self._cleanup_old_crossings(now)
+
     def _detect_line_crossing(self, prev_pos, curr_pos, line_start, line_end):
         """Detect if object crossed the line and return crossing direction"""
         # Check if trajectory segment intersects with line segment
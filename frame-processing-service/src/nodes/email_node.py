@@ -6,6 +6,10 @@ class EmailNode(BaseNode):
     (Placeholder) Envia uma notificação por E-mail.
     A lógica de envio de e-mail será implementada aqui no futuro.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+    PURE_ON_DETECTIONS = True
+
     def execute(self, frame, input_data: dict, shared_tools: dict) -> dict:
         detections = input_data.get('detections', [])
         
@@ -6,10 +6,19 @@ class FaceDetectorNode(BaseNode):
     """
     Detecta a localização de faces no frame usando RetinaFace.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+
     def __init__(self, node_info):
         super().__init__(node_info)
-        # O modelo é carregado uma vez por instância do nó
+        self.detector = None
+
+    def setup(self):
+        # O modelo é carregado uma vez por instância do nó, não a cada frame
         self.detector = RetinaFace.build_model()
+
+    def teardown(self):
+        self.detector = None
     
     def execute(self, frame, input_data: dict, shared_tools: dict) -> dict:
         logging.debug(f"Node {self.node_id}: Executando detecção de faces.")
@@ -7,6 +7,9 @@ class FaceEmbeddingNode(BaseNode):
     """
     Extrai um vetor de embedding de cada face detectada usando ArcFace.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+
     def execute(self, frame, input_data: dict, shared_tools: dict) -> dict:
         faces = input_data.get('faces', [])
         if not faces:
@@ -6,12 +6,21 @@ class LoiteringDetectionNode(BaseNode):
     Identifica objetos que permanecem na cena por mais tempo que o permitido.
     UPGRADE: Agora suporta DeepSORT avançado com Re-identificação
     """
+    PURE_ON_DETECTIONS = True
+
+    def empty_result(self):
+        return {'detections': []}
+
     def execute(self, frame, input_data, shared_tools):
         detections = input_data.get('detections', [])
         if not detections:
             return {'detections': []}
             
         tracker = shared_tools.get('tracker')
+        stage = shared_tools.get('detection_stage')
+        if not tracker and stage is not None:
+            # objectDetection sem tracking: usa um tracker próprio deste pipeline
+            tracker = stage.tracker_for(('pipeline', shared_tools.get('pipeline_id')))
         if not tracker:
             logging.warning(f"Node {self.node_id}: Tracker not found in shared_tools.")
             return {'detections': []}
@@ -19,9 +28,12 @@ class LoiteringDetectionNode(BaseNode):
         time_threshold = int(self.config.get('time_threshold', 10))
         logging.debug(f"Node {self.node_id}: Checking for loitering with a {time_threshold}s threshold.")
 
-        # NOVO: Atualiza o tracker com frame para melhor Re-identificação
-        # O HybridTracker automaticamente escolhe DeepSORT ou CentroidTracker
-        tracked_boxes = tracker.update(detections, frame)
+        # O objectDetection já atualizou o tracker neste frame; atualizar de novo
+        # contaria o frame duas vezes. Só atualiza se ninguém o fez (tracking desligado).
+        tracked_boxes = shared_tools.get('tracked_objects')
+        if tracked_boxes is None:
+            # O HybridTracker automaticamente escolhe DeepSORT ou CentroidTracker
+            tracked_boxes = tracker.update(detections, frame)
         
         # NOVO: Obtém informações detalhadas de loitering (se DeepSORT disponível)
         detailed_loitering_info = tracker.get_detailed_loitering_info()
@@ -1,7 +1,7 @@
 import logging
 import cv2
 import numpy as np
-import time
+from frame_clock import clock_from
 from .base_node import BaseNode
 
 class PolygonFilterNode(BaseNode):
@@ -15,6 +15,10 @@ class PolygonFilterNode(BaseNode):
     - Zone density analysis
     - Speed estimation within zone
     """
+    THREAD_SAFE = True
+    PURE_ON_DETECTIONS = True
+    TICK_INTERVAL = 30
+
     def __init__(self, node_config):
         super().__init__(node_config)
         self.zone_history = {}  # Track objects in zone over time
@@ -31,7 +35,7 @@ class PolygonFilterNode(BaseNode):
         
         polygon_np = np.array(polygon_points, dtype=np.int32)
         filtered_detections = []
-        current_time = time.time()
+        current_time = clock_from(shared_tools).now()  # tempo de captura do frame
         
         # Enhanced zone analysis
         zone_stats = {
@@ -43,6 +47,8 @@ class PolygonFilterNode(BaseNode):
         }
 
         for det in detections:
+            # Cópia: os dicts da entrada são compartilhados com ramos irmãos (possivelmente em outras threads)
+            det = dict(det)
             box = det['box']
             # Enhanced reference point (center bottom of bounding box)
             check_point = (int((box[0] + box[2]) / 2), int(box[3]))
@@ -121,10 +127,8 @@ class PolygonFilterNode(BaseNode):
         # Clean up old zone history
         self._cleanup_old_history(current_time)
         
-        # Add zone statistics to shared context
-        if 'zone_analytics' not in shared_tools:
-            shared_tools['zone_analytics'] = {}
-        shared_tools['zone_analytics'][self.node_id] = zone_stats
+        # Add zone statistics to shared context (setdefault: other branches may run concurrently)
+        shared_tools.setdefault('zone_analytics', {})[self.node_id] = zone_stats
         
         logging.debug(f"Node {self.node_id}: {len(filtered_detections)} objects in zone. "
                      f"Entries: {zone_stats['new_entries']}, Exits: {zone_stats['exits']}, "
@@ -132,6 +136,12 @@ class PolygonFilterNode(BaseNode):
         
         return {'detections': filtered_detections}
     
+    def empty_result(self):
+        return {'detections': []}
+
+    def tick(self, now):
+        self._cleanup_old_history(now)
+
     def _cleanup_old_history(self, current_time, max_age=300):
         """Remove old tracking history (older than 5 minutes)"""
         to_remove = []
@@ -7,6 +7,10 @@ class TelegramNode(BaseNode):
     Envia uma notificação para o Telegram se receber alguma detecção do nó anterior.
     A configuração (token, chat_id) é feita diretamente no nó, na UI.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+    PURE_ON_DETECTIONS = True
+
     def execute(self, frame, input_data: dict, shared_tools: dict) -> dict:
         detections = input_data.get('detections', [])
         
@@ -36,12 +40,21 @@ class TelegramNode(BaseNode):
             'parse_mode': 'Markdown'
         }
         
-        try:
-            response = requests.post(api_url, json=payload, timeout=10)
-            response.raise_for_status()
-            logging.info(f"Node {self.node_id}: Notificação do Telegram enviada com sucesso para o chat {chat_id}.")
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Node {self.node_id}: Falha ao enviar notificação para o Telegram: {e}")
+        side_effects = shared_tools.get('side_effects')
+        if side_effects is None:
+            try:
+                self._send(None, api_url, payload)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Node {self.node_id}: Falha ao enviar notificação para o Telegram: {e}")
+        else:
+            # O envio (e as novas tentativas) acontece fora da thread do frame
+            side_effects.submit('telegram', self._send, api_url, payload)
         
         # Este nó não modifica os dados, apenas age, então retorna um dicionário vazio.
-        return {}
\ No newline at end of file
+        return {}
+
+    def _send(self, context, api_url, payload):
+        """ Job do dispatcher de efeitos colaterais; falhas são propagadas para a nova tentativa. """
+        response = requests.post(api_url, json=payload, timeout=10)
+        response.raise_for_status()
+        logging.info(f"Node {self.node_id}: Notificação do Telegram enviada com sucesso para o chat {payload['chat_id']}.")
@@ -1,7 +1,7 @@
 import logging
 import numpy as np
-import time
 import math
+from frame_clock import clock_from
 from .base_node import BaseNode
 
 class TrajectoryAnalysisNode(BaseNode):
@@ -21,6 +21,9 @@ class TrajectoryAnalysisNode(BaseNode):
     - prediction_frames: Number of frames to predict ahead
     - enable_crowd_analysis: Enable crowd flow analysis
     """
+    THREAD_SAFE = True
+    PURE_ON_DETECTIONS = True
+    TICK_INTERVAL = 30
     
     def __init__(self, node_config):
         super().__init__(node_config)
@@ -47,9 +50,11 @@ class TrajectoryAnalysisNode(BaseNode):
         logging.debug(f"Node {self.node_id}: Analyzing trajectories for {len(detections)} objects.")
         
         enhanced_detections = []
-        current_time = time.time()
+        current_time = clock_from(shared_tools).now()  # tempo de captura do frame
         
         for det in detections:
+            # Cópia: os dicts da entrada são compartilhados com ramos irmãos (possivelmente em outras threads)
+            det = dict(det)
             track_id = det.get('track_id')
             if not track_id:
                 enhanced_detections.append(det)
@@ -123,6 +128,12 @@ class TrajectoryAnalysisNode(BaseNode):
         
         return {'detections': enhanced_detections}
     
+    def empty_result(self):
+        return {'detections': []}
+
+    def tick(self, now):
+        self._cleanup_old_trajectories(now)
+
     def _analyze_trajectory(self, traj_data):
         """Comprehensive trajectory analysis"""
         positions = np.array(traj_data['positions'])
@@ -6,6 +6,10 @@ class WhatsAppNode(BaseNode):
     (Placeholder) Envia uma notificação por WhatsApp.
     A lógica de envio via alguma API de WhatsApp será implementada aqui.
     """
+    THREAD_SAFE = True
+    RELEASES_GIL = True
+    PURE_ON_DETECTIONS = True
+
     def execute(self, frame, input_data: dict, shared_tools: dict) -> dict:
         detections = input_data.get('detections', [])
         
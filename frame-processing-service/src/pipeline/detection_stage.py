@@ -0,0 +1,84 @@
+from frame_clock import FrameClock
+
+
+def detection_signature(config):
+    """
+    Chave que identifica uma configuração de objectDetection: dois nós com a mesma
+    assinatura produzem o mesmo resultado para o mesmo frame.
+    """
+    classes = config.get('classes')
+    return (
+        config.get('model_filename', 'yolov8n.pt'),
+        tuple(sorted(classes)) if classes else None,
+        float(config.get('confidence', 0.5)),
+        bool(config.get('enable_tracking', True)),
+    )
+
+
+class SharedDetectionStage:
+    """
+    Estágio de detecção compartilhado pelos pipelines de uma mesma câmera.
+
+    Quando vários pipelines usam a mesma configuração de objectDetection, o
+    detector e o tracker rodam uma única vez por frame e cada pipeline recebe
+    uma cópia do resultado. Há um tracker por assinatura de detecção (não por
+    pipeline), que vive enquanto algum pipeline da câmera usar essa assinatura.
+
+    O estágio também guarda o relógio de frame da câmera: new_frame() o avança
+    para o timestamp de captura, e os trackers são criados com ele.
+
+    Usado apenas pela thread que processa a câmera (frames de uma câmera são serializados).
+    """
+    def __init__(self, tracker_factory):
+        self.tracker_factory = tracker_factory  # tracker_factory(clock)
+        self.clock = FrameClock()
+        self.trackers = {}  # assinatura -> tracker
+        self.frame_results = {}  # assinatura -> (detecções, objetos rastreados) do frame atual
+        self.frame_raw = {}  # model_filename -> saída do modelo no frame atual
+        self.stats = {'computed': 0, 'shared': 0, 'inferences': 0}
+
+    def new_frame(self, timestamp=None):
+        self.frame_results = {}
+        self.frame_raw = {}
+        self.clock.advance(timestamp)
+
+    def raw_detections(self, model_filename, infer):
+        """
+        Saída bruta do modelo para o frame atual: assinaturas diferentes (classes,
+        confiança) sobre o mesmo modelo compartilham uma única inferência.
+        """
+        detections = self.frame_raw.get(model_filename)
+        if detections is None:
+            detections = infer()
+            self.frame_raw[model_filename] = detections
+            self.stats['inferences'] += 1
+        return detections
+
+    def tracker_for(self, signature):
+        tracker = self.trackers.get(signature)
+        if tracker is None:
+            tracker = self.tracker_factory(self.clock)
+            self.trackers[signature] = tracker
+        return tracker
+
+    def run(self, signature, compute):
+        """
+        Retorna (detecções, objetos rastreados) da assinatura para o frame atual,
+        chamando `compute()` apenas na primeira vez.
+        """
+        cached = self.frame_results.get(signature)
+        if cached is None:
+            cached = compute()
+            self.frame_results[signature] = cached
+            self.stats['computed'] += 1
+        else:
+            self.stats['shared'] += 1
+        detections, tracked_objects = cached
+        # Os nós seguintes anotam as detecções; cada pipeline recebe as suas
+        return [dict(detection) for detection in detections], tracked_objects
+
+    def retain(self, signatures):
+        """ Descarta os trackers de assinaturas que nenhum pipeline da câmera usa mais. """
+        for signature in list(self.trackers):
+            if signature not in signatures:
+                del self.trackers[signature]
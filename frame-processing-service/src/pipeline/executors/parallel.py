@@ -0,0 +1,70 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from frame_clock import clock_from
+
+
+class ParallelScheduler:
+    """
+    Executa os nós de um CompiledPipeline assim que todas as suas dependências
+    terminam, em vez de um por vez na ordem topológica.
+
+    Nós que declaram THREAD_SAFE e RELEASES_GIL (detecção de faces, embeddings,
+    gravação em banco, notificações) são enviados ao pool de threads
+    compartilhado; os demais rodam na thread do frame, em paralelo com eles.
+    A latência de um frame tende ao caminho crítico do grafo, não à soma dos nós.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+
+    def run(self, plan, frame, shared_tools, timings=None):
+        """ Mesma saída (e mesmos `timings`) de plan.run(): {node_id: resultado}. """
+        if not plan.parallel_branches:
+            return plan.run(frame, shared_tools, timings)
+
+        steps = plan.steps
+        results = {}
+        remaining = [step.dependency_count for step in steps]
+        ready = deque(index for index, count in enumerate(remaining) if count == 0)
+        inline = deque()
+        pending = {}  # future -> índice do passo
+        clock = clock_from(shared_tools)
+
+        def complete(index, result):
+            results[steps[index].node_id] = result
+            for dependent in steps[index].dependents:
+                remaining[dependent] -= 1
+                if remaining[dependent] == 0:
+                    ready.append(dependent)
+
+        while ready or inline or pending:
+            while ready:
+                index = ready.popleft()
+                step = steps[index]
+                skipped = plan.skip_result(step, results, clock)
+                if skipped is not None:
+                    # Nó puro sem detecções: nada a executar, libera os dependentes já
+                    complete(index, skipped)
+                    continue
+                # Um único passo disponível e nada em andamento: delegar só custaria a troca de thread
+                alone = not ready and not inline and not pending
+                if step.offloadable and not alone:
+                    future = self.pool.submit(plan.execute_step, step, frame,
+                                              plan.gather_input(step, results), shared_tools, timings)
+                    pending[future] = index
+                else:
+                    inline.append(index)
+
+            if inline:
+                # Um passo por vez, para voltar a delegar o que ele liberar
+                index = inline.popleft()
+                step = steps[index]
+                complete(index, plan.execute_step(step, frame, plan.gather_input(step, results), shared_tools, timings))
+                continue
+
+            if pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    complete(pending.pop(future), future.result())
+
+        return results
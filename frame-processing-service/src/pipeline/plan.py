@@ -0,0 +1,217 @@
+import logging
+import time
+from collections import deque
+
+from frame_clock import clock_from
+from pipeline.detection_stage import detection_signature
+
+
+def topological_sort(nodes, edges):
+    """Ordem de execução dos nós do grafo (o nó 'videoInput' é só a origem e fica de fora)."""
+    in_degree = {node['id']: 0 for node in nodes}
+    adj = {node['id']: [] for node in nodes}
+    for edge in edges:
+        adj.setdefault(edge['source'], []).append(edge['target'])
+        in_degree[edge['target']] += 1
+
+    queue = deque([node['id'] for node in nodes if in_degree[node['id']] == 0])
+    sorted_order = []
+    nodes_dict = {node['id']: node for node in nodes}
+
+    while queue:
+        u = queue.popleft()
+        if nodes_dict[u]['type'] != 'videoInput':
+            sorted_order.append(u)
+        for v in adj.get(u, []):
+            in_degree[v] -= 1
+            if in_degree[v] == 0:
+                queue.append(v)
+    return sorted_order
+
+
+def _teardown(step):
+    try:
+        step.node.teardown()
+    except Exception as e:
+        logging.error(f"Erro no teardown do nó {step.node_id}: {e}")
+
+
+class PlanStep:
+    """
+    Um nó pronto para executar: instância, ids dos nós que alimentam sua entrada,
+    se pode ser pulado sem detecções e, para o escalonador paralelo, quantos
+    passos ele espera e quais passos libera.
+    """
+    __slots__ = ('node_id', 'node_type', 'node', 'sources', 'dependency_count', 'dependents', 'offloadable',
+                 'pure', 'tick_interval', 'next_tick')
+
+    def __init__(self, node_id, node_type, node, sources):
+        self.node_id = node_id
+        self.node_type = node_type
+        self.node = node
+        self.sources = sources
+        self.dependency_count = 0
+        self.dependents = ()
+        # Pode ir para o pool de threads compartilhado
+        self.offloadable = bool(getattr(node, 'THREAD_SAFE', False) and getattr(node, 'RELEASES_GIL', False))
+        self.pure = bool(getattr(node, 'PURE_ON_DETECTIONS', False))
+        self.tick_interval = getattr(node, 'TICK_INTERVAL', None)
+        self.next_tick = 0.0
+
+
+class CompiledPipeline:
+    """
+    Plano de execução de uma versão de pipeline, montado uma única vez.
+
+    Guarda a ordem topológica, as arestas de entrada de cada nó, as classes já
+    resolvidas e as instâncias dos nós, de modo que executar um frame custe só
+    uma passada pelos passos. É reconstruído quando a configuração do pipeline
+    muda (evento 'pipeline.updated').
+
+    Nós PURE_ON_DETECTIONS sem detecções na entrada não são executados: recebem
+    direto empty_result(), o que também esvazia a entrada dos seus descendentes
+    puros. Em frames sem detecções sobra o detector e o tick() periódico dos
+    nós cujo estado expira por tempo.
+
+    Ao reconstruir a partir do plano anterior do mesmo pipeline, as instâncias
+    cujo nó continua no grafo (mesmo id e tipo) são reaproveitadas via
+    on_config_change(), preservando seu estado; as demais recebem teardown().
+    """
+    def __init__(self, pipeline, node_map, previous=None):
+        self.source = pipeline
+        self.pipeline_id = pipeline['id']
+        graph = pipeline['graph_data']
+
+        reusable = {}
+        if previous is not None and previous.pipeline_id == self.pipeline_id:
+            reusable = {step.node_id: step for step in previous.steps}
+
+        nodes_by_id = {node['id']: node for node in graph['nodes']}
+        inputs = {}
+        for edge in graph['edges']:
+            inputs.setdefault(edge['target'], []).append(edge['source'])
+
+        self.steps = []
+        for node_id in topological_sort(graph['nodes'], graph['edges']):
+            node_info = nodes_by_id[node_id]
+            node_class = node_map.get(node_info['type'])
+            if node_class is None:
+                logging.warning(f"Pipeline {self.pipeline_id}: tipo de nó desconhecido "
+                                f"'{node_info['type']}' ignorado ({node_id})")
+                continue
+            node = self._reuse_node(reusable.pop(node_id, None), node_info)
+            if node is None:
+                node = node_class(node_info)
+                node.setup()
+            self.steps.append(PlanStep(node_id, node_info['type'], node, tuple(inputs.get(node_id, ()))))
+
+        # Nós que saíram do grafo (ou com o plano anterior de outro pipeline)
+        if previous is not None:
+            for step in (reusable.values() if previous.pipeline_id == self.pipeline_id else previous.steps):
+                _teardown(step)
+
+        self._link_steps()
+
+        self.model_filenames = {
+            node['data'].get('model_filename', 'yolov8n.pt')
+            for node in graph['nodes'] if node['type'] == 'objectDetection'
+        }
+        self.detection_signatures = {
+            detection_signature(node.get('data', {}))
+            for node in graph['nodes'] if node['type'] == 'objectDetection'
+        }
+
+    @staticmethod
+    def _reuse_node(step, node_info):
+        if step is None:
+            return None
+        if step.node_type == node_info['type'] and step.node.on_config_change(node_info.get('data', {})):
+            return step.node
+        _teardown(step)
+        return None
+
+    def _link_steps(self):
+        """ Pré-calcula as dependências entre passos usadas pelo escalonador paralelo. """
+        index_by_id = {step.node_id: index for index, step in enumerate(self.steps)}
+        dependents = [[] for _ in self.steps]
+        for index, step in enumerate(self.steps):
+            upstream = {index_by_id[source] for source in step.sources if source in index_by_id}
+            step.dependency_count = len(upstream)
+            for source_index in upstream:
+                dependents[source_index].append(index)
+        for step, step_dependents in zip(self.steps, dependents):
+            step.dependents = tuple(step_dependents)
+
+        # Só vale usar o escalonador se algum passo delegável pode rodar junto com outro
+        fan_out = any(len(step.dependents) > 1 for step in self.steps)
+        roots = sum(1 for step in self.steps if step.dependency_count == 0)
+        self.parallel_branches = (fan_out or roots > 1) and any(step.offloadable for step in self.steps)
+
+    def close(self):
+        """ Libera todos os nós (pipeline removido ou câmera sem pipeline). """
+        for step in self.steps:
+            _teardown(step)
+        self.steps = []
+
+    def run(self, frame, shared_tools, timings=None):
+        """
+        Executa os passos em ordem e retorna {node_id: resultado}.
+
+        :param timings: se informado, recebe {node_id: segundos} dos nós executados.
+        """
+        results = {}
+        clock = clock_from(shared_tools)
+        for step in self.steps:
+            result = self.skip_result(step, results, clock)
+            if result is None:
+                result = self.execute_step(step, frame, self.gather_input(step, results), shared_tools, timings)
+            results[step.node_id] = result
+        return results
+
+    @staticmethod
+    def execute_step(step, frame, input_data, shared_tools, timings=None):
+        """ Executa o nó do passo, medindo o tempo quando `timings` é informado. """
+        if timings is None:
+            return step.node.execute(frame, input_data, shared_tools)
+        start = time.perf_counter()
+        result = step.node.execute(frame, input_data, shared_tools)
+        # Cada passo escreve só a própria chave: seguro com passos em threads do pool
+        timings[step.node_id] = time.perf_counter() - start
+        return result
+
+    @staticmethod
+    def skip_result(step, results, clock):
+        """
+        Resultado de um passo puro cuja entrada não tem detecções (sem montar a
+        entrada nem chamar execute()), ou None se o passo precisa executar.
+        Os ticks seguem o relógio do frame (`clock`), como o estado que expiram.
+        """
+        if not step.pure:
+            return None
+        for source in step.sources:
+            source_result = results.get(source)
+            if source_result and source_result.get('detections'):
+                return None
+        if step.tick_interval is not None:
+            now = clock.now()
+            if now >= step.next_tick:
+                step.next_tick = now + step.tick_interval
+                step.node.tick(now)
+        return step.node.empty_result()
+
+    @staticmethod
+    def gather_input(step, results):
+        """
+        Entrada de um passo a partir dos resultados dos nós de origem: sempre um
+        dict novo (cópia rasa), para que o nó possa alterá-lo sem afetar o
+        resultado do nó de origem nem a entrada dos ramos irmãos.
+        """
+        sources = step.sources
+        if len(sources) == 1:
+            return dict(results.get(sources[0]) or {})
+        input_data = {}
+        for source in sources:
+            source_result = results.get(source)
+            if source_result:
+                input_data.update(source_result)
+        return input_data
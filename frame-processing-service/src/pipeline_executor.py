@@ -2,9 +2,12 @@ import logging
 import os
 import requests
 import pika
+import time
+import queue
 import threading
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from detectors.detectors import ObjectDetector
+from detectors.batching import BatchInferenceService
 # UPGRADE: Importa novo sistema híbrido de tracking
 from trackers.hybrid_tracker import HybridTracker, TrackerFactory
 
@@ -22,10 +25,28 @@ from nodes.whatsapp_node import WhatsAppNode
 from nodes.face_detector_node import FaceDetectorNode
 from nodes.face_embedding_node import FaceEmbeddingNode
 from nodes.face_matcher_node import FaceMatcherNode
+from pipeline.plan import CompiledPipeline
+from pipeline.detection_stage import SharedDetectionStage
+from pipeline.executors.parallel import ParallelScheduler
+from side_effects import SideEffectDispatcher
+from metrics import REGISTRY
 
 # Configuration from environment variables
 API_GATEWAY_URL = os.getenv("API_GATEWAY_URL", "http://api-gateway:8000")
 PIPELINE_CACHE_TTL = int(os.getenv("PIPELINE_CACHE_TTL", "300"))  # seconds
+# TTL curto para entradas montadas após falha da API, para tentar de novo logo
+PIPELINE_NEGATIVE_CACHE_TTL = int(os.getenv("PIPELINE_NEGATIVE_CACHE_TTL", "15"))  # seconds
+# Micro-batching de inferência entre câmeras (útil com CONSUMER_WORKERS > 1)
+INFERENCE_BATCHING = os.getenv("INFERENCE_BATCHING", "false").lower() == "true"
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "15"))
+# Threads compartilhadas para executar ramos independentes do grafo em paralelo; 0 = sequencial
+NODE_WORKERS = int(os.getenv("NODE_WORKERS", "0"))
+# Efeitos colaterais (banco de eventos, mídia, notificações) fora da thread do frame; 0 workers = síncrono
+SIDE_EFFECT_WORKERS = int(os.getenv("SIDE_EFFECT_WORKERS", "4"))
+SIDE_EFFECT_QUEUE_SIZE = int(os.getenv("SIDE_EFFECT_QUEUE_SIZE", "1000"))
+SIDE_EFFECT_MAX_RETRIES = int(os.getenv("SIDE_EFFECT_MAX_RETRIES", "3"))
+SIDE_EFFECT_RETRY_BACKOFF = float(os.getenv("SIDE_EFFECT_RETRY_BACKOFF", "1.0"))  # seconds, dobra a cada tentativa
 
 class PipelineExecutor:
     """
@@ -36,12 +57,38 @@ class PipelineExecutor:
     - Maintains cache of pipeline configs for performance
     - Listens for pipeline updates via RabbitMQ
     - Executes pipeline nodes with user-specified parameters (confidence, classes, etc.)
+
+    With `static_pipelines` ({camera_name: [pipeline, ...]}) the pipelines are fixed:
+    no API calls, no RabbitMQ listener (offline replay / benchmarks). `side_effects`
+    replaces the default SideEffectDispatcher (e.g. an in-process stub).
     """
-    def __init__(self, rabbit_connection_params):
+    def __init__(self, rabbit_connection_params, static_pipelines=None, side_effects=None):
         self.rabbit_connection_params = rabbit_connection_params
         self.loaded_models = {}
-        self.trackers = {}
-        self.pipeline_cache = {} # Cache para armazenar pipelines: { "camera_name": pipeline_config }
+        # Cache de pipelines: { "camera_name": {'pipelines': [pipeline_config, ...], 'expires_at': t} }
+        # Entradas vencidas continuam servindo até a atualização em segundo plano terminar
+        self.pipeline_cache = {}
+        self.refresh_queue = queue.Queue()
+        self.refresh_pending = set()
+        self.refresh_lock = threading.Lock()
+        self.plans = {} # Planos compilados: { "camera_name": (pipelines, { pipeline_id: CompiledPipeline }) }
+        # Detecção e trackers compartilhados entre os pipelines de cada câmera: { "camera_name": SharedDetectionStage }
+        self.detection_stages = {}
+        # Com CONSUMER_WORKERS > 1, câmeras diferentes executam em paralelo:
+        # o carregamento de modelos precisa ser serializado
+        self.models_lock = threading.Lock()
+        self.batcher = BatchInferenceService(BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS) if INFERENCE_BATCHING else None
+        self.scheduler = None
+        if NODE_WORKERS > 0:
+            node_pool = ThreadPoolExecutor(max_workers=NODE_WORKERS, thread_name_prefix="node-worker")
+            self.scheduler = ParallelScheduler(node_pool)
+        self.side_effects = side_effects or SideEffectDispatcher(
+            rabbit_connection_params,
+            workers=SIDE_EFFECT_WORKERS,
+            max_queue=SIDE_EFFECT_QUEUE_SIZE,
+            max_retries=SIDE_EFFECT_MAX_RETRIES,
+            retry_backoff=SIDE_EFFECT_RETRY_BACKOFF,
+        )
         
         self.node_map = {
             'objectDetection': ObjectDetectionNode,
@@ -58,6 +105,16 @@ class PipelineExecutor:
             'faceMatcher': FaceMatcherNode,
         }
         
+        if static_pipelines is not None:
+            # Pipelines fixos: nunca expiram nem são buscados na API
+            for camera_name, camera_pipelines in static_pipelines.items():
+                self.pipeline_cache[camera_name] = {'pipelines': list(camera_pipelines), 'expires_at': float('inf')}
+            return
+
+        # Carrega todos os pipelines ativos de uma vez, antes do primeiro frame
+        self._warm_up_cache()
+        threading.Thread(target=self._refresh_loop, name="pipeline-cache-refresh", daemon=True).start()
+
         # Inicia o "ouvinte" de atualizações de configuração em uma thread separada
         self._start_config_update_listener()
 
@@ -82,9 +139,9 @@ class PipelineExecutor:
                 try:
                     # Mensagem esperada no formato: "camera-1"
                     camera_name = body.decode()
-                    if camera_name in self.pipeline_cache:
-                        logging.info(f"Evento de atualização recebido. Invalidando cache para a câmera: '{camera_name}'")
-                        del self.pipeline_cache[camera_name]
+                    logging.info(f"Evento de atualização recebido. Atualizando cache para a câmera: '{camera_name}'")
+                    # A versão antiga continua em uso até a nova chegar
+                    self._schedule_refresh(camera_name)
                 except Exception as e:
                     logging.error(f"Erro ao processar mensagem de invalidação de cache: {e}")
 
@@ -95,72 +152,102 @@ class PipelineExecutor:
         thread = threading.Thread(target=listener_thread, daemon=True)
         thread.start()
 
-    def _get_pipeline_for_camera(self, camera_name: str):
+    def _get_pipelines_for_camera(self, camera_name: str):
         """
-        Busca o pipeline para uma câmera específica, priorizando o cache local.
-        Se não encontrar no cache, busca via API.
+        Retorna os pipelines ativos de uma câmera a partir do cache local, sem
+        nunca bloquear o frame: entradas vencidas continuam valendo enquanto a
+        atualização roda em segundo plano, e uma câmera ainda desconhecida fica
+        sem pipelines até a primeira busca terminar.
         """
-        if camera_name in self.pipeline_cache:
-            logging.debug(f"Cache HIT para pipeline da câmera: {camera_name}")
-            return self.pipeline_cache[camera_name]
+        entry = self.pipeline_cache.get(camera_name)
+        if entry is None:
+            logging.info(f"Cache MISS. Buscando pipelines para a câmera '{camera_name}' em segundo plano.")
+            self._schedule_refresh(camera_name)
+            return []
         
-        logging.info(f"Cache MISS. Buscando pipeline para a câmera '{camera_name}' na API.")
+        if entry['expires_at'] <= time.time():
+            self._schedule_refresh(camera_name)
+        return entry['pipelines']
+
+    def _fetch_pipelines(self, camera_name: str):
+        response = requests.get(f"{API_GATEWAY_URL}/api/pipelines", params={'camera_name': camera_name}, timeout=10)
+        response.raise_for_status()
+        pipelines = response.json()
+        if not isinstance(pipelines, list):
+            # Corpo de erro ou página de proxy com status 200
+            raise ValueError(f"resposta inesperada da API (esperava uma lista): {str(pipelines)[:200]}")
+        # Todos os pipelines ativos da câmera rodam sobre o mesmo frame
+        return [pipeline for pipeline in pipelines if pipeline.get('is_active', True)]
+
+    def _schedule_refresh(self, camera_name: str):
+        with self.refresh_lock:
+            if camera_name in self.refresh_pending:
+                return
+            self.refresh_pending.add(camera_name)
+        self.refresh_queue.put(camera_name)
+
+    def _refresh_loop(self):
+        """ Thread que busca na API os pipelines das câmeras com cache vencido ou invalidado. """
+        while True:
+            camera_name = self.refresh_queue.get()
+            with self.refresh_lock:
+                self.refresh_pending.discard(camera_name)
+            try:
+                pipelines = self._fetch_pipelines(camera_name)
+                if not pipelines:
+                    logging.warning(f"Nenhum pipeline ativo encontrado para a câmera '{camera_name}'.")
+                previous = self.pipeline_cache.get(camera_name)
+                if previous and previous['pipelines'] == pipelines:
+                    # Sem mudanças: mantém o mesmo objeto para não recompilar os planos
+                    pipelines = previous['pipelines']
+                self.pipeline_cache[camera_name] = {
+                    'pipelines': pipelines,
+                    'expires_at': time.time() + PIPELINE_CACHE_TTL,
+                }
+            except Exception as e:
+                # Qualquer erro: esta é a única thread de atualização e não pode morrer
+                logging.error(f"Não foi possível buscar pipelines da API para a câmera '{camera_name}': {e}",
+                              exc_info=not isinstance(e, (requests.RequestException, ValueError)))
+                # Mantém o que já havia (ou nenhum pipeline) e tenta de novo em pouco tempo
+                previous = self.pipeline_cache.get(camera_name)
+                self.pipeline_cache[camera_name] = {
+                    'pipelines': previous['pipelines'] if previous else [],
+                    'expires_at': time.time() + PIPELINE_NEGATIVE_CACHE_TTL,
+                }
+
+    def _warm_up_cache(self):
+        """ Busca todos os pipelines ativos, já agrupados por câmera, em uma única chamada. """
         try:
-            # Assume que a API pode retornar uma lista de pipelines ativos para uma câmera.
-            # Estamos interessados apenas no primeiro.
-            response = requests.get(f"{API_GATEWAY_URL}/api/pipelines?camera_name={camera_name}")
+            response = requests.get(f"{API_GATEWAY_URL}/api/pipelines/active-by-camera", timeout=30)
             response.raise_for_status()
-            
-            pipelines = response.json()
-            if pipelines:
-                pipeline = pipelines[0] # Usa o primeiro pipeline encontrado
-                self.pipeline_cache[camera_name] = pipeline # Armazena no cache
-                return pipeline
-            else:
-                logging.warning(f"Nenhum pipeline ativo encontrado para a câmera '{camera_name}'.")
-                self.pipeline_cache[camera_name] = None # Cache nulo para evitar buscas repetidas
-                return None
-        except requests.RequestException as e:
-            logging.error(f"Não foi possível buscar pipeline da API para a câmera '{camera_name}': {e}")
-            self.pipeline_cache[camera_name] = None # Cache nulo em caso de erro de conexão
-            return None
-
-    def _topological_sort(self, nodes, edges):
-        # Esta função permanece a mesma
-        in_degree = {node['id']: 0 for node in nodes}
-        adj = {node['id']: [] for node in nodes}
-        for edge in edges:
-            adj.setdefault(edge['source'], []).append(edge['target'])
-            in_degree[edge['target']] += 1
-        
-        queue = deque([node['id'] for node in nodes if in_degree[node['id']] == 0])
-        sorted_order = []
-        nodes_dict = {node['id']: node for node in nodes}
-
-        while queue:
-            u = queue.popleft()
-            if nodes_dict[u]['type'] != 'videoInput':
-                sorted_order.append(u)
-            for v in adj.get(u, []):
-                in_degree[v] -= 1
-                if in_degree[v] == 0:
-                    queue.append(v)
-        return sorted_order
-
-    def _preload_models_for_pipeline(self, nodes_config):
-        # Esta função permanece a mesma
-        for node in nodes_config:
-            if node['type'] == 'objectDetection':
-                model_filename = node['data'].get('model_filename', 'yolov8n.pt')
-                if model_filename not in self.loaded_models:
-                    logging.info(f"Carregando modelo '{model_filename}'...")
-                    try:
-                        self.loaded_models[model_filename] = ObjectDetector(model_filename)
-                    except Exception as e:
-                        logging.error(f"Erro ao carregar modelo '{model_filename}': {e}")
-                        self.loaded_models[model_filename] = None
-
-    def execute(self, frame, camera_name: str, frame_metadata=None):
+            by_camera = response.json()
+            if not isinstance(by_camera, dict):
+                raise ValueError(f"resposta inesperada da API (esperava um objeto): {str(by_camera)[:200]}")
+        except (requests.RequestException, ValueError) as e:
+            logging.warning(f"Não foi possível pré-carregar os pipelines: {e}. Eles serão buscados por câmera.")
+            return
+
+        expires_at = time.time() + PIPELINE_CACHE_TTL
+        for camera_name, camera_pipelines in by_camera.items():
+            self.pipeline_cache[camera_name] = {'pipelines': camera_pipelines, 'expires_at': expires_at}
+        logging.info(f"Cache de pipelines pré-carregado: "
+                     f"{sum(len(p) for p in by_camera.values())} pipelines, {len(by_camera)} câmeras.")
+
+    def _preload_models(self, model_filenames):
+        for model_filename in model_filenames:
+            if model_filename in self.loaded_models:
+                continue
+            with self.models_lock:
+                if model_filename in self.loaded_models:
+                    continue
+                logging.info(f"Carregando modelo '{model_filename}'...")
+                try:
+                    self.loaded_models[model_filename] = ObjectDetector(model_filename)
+                except Exception as e:
+                    logging.error(f"Erro ao carregar modelo '{model_filename}': {e}")
+                    self.loaded_models[model_filename] = None
+
+    def execute(self, frame, camera_name: str, frame_metadata=None, trace=None):
         """
         Execute pipeline with user-configured parameters from frontend.
         
@@ -168,63 +255,118 @@ class PipelineExecutor:
             frame: Input video frame
             camera_name: Name of the camera
             frame_metadata: Optional metadata about the frame (timestamp, etc.)
+            trace: Optional list receiving (span name, seconds) for every node executed
         
         Note: All processing parameters (confidence thresholds, classes to detect,
         polygon coordinates, etc.) come from the pipeline configuration that was
         set by the user via the frontend interface, NOT from hardcoded config files.
         """
-        # 1. Get pipeline configuration (contains user settings from frontend)
-        pipeline = self._get_pipeline_for_camera(camera_name)
+        # 1. Get the camera's active pipelines (contain user settings from frontend)
+        pipelines = self._get_pipelines_for_camera(camera_name)
 
-        # 2. If no pipeline configured for this camera, nothing to do
-        if not pipeline:
+        # 2. Compiled plans (node order, inputs, node instances), rebuilt only when the config changes
+        plans = self._get_plans(camera_name, pipelines)
+
+        # 3. If no pipeline configured for this camera, nothing to do
+        if not plans:
             return
 
-        pipeline_id = pipeline['id']
-        graph = pipeline['graph_data']
-        
-        # 3. Preload models as needed
-        self._preload_models_for_pipeline(graph['nodes'])
+        # Detection shared by the camera's pipelines: each (model, classes, confidence,
+        # tracking) configuration runs once per frame, whatever the number of pipelines
+        stage = self.detection_stages[camera_name]
+        frame_metadata = frame_metadata or {}
+        # Trackers and time-based nodes run on the frame's capture time, not on the
+        # processing time: replays faster than real time keep dwell/loitering/speeds
+        stage.new_frame(frame_metadata.get('timestamp'))
         
-        # 4. Setup execution context with shared tools and user's camera settings
-        # UPGRADE: Usando HybridTracker que automaticamente escolhe DeepSORT ou CentroidTracker
-        if pipeline_id not in self.trackers:
-            logging.info(f"Inicializando HybridTracker para pipeline {pipeline_id}")
-            self.trackers[pipeline_id] = HybridTracker(
-                use_advanced=True,  # Tenta DeepSORT primeiro
-                fallback_on_error=True,  # Fallback para CentroidTracker se necessário
-                max_disappeared=30,
-                loitering_threshold=15
-            )
-        
-        data_context = {
-            'results': {},
-            'shared_tools': {
+        results = {}
+        for plan in plans:
+            # 4. Setup execution context with shared tools and user's camera settings
+            shared_tools = {
                 'loaded_models': self.loaded_models,
-                'tracker': self.trackers[pipeline_id],
+                'batcher': self.batcher,
+                'side_effects': self.side_effects,
+                'detection_stage': stage,
+                'tracker': None,  # set by the pipeline's objectDetection node
+                'pipeline_id': plan.pipeline_id,
                 'camera_name': camera_name,
-                'frame_metadata': frame_metadata or {},
+                'frame_metadata': frame_metadata,
+                'clock': stage.clock,
             }
-        }
-        
-        # 5. Execute nodes in topological order with user-configured parameters
-        execution_order = self._topological_sort(graph['nodes'], graph['edges'])
+            
+            # 5. Execute nodes in topological order with user-configured parameters
+            # (each node instance holds the user's settings like confidence, classes, etc.);
+            # with NODE_WORKERS > 0 independent branches run concurrently
+            timings = {}
+            if self.scheduler:
+                results[plan.pipeline_id] = self.scheduler.run(plan, frame, shared_tools, timings)
+            else:
+                results[plan.pipeline_id] = plan.run(frame, shared_tools, timings)
+            self._record_node_timings(plan, timings, trace)
+        return results
 
-        for node_id in execution_order:
-            node_info = next((n for n in graph['nodes'] if n['id'] == node_id), None)
-            if not node_info or node_info['type'] not in self.node_map:
+    def _record_node_timings(self, plan, timings, trace):
+        """ Per-node latency summaries (pipeline, node) and, when tracing, the frame's spans. """
+        pipeline_label = str(plan.pipeline_id)
+        observations = []
+        for step in plan.steps:
+            seconds = timings.get(step.node_id)
+            if seconds is None:
                 continue
+            observations.append(((('pipeline', pipeline_label), ('node', step.node_id), ('type', step.node_type)), seconds))
+            if trace is not None:
+                trace.append((f"{pipeline_label}/{step.node_type}:{step.node_id}", seconds))
+        REGISTRY.observe_many('node_latency_seconds', observations)
+        skipped = len(plan.steps) - len(observations)
+        if skipped:
+            REGISTRY.inc('nodes_skipped_total', (('pipeline', pipeline_label),), skipped)
+
+    def _create_tracker(self, clock):
+        # UPGRADE: Usando HybridTracker que automaticamente escolhe DeepSORT ou CentroidTracker
+        return HybridTracker(
+            use_advanced=True,  # Tenta DeepSORT primeiro
+            fallback_on_error=True,  # Fallback para CentroidTracker se necessário
+            max_disappeared=30,
+            loitering_threshold=15,
+            clock=clock  # Relógio de frame da câmera
+        )
+
+    def _get_plans(self, camera_name: str, pipelines: list):
+        """
+        Retorna os planos compilados dos pipelines da câmera, compilando os que
+        mudaram e liberando os dos pipelines que saíram.
+        """
+        cached = self.plans.get(camera_name)
+        if cached is not None and cached[0] is pipelines:
+            return cached[1].values()
 
-            # Gather inputs from previous nodes
-            input_data = {}
-            for edge in graph['edges']:
-                if edge['target'] == node_id and edge['source'] in data_context['results']:
-                    input_data.update(data_context['results'][edge['source']])
+        previous = cached[1] if cached else {}
+        plans = {}
+        for pipeline in pipelines:
+            pipeline_id = pipeline['id']
+            plan = previous.get(pipeline_id)
+            if plan is None or plan.source is not pipeline:
+                logging.info(f"Compilando pipeline {pipeline_id} para a câmera '{camera_name}'")
+                # Nós que continuam no grafo mantêm a instância (e o estado) do plano anterior
+                plan = CompiledPipeline(pipeline, self.node_map, plan)
+                self._preload_models(plan.model_filenames)
+            plans[pipeline_id] = plan
 
-            # Execute node with user's configuration from frontend
-            # (node_info['data'] contains the user's settings like confidence, classes, etc.)
-            node_instance = self.node_map[node_info['type']](node_info)
-            node_result = node_instance.execute(frame, input_data, data_context['shared_tools'])
-            data_context['results'][node_id] = node_result
+        for pipeline_id, plan in previous.items():
+            if pipeline_id not in plans:
+                # Pipeline removed: release the node instances of the old plan
+                plan.close()
 
-        return data_context['results']
\ No newline at end of file
+        stage = self.detection_stages.get(camera_name)
+        if plans:
+            if stage is None:
+                stage = self.detection_stages[camera_name] = SharedDetectionStage(self._create_tracker)
+            in_use = {('pipeline', pipeline_id) for pipeline_id in plans}
+            for plan in plans.values():
+                in_use.update(plan.detection_signatures)
+            stage.retain(in_use)
+            self.plans[camera_name] = (pipelines, plans)
+        else:
+            self.detection_stages.pop(camera_name, None)
+            self.plans.pop(camera_name, None)
+        return plans.values()
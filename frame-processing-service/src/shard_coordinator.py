@@ -0,0 +1,169 @@
+import json
+import time
+import uuid
+import socket
+import hashlib
+import logging
+import threading
+import pika
+
+from frame_queues import FRAME_SHARDS, shard_queue_name
+
+WORKERS_EXCHANGE = 'frame_workers'
+
+logger = logging.getLogger(__name__)
+
+
+def _rendezvous_score(worker_id, shard):
+    digest = hashlib.md5(f"{worker_id}:{shard}".encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+def assign_shards(workers, shards=FRAME_SHARDS):
+    """
+    Atribui cada shard a um worker por rendezvous hashing com carga limitada: cada
+    shard vai para o worker de maior pontuação que ainda não atingiu
+    ceil(shards / workers). Todos os workers chegam à mesma divisão a partir da mesma
+    lista de membros, e uma mudança de membros move poucos shards.
+
+    :return: dict {worker_id: set(shards)}
+    """
+    assignment = {worker_id: set() for worker_id in workers}
+    if not workers:
+        return assignment
+    capacity = -(-shards // len(workers))
+    for shard in range(shards):
+        ranked = sorted(workers, key=lambda worker_id: _rendezvous_score(worker_id, shard), reverse=True)
+        owner = next(worker_id for worker_id in ranked if len(assignment[worker_id]) < capacity)
+        assignment[owner].add(shard)
+    return assignment
+
+
+class ShardCoordinator:
+    """
+    Descobre os outros workers de frame-processing e decide quais shards de frames
+    este worker deve consumir.
+
+    Cada worker anuncia heartbeats em um exchange fanout; os membros vivos são os que
+    anunciaram dentro de `member_timeout`. A divisão é recalculada sempre que a lista
+    de membros muda, então os shards são redistribuídos quando workers entram ou saem.
+    """
+    def __init__(self, rabbit_connection_params, shards=FRAME_SHARDS, heartbeat_interval=2.0, member_timeout=7.0):
+        self.rabbit_connection_params = rabbit_connection_params
+        self.shards = shards
+        self.heartbeat_interval = heartbeat_interval
+        self.member_timeout = member_timeout
+        self.worker_id = f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+
+        self.members = {self.worker_id: time.time()}
+        # Sem shards até a primeira rodada de membros (consumir tudo na partida
+        # tomaria os shards dos workers já em execução); com um único shard não há coordenação
+        self.owned = set(range(shards)) if shards <= 1 else set()
+        self.lock = threading.Lock()
+        self.running = False
+
+    def owned_shards(self):
+        with self.lock:
+            return set(self.owned)
+
+    def start(self):
+        if self.shards <= 1:
+            # Um único shard: a fila com single-active-consumer já garante o failover
+            logger.info("Single frame shard; shard coordination disabled")
+            return
+        self.running = True
+        threading.Thread(target=self._run, name="shard-coordinator", daemon=True).start()
+
+    def _on_announcement(self, ch, method, properties, body):
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return
+        with self.lock:
+            if message.get('leaving'):
+                self.members.pop(message['worker_id'], None)
+            else:
+                self.members[message['worker_id']] = time.time()
+
+    def _publish(self, channel, leaving=False):
+        channel.basic_publish(
+            exchange=WORKERS_EXCHANGE,
+            routing_key='',
+            body=json.dumps({'worker_id': self.worker_id, 'leaving': leaving})
+        )
+
+    def _rebalance(self):
+        now = time.time()
+        with self.lock:
+            self.members[self.worker_id] = now
+            for worker_id, last_seen in list(self.members.items()):
+                if now - last_seen > self.member_timeout:
+                    del self.members[worker_id]
+            owned = assign_shards(sorted(self.members), self.shards)[self.worker_id]
+            if owned != self.owned:
+                logger.info(f"Frame shards rebalanced across {len(self.members)} workers: "
+                            f"this worker now owns {sorted(owned)}")
+                self.owned = owned
+
+    def _run(self):
+        while self.running:
+            connection = None
+            try:
+                connection = pika.BlockingConnection(self.rabbit_connection_params)
+                channel = connection.channel()
+                channel.exchange_declare(exchange=WORKERS_EXCHANGE, exchange_type='fanout', durable=False)
+                queue_name = channel.queue_declare(queue='', exclusive=True).method.queue
+                channel.queue_bind(exchange=WORKERS_EXCHANGE, queue=queue_name)
+                channel.basic_consume(queue=queue_name, on_message_callback=self._on_announcement, auto_ack=True)
+
+                while self.running:
+                    self._publish(channel)
+                    connection.process_data_events(time_limit=self.heartbeat_interval)
+                    self._rebalance()
+
+                self._publish(channel, leaving=True)
+            except pika.exceptions.AMQPError as e:
+                logger.warning(f"Shard coordinator lost RabbitMQ connection: {e}. Retrying in 5 seconds...")
+                time.sleep(5)
+            finally:
+                if connection and connection.is_open:
+                    connection.close()
+
+    def stop(self):
+        self.running = False
+
+
+class ShardSubscriptions:
+    """
+    Mantém as assinaturas de um canal alinhadas com os shards que o worker possui.
+    Deve ser usado apenas na thread da conexão do canal.
+
+    `on_ownership_change(shard)`, se informado, é chamado para cada shard
+    assumido ou liberado (ex.: para descartar estado por câmera do shard); na
+    liberação, antes de cancelar o consumidor, para que frames ainda não
+    processados possam ser devolvidos à fila.
+    """
+    def __init__(self, channel, on_message_callback, on_ownership_change=None):
+        self.channel = channel
+        self.on_message_callback = on_message_callback
+        self.on_ownership_change = on_ownership_change
+        self.consumer_tags = {}
+
+    def sync(self, owned_shards):
+        for shard in owned_shards - set(self.consumer_tags):
+            self.consumer_tags[shard] = self.channel.basic_consume(
+                queue=shard_queue_name(shard),
+                on_message_callback=self.on_message_callback
+            )
+            logger.info(f"Consuming frame shard {shard}")
+            if self.on_ownership_change:
+                self.on_ownership_change(shard)
+
+        for shard in set(self.consumer_tags) - owned_shards:
+            if self.on_ownership_change:
+                self.on_ownership_change(shard)
+            pending = self.channel.basic_cancel(self.consumer_tags.pop(shard))
+            # Mensagens já entregues a este consumidor voltam para a fila do novo dono
+            for method, properties, body in pending or []:
+                self.channel.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
+            logger.info(f"Released frame shard {shard}")
@@ -0,0 +1,195 @@
+"""
+Shared-memory frame transport for co-located ingestion and processing.
+
+The ingestion side keeps a ring buffer of raw BGR frames per camera in a POSIX
+shared memory segment; RabbitMQ then carries only a small descriptor (segment,
+slot, sequence number, shape) inside the frame envelope. The processing side
+attaches to the same segment and copies the frame out of its slot (a memcpy,
+cheaper than the JPEG encode/decode it replaces).
+
+Segment layout:
+    segment header  magic '4s', version B, slots I, slot_size Q, generation Q
+                    (padded to 64 bytes)
+    slot i          seq Q, height I, width I, channels I, nbytes Q (padded to 64 bytes)
+                    followed by slot_size bytes of frame data
+
+A slot's seq is zeroed while it is being written and set last, so a reader can
+tell whether the frame it was told about is still the one in the slot. The
+generation changes every time a segment is (re)created, so readers holding a
+mapping of a previous incarnation reattach instead of reading stale data.
+
+This module is duplicated in both services; keep the copies identical.
+"""
+import hashlib
+import logging
+import struct
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+RING_MAGIC = b'VFRB'
+RING_VERSION = 1
+
+_RING_HEADER = struct.Struct('!4sBIQQ')
+_SLOT_HEADER = struct.Struct('QIIIQ')
+RING_HEADER_SIZE = 64
+SLOT_HEADER_SIZE = 64
+
+
+def segment_name_for_camera(camera_name):
+    """Nome estável (e curto o bastante para o POSIX) do segmento de uma câmera."""
+    digest = hashlib.sha1(camera_name.encode('utf-8')).hexdigest()[:16]
+    return f"vf_{digest}"
+
+
+def _untrack(shm):
+    # Quem só se anexa ao segmento não é o dono dele: sem isso o resource_tracker
+    # do Python o removeria quando este processo terminasse.
+    try:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    except Exception:
+        pass
+
+
+class SharedFrameRing:
+    """
+    Ring buffer de frames brutos de uma câmera (lado da ingestão, escritor único).
+    """
+    def __init__(self, camera_name, slots=8, max_frame_bytes=1920 * 1080 * 3):
+        self.camera_name = camera_name
+        self.slots = slots
+        self.slot_size = max_frame_bytes
+        self.name = segment_name_for_camera(camera_name)
+        self.sequence = 0
+        self.generation = time.time_ns()
+
+        total_size = RING_HEADER_SIZE + slots * (SLOT_HEADER_SIZE + max_frame_bytes)
+        try:
+            # Segmento remanescente de uma execução anterior que não foi encerrada corretamente
+            stale = shared_memory.SharedMemory(name=self.name)
+            stale.close()
+            stale.unlink()
+        except FileNotFoundError:
+            pass
+
+        self.shm = shared_memory.SharedMemory(name=self.name, create=True, size=total_size)
+        _RING_HEADER.pack_into(self.shm.buf, 0, RING_MAGIC, RING_VERSION, slots,
+                               max_frame_bytes, self.generation)
+        logging.info(f"Shared frame ring '{self.name}' created for {camera_name} "
+                     f"({slots} slots x {max_frame_bytes} bytes)")
+
+    def _slot_offset(self, slot):
+        return RING_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + self.slot_size)
+
+    def write(self, frame):
+        """
+        Copia o frame para o próximo slot do ring.
+
+        :return: descritor (dict) a ser enviado pelo broker, ou None se o frame
+                 não couber em um slot.
+        """
+        if frame.dtype != np.uint8 or frame.nbytes > self.slot_size:
+            return None
+
+        self.sequence += 1
+        slot = self.sequence % self.slots
+        offset = self._slot_offset(slot)
+        height, width = frame.shape[:2]
+        channels = frame.shape[2] if frame.ndim == 3 else 1
+
+        # Invalida o slot enquanto os dados são sobrescritos
+        _SLOT_HEADER.pack_into(self.shm.buf, offset, 0, 0, 0, 0, 0)
+        data_offset = offset + SLOT_HEADER_SIZE
+        target = np.ndarray(frame.shape, dtype=np.uint8, buffer=self.shm.buf, offset=data_offset)
+        np.copyto(target, frame)
+        _SLOT_HEADER.pack_into(self.shm.buf, offset, self.sequence, height, width, channels, frame.nbytes)
+
+        return {
+            'segment': self.name,
+            'generation': self.generation,
+            'slot': slot,
+            'seq': self.sequence,
+            'shape': list(frame.shape),
+        }
+
+    def close(self):
+        try:
+            self.shm.close()
+            self.shm.unlink()
+        except FileNotFoundError:
+            pass
+        logging.info(f"Shared frame ring '{self.name}' released for {self.camera_name}")
+
+
+class SharedFrameReader:
+    """
+    Lê frames publicados por SharedFrameRing (lado do processamento).
+    Mantém os segmentos anexados em cache entre frames.
+    """
+    def __init__(self):
+        self.segments = {}
+
+    def _attach(self, segment_name):
+        entry = self.segments.get(segment_name)
+        if entry is None:
+            shm = shared_memory.SharedMemory(name=segment_name)
+            _untrack(shm)
+            magic, version, slots, slot_size, generation = _RING_HEADER.unpack_from(shm.buf, 0)
+            if magic != RING_MAGIC or version > RING_VERSION:
+                shm.close()
+                raise ValueError(f"Segmento '{segment_name}' não é um ring de frames válido")
+            entry = (shm, slots, slot_size, generation)
+            self.segments[segment_name] = entry
+        return entry
+
+    def _detach(self, segment_name):
+        entry = self.segments.pop(segment_name, None)
+        if entry:
+            try:
+                entry[0].close()
+            except BufferError:
+                # Ainda existem views vivas sobre o buffer; o GC fecha depois
+                pass
+
+    def _slot_offset(self, slot, slot_size):
+        return RING_HEADER_SIZE + slot * (SLOT_HEADER_SIZE + slot_size)
+
+    def read(self, descriptor):
+        """
+        Retorna uma view numpy sobre o slot do frame descrito, ou None se o slot já
+        foi sobrescrito ou o segmento não existe. A view não é estável: o escritor
+        pode reutilizar o slot a qualquer momento. O consumidor deve copiá-la de
+        imediato e confirmar com is_current() após a cópia (ver frame-processing main.py).
+        """
+        segment_name = descriptor['segment']
+        try:
+            shm, slots, slot_size, generation = self._attach(segment_name)
+            if generation != descriptor['generation']:
+                # O escritor recriou o segmento desde que nos anexamos
+                self._detach(segment_name)
+                shm, slots, slot_size, generation = self._attach(segment_name)
+        except (FileNotFoundError, ValueError) as e:
+            logging.warning(f"Não foi possível anexar ao segmento '{segment_name}': {e}")
+            return None
+
+        slot = descriptor['slot']
+        if generation != descriptor['generation'] or slot >= slots:
+            return None
+
+        offset = self._slot_offset(slot, slot_size)
+        seq, height, width, channels, nbytes = _SLOT_HEADER.unpack_from(shm.buf, offset)
+        if seq != descriptor['seq']:
+            return None
+
+        shape = (height, width, channels) if channels > 1 else (height, width)
+        return np.ndarray(shape, dtype=np.uint8, buffer=shm.buf, offset=offset + SLOT_HEADER_SIZE)
+
+    def is_current(self, descriptor):
+        """Indica se o slot ainda contém o frame descrito (não foi sobrescrito)."""
+        entry = self.segments.get(descriptor['segment'])
+        if entry is None or entry[3] != descriptor['generation']:
+            return False
+        shm, _, slot_size, _ = entry
+        seq = _SLOT_HEADER.unpack_from(shm.buf, self._slot_offset(descriptor['slot'], slot_size))[0]
+        return seq == descriptor['seq']
@@ -0,0 +1,196 @@
+import sys
+import time
+import queue
+import logging
+import threading
+import pika
+import requests
+
+logger = logging.getLogger(__name__)
+
+# Chave do recurso RabbitMQ em SideEffectContext.touched (as conexões de banco usam a URL)
+RABBIT_RESOURCE = 'rabbitmq'
+
+
+def is_transient(error):
+    """
+    Indica se a falha de um job pode passar numa nova tentativa: erros de conexão
+    e timeouts (HTTP, RabbitMQ, banco), HTTP 5xx/429 e psycopg2.OperationalError.
+    Erros permanentes (HTTP 4xx, credenciais inválidas, violação de constraint)
+    não são repetidos.
+    """
+    if isinstance(error, requests.exceptions.HTTPError):
+        status = error.response.status_code if error.response is not None else None
+        return status is None or status >= 500 or status == 429
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          pika.exceptions.AMQPConnectionError, ConnectionError, TimeoutError)):
+        return True
+    # psycopg2 só é importado por db_connection(): se não foi, o erro não veio do banco
+    psycopg2 = sys.modules.get('psycopg2')
+    return psycopg2 is not None and isinstance(error, psycopg2.OperationalError)
+
+
+class SideEffectContext:
+    """
+    Recursos de I/O de uma thread do dispatcher: conexões abertas sob demanda e
+    reaproveitadas entre jobs (conexões pika e psycopg2 não devem ser
+    compartilhadas entre threads).
+    """
+    def __init__(self, rabbit_connection_params=None):
+        self.rabbit_connection_params = rabbit_connection_params
+        self.rabbit_connection = None
+        self.rabbit_channel_ = None
+        self.db_connections = {}
+        self.touched = set()  # recursos usados pelo job em execução
+
+    def begin_job(self):
+        self.touched = set()
+
+    def rabbit_channel(self):
+        if self.rabbit_connection_params is None:
+            raise RuntimeError("RabbitMQ connection parameters not configured for side effects")
+        self.touched.add(RABBIT_RESOURCE)
+        if self.rabbit_connection is None or self.rabbit_connection.is_closed:
+            self.rabbit_connection = pika.BlockingConnection(self.rabbit_connection_params)
+            self.rabbit_channel_ = self.rabbit_connection.channel()
+        elif self.rabbit_channel_ is None or self.rabbit_channel_.is_closed:
+            # Canal fechado pelo broker (ex.: erro de protocolo) com a conexão ainda viva
+            self.rabbit_channel_ = self.rabbit_connection.channel()
+        return self.rabbit_channel_
+
+    def db_connection(self, db_url):
+        import psycopg2
+        self.touched.add(db_url)
+        conn = self.db_connections.get(db_url)
+        if conn is None or conn.closed:
+            conn = psycopg2.connect(db_url)
+            self.db_connections[db_url] = conn
+        return conn
+
+    def reset(self, resources=None):
+        """
+        Descarta conexões após uma falha; o próximo job que precisar delas abre novas.
+
+        :param resources: recursos a descartar (URLs de banco e/ou RABBIT_RESOURCE);
+                          None descarta todos.
+        """
+        for db_url in list(self.db_connections):
+            if resources is not None and db_url not in resources:
+                continue
+            try:
+                self.db_connections.pop(db_url).close()
+            except Exception:
+                pass
+        if resources is not None and RABBIT_RESOURCE not in resources:
+            return
+        if self.rabbit_connection is not None:
+            try:
+                if self.rabbit_connection.is_open:
+                    self.rabbit_connection.close()
+            except Exception:
+                pass
+        self.rabbit_connection = None
+        self.rabbit_channel_ = None
+
+
+class SideEffectDispatcher:
+    """
+    Executa efeitos colaterais dos nós (notificações, gravação de eventos e mídia)
+    fora da thread do frame, para que a latência do pipeline não dependa de I/O
+    externo.
+
+    Os jobs vão para uma fila limitada consumida por threads worker; com a fila
+    cheia o job é descartado e contado. Um job que falha por erro transitório
+    (ver is_transient) é repetido com backoff exponencial até `max_retries`
+    vezes, e só as conexões que ele usou são descartadas; erros permanentes
+    contam como falha na hora. Com `workers=0` os jobs rodam na própria thread
+    de quem os envia (sem fila nem repetição).
+
+    Um job é uma função `job(context, *args)`, onde `context` é o
+    SideEffectContext da thread que o executa.
+    """
+    def __init__(self, rabbit_connection_params=None, workers=4, max_queue=1000, max_retries=3, retry_backoff=1.0):
+        self.rabbit_connection_params = rabbit_connection_params
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.stats_by_kind = {}
+
+        for index in range(workers):
+            threading.Thread(target=self._worker_loop, name=f"side-effects-{index}", daemon=True).start()
+
+    def _context(self):
+        context = getattr(self.local, 'context', None)
+        if context is None:
+            context = self.local.context = SideEffectContext(self.rabbit_connection_params)
+        return context
+
+    def _count(self, kind, key):
+        with self.lock:
+            stats = self.stats_by_kind.setdefault(
+                kind, {'submitted': 0, 'completed': 0, 'retried': 0, 'failed': 0, 'dropped': 0}
+            )
+            stats[key] += 1
+
+    def submit(self, kind, job, *args):
+        """
+        Enfileira `job(context, *args)`. `kind` agrupa as estatísticas (ex.: 'telegram').
+
+        :return: False se o job foi descartado porque a fila está cheia.
+        """
+        self._count(kind, 'submitted')
+        if self.workers == 0:
+            self._run(kind, job, args, attempt=0, retry=False)
+            return True
+        return self._enqueue((kind, job, args, 0))
+
+    def _enqueue(self, item):
+        try:
+            self.jobs.put_nowait(item)
+            return True
+        except queue.Full:
+            self._count(item[0], 'dropped')
+            logger.warning(f"Side-effect queue full; dropping '{item[0]}' job")
+            return False
+
+    def _worker_loop(self):
+        while True:
+            kind, job, args, attempt = self.jobs.get()
+            self._run(kind, job, args, attempt)
+
+    def _run(self, kind, job, args, attempt, retry=True):
+        context = self._context()
+        context.begin_job()
+        try:
+            job(context, *args)
+            self._count(kind, 'completed')
+        except Exception as e:
+            transient = is_transient(e)
+            if transient:
+                # Só a conexão que o job usava pode ter caído; as demais da thread seguem
+                context.reset(context.touched)
+            if retry and transient and attempt < self.max_retries:
+                delay = self.retry_backoff * (2 ** attempt)
+                self._count(kind, 'retried')
+                logger.warning(f"Side effect '{kind}' failed ({e}); retrying in {delay:.1f}s")
+                # O worker não fica preso esperando o backoff
+                timer = threading.Timer(delay, self._enqueue, args=((kind, job, args, attempt + 1),))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._count(kind, 'failed')
+                if not transient:
+                    reason = " with a non-retryable error"
+                else:
+                    reason = f" after {attempt} retries" if retry else ""
+                logger.error(f"Side effect '{kind}' failed{reason}: {e}")
+
+    def stats(self):
+        """ Contadores por tipo de job e profundidade atual da fila. """
+        with self.lock:
+            stats = {kind: dict(counters) for kind, counters in self.stats_by_kind.items()}
+        stats['queue_depth'] = self.jobs.qsize()
+        return stats
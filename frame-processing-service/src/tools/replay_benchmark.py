@@ -0,0 +1,262 @@
+"""
+Offline replay benchmark for the processing pipeline.
+
+Feeds a video file or a directory of images, together with a pipeline graph,
+straight into PipelineExecutor - no docker-compose stack, cameras, API gateway
+or RabbitMQ - as fast as the pipeline allows, and reports per-node and total
+latency percentiles, throughput and peak memory.
+
+Run from frame-processing-service/src (the container's /app):
+
+    python -m tools.replay_benchmark --video clip.mp4 --graph pipeline.json
+    python -m tools.replay_benchmark --frames ./frames --graph pipeline.json \\
+        --max-frames 500 --warmup 20 --json results.json
+
+`--graph` accepts a `graph_data` object ({"nodes": [...], "edges": [...]}), a
+pipeline as returned by the API ({"id": ..., "graph_data": {...}}) or a list of
+pipelines, which then all run on the same camera like in production.
+
+Frame timestamps are synthetic (`--fps` apart, or the video's own rate), so
+time-based nodes see the clip's pace rather than the replay speed.
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import time
+
+import cv2
+
+from pipeline_executor import PipelineExecutor
+from side_effects import SideEffectDispatcher
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+PERCENTILES = (50, 95, 99)
+
+
+class RecordingSideEffects:
+    """
+    In-process stand-in for SideEffectDispatcher: counts the jobs the nodes
+    submit (Telegram messages, event inserts...) without running them.
+    """
+    def __init__(self):
+        self.submitted = {}
+
+    def submit(self, kind, job, *args):
+        self.submitted[kind] = self.submitted.get(kind, 0) + 1
+        return True
+
+    def stats(self):
+        stats = {kind: {'submitted': count} for kind, count in self.submitted.items()}
+        stats['queue_depth'] = 0
+        return stats
+
+
+def load_pipelines(path):
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict) and 'nodes' in data:
+        data = {'graph_data': data}
+    pipelines = data if isinstance(data, list) else [data]
+    for index, pipeline in enumerate(pipelines, start=1):
+        pipeline.setdefault('id', index)
+        pipeline.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    return pipelines
+
+
+def iter_frames(args):
+    """Yields decoded frames from the video or image directory, honouring --loop and --max-frames."""
+    produced = 0
+    for _ in range(args.loop):
+        if args.video:
+            capture = cv2.VideoCapture(args.video)
+            if not capture.isOpened():
+                raise SystemExit(f"Could not open video '{args.video}'")
+            try:
+                while True:
+                    ok, frame = capture.read()
+                    if not ok:
+                        break
+                    yield frame
+                    produced += 1
+                    if args.max_frames and produced >= args.max_frames:
+                        return
+            finally:
+                capture.release()
+        else:
+            names = sorted(name for name in os.listdir(args.frames) if name.lower().endswith(IMAGE_EXTENSIONS))
+            if not names:
+                raise SystemExit(f"No images found in '{args.frames}'")
+            for name in names:
+                frame = cv2.imread(os.path.join(args.frames, name), cv2.IMREAD_COLOR)
+                if frame is None:
+                    logging.warning(f"Skipping unreadable image '{name}'")
+                    continue
+                yield frame
+                produced += 1
+                if args.max_frames and produced >= args.max_frames:
+                    return
+
+
+def source_fps(args):
+    if args.fps:
+        return args.fps
+    if args.video:
+        capture = cv2.VideoCapture(args.video)
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        capture.release()
+        if fps and fps > 0:
+            return fps
+    return 15.0
+
+
+def percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    mean = sum(ordered) / len(ordered)
+    summary = {'count': len(ordered), 'mean_ms': mean * 1000, 'max_ms': ordered[-1] * 1000,
+               'throughput_fps': (1 / mean) if mean > 0 else float('inf')}
+    for pct in PERCENTILES:
+        summary[f'p{pct}_ms'] = percentile(ordered, pct) * 1000
+    return summary
+
+
+def peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run(args):
+    pipelines = load_pipelines(args.graph)
+    for pipeline in pipelines:
+        pipeline['camera_name'] = args.camera
+
+    if args.side_effects == 'inline':
+        # Real jobs (events DB, Telegram...) executed synchronously on the frame thread
+        side_effects = SideEffectDispatcher(workers=0)
+    else:
+        side_effects = RecordingSideEffects()
+    executor = PipelineExecutor(None, static_pipelines={args.camera: pipelines}, side_effects=side_effects)
+
+    fps = source_fps(args)
+    base_timestamp = time.time()
+    rss_start = peak_rss_mb()
+    spans = {}  # span -> [seconds]
+    frame_times, decode_times = [], []
+    processed = 0
+
+    frames = iter_frames(args)
+    wall_start = None
+    index = 0
+    while True:
+        decode_start = time.perf_counter()
+        frame = next(frames, None)
+        if frame is None:
+            break
+        decode_seconds = time.perf_counter() - decode_start
+
+        frame_metadata = {
+            'camera_name': args.camera,
+            'timestamp': base_timestamp + index / fps,
+            'sequence': index,
+            'frame_shape': frame.shape,
+            'frame_id': f"replay:{index}",
+            'stages': {'captured': base_timestamp + index / fps},
+        }
+        trace = []
+        start = time.perf_counter()
+        executor.execute(frame, args.camera, frame_metadata, trace)
+        elapsed = time.perf_counter() - start
+        index += 1
+
+        if index <= args.warmup:
+            # Model loading, CUDA/cuDNN autotuning and tracker start-up stay out of the numbers
+            continue
+        if wall_start is None:
+            wall_start = start
+        processed += 1
+        frame_times.append(elapsed)
+        decode_times.append(decode_seconds)
+        for name, seconds in trace:
+            spans.setdefault(name, []).append(seconds)
+
+    if not processed:
+        raise SystemExit("No frames were processed after warm-up")
+    wall_seconds = time.perf_counter() - wall_start
+
+    report = {
+        'frames': processed,
+        'warmup_frames': args.warmup,
+        'wall_seconds': wall_seconds,
+        'throughput_fps': processed / wall_seconds,
+        'pipeline': summarize(frame_times),
+        'decode': summarize(decode_times),
+        'nodes': {name: summarize(samples) for name, samples in spans.items()},
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - rss_start,
+        'side_effects': side_effects.stats(),
+        'pipelines': [{'id': pipeline['id'], 'name': pipeline.get('name')} for pipeline in pipelines],
+    }
+    return report
+
+
+def print_report(report):
+    header = f"{'span':<48} {'count':>7} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'fps':>9}"
+    print(header)
+    print('-' * len(header))
+
+    def row(name, summary):
+        print(f"{name:<48} {summary['count']:>7} {summary['mean_ms']:>9.2f} {summary['p50_ms']:>9.2f} "
+              f"{summary['p95_ms']:>9.2f} {summary['p99_ms']:>9.2f} {summary['max_ms']:>9.2f} "
+              f"{summary['throughput_fps']:>9.1f}")
+
+    row('decode (source)', report['decode'])
+    for name, summary in report['nodes'].items():
+        row(name, summary)
+    row('pipeline (all nodes)', report['pipeline'])
+    print()
+    print(f"Frames: {report['frames']} (+{report['warmup_frames']} warm-up), "
+          f"wall time: {report['wall_seconds']:.2f}s, throughput: {report['throughput_fps']:.1f} fps")
+    print(f"Peak RSS: {report['peak_rss_mb']:.0f} MB (+{report['rss_growth_mb']:.0f} MB during the run)")
+    print(f"Side effects (including warm-up): {report['side_effects']}")
+    print("Latencies in ms; fps = 1000 / mean (capacity of that span alone).")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay a video or frame directory through a pipeline graph.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--video', help="Video file to replay")
+    source.add_argument('--frames', help="Directory of images, replayed in name order")
+    parser.add_argument('--graph', required=True, help="graph_data / pipeline / list of pipelines (JSON)")
+    parser.add_argument('--camera', default='replay', help="Camera name given to the pipelines")
+    parser.add_argument('--max-frames', type=int, default=0, help="Stop after this many frames (0 = all)")
+    parser.add_argument('--loop', type=int, default=1, help="Replay the source this many times")
+    parser.add_argument('--warmup', type=int, default=10, help="Leading frames excluded from the statistics")
+    parser.add_argument('--fps', type=float, default=0, help="Synthetic frame rate (default: video rate or 15)")
+    parser.add_argument('--side-effects', choices=('stub', 'inline'), default='stub',
+                        help="'stub' counts sink/notification jobs without running them; "
+                             "'inline' runs them for real")
+    parser.add_argument('--json', help="Also write the report to this file")
+    parser.add_argument('--verbose', action='store_true', help="Log the executor's INFO messages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -21,11 +21,11 @@ import torch.nn.functional as F
 from collections import OrderedDict, deque
 from scipy.spatial.distance import cdist
 from filterpy.kalman import KalmanFilter
-import time
 import logging
 import math
 from typing import List, Tuple, Dict, Optional
 from enum import Enum
+from frame_clock import WALL_CLOCK
 
 class TrackState(Enum):
     """Estados do track baseados no DeepSORT original"""
@@ -97,7 +97,10 @@ class KalmanBoxTracker:
     """
     count = 0
     
-    def __init__(self, bbox, feature_vector=None):
+    def __init__(self, bbox, feature_vector=None, clock=WALL_CLOCK):
+        # Relógio do frame (timestamp de captura) usado no loitering e nos eventos de zona
+        self.clock = clock
+
         # Dimensões do estado: [cx, cy, s, h, dcx, dcy, dh]
         self.kf = KalmanFilter(dim_x=7, dim_z=4)
         
@@ -147,7 +150,7 @@ class KalmanBoxTracker:
         # Loitering detection
         self.positions_history = deque(maxlen=30)  # 30 frames de histórico
         self.loitering_start_time = None
-        self.last_significant_movement = time.time()
+        self.last_significant_movement = self.clock.now()
         
         # Trajectory analysis
         self.trajectory = []
@@ -177,10 +180,10 @@ class KalmanBoxTracker:
         
         # Check movimento significativo
         if self._has_moved_significantly():
-            self.last_significant_movement = time.time()
+            self.last_significant_movement = self.clock.now()
             self.loitering_start_time = None
         elif self.loitering_start_time is None:
-            self.loitering_start_time = time.time()
+            self.loitering_start_time = self.clock.now()
         
         # Atualizar trajetória
         self.trajectory.append(center)
@@ -214,7 +217,7 @@ class KalmanBoxTracker:
         """Verifica se está loitering"""
         if self.loitering_start_time is None:
             return False
-        return (time.time() - self.loitering_start_time) > threshold_seconds
+        return (self.clock.now() - self.loitering_start_time) > threshold_seconds
     
     def _convert_bbox_to_z(self, bbox):
         """Converte bbox [x1,y1,x2,y2] para estado kalman [cx,cy,s,h]"""
@@ -353,14 +356,14 @@ class KalmanBoxTracker:
                     events.append({
                         'type': ZoneEvent.ENTER.value,
                         'zone_id': zone_id,
-                        'timestamp': time.time(),
+                        'timestamp': self.clock.now(),
                         'position': current_pos
                     })
                 elif was_inside and not is_inside:
                     events.append({
                         'type': ZoneEvent.EXIT.value,
                         'zone_id': zone_id,
-                        'timestamp': time.time(),
+                        'timestamp': self.clock.now(),
                         'position': current_pos
                     })
                 elif is_inside:
@@ -371,7 +374,7 @@ class KalmanBoxTracker:
                             'type': ZoneEvent.DWELL.value,
                             'zone_id': zone_id,
                             'duration': dwell_time,
-                            'timestamp': time.time(),
+                            'timestamp': self.clock.now(),
                             'position': current_pos
                         })
         
@@ -403,7 +406,9 @@ class DeepSORTTracker:
     Combina Kalman Filter + Re-identificação por aparência
     """
     
-    def __init__(self, max_disappeared=30, max_age=50, min_hits=3, iou_threshold=0.3, feature_threshold=0.6):
+    def __init__(self, max_disappeared=30, max_age=50, min_hits=3, iou_threshold=0.3, feature_threshold=0.6,
+                 clock=WALL_CLOCK):
+        self.clock = clock
         self.max_disappeared = max_disappeared
         self.max_age = max_age
         self.min_hits = min_hits
@@ -452,7 +457,7 @@ class DeepSORTTracker:
         # Criar novos trackers para detecções não matched
         for det_idx in unmatched_dets:
             feature_vec = features[det_idx] if features else None
-            tracker = KalmanBoxTracker(detections[det_idx]['box'], feature_vec)
+            tracker = KalmanBoxTracker(detections[det_idx]['box'], feature_vec, self.clock)
             self.trackers.append(tracker)
         
         # Remover trackers mortos
@@ -640,8 +645,9 @@ class AdvancedLoiteringDetector:
     Muito mais robusto que o CentroidTracker original
     """
     
-    def __init__(self, loitering_threshold=15, movement_threshold=30):
-        self.tracker = DeepSORTTracker()
+    def __init__(self, loitering_threshold=15, movement_threshold=30, clock=WALL_CLOCK):
+        self.clock = clock
+        self.tracker = DeepSORTTracker(clock=clock)
         self.loitering_threshold = loitering_threshold
         self.movement_threshold = movement_threshold
         
@@ -686,7 +692,7 @@ class AdvancedLoiteringDetector:
         
         for tracker in self.tracker.trackers:
             if tracker.is_loitering(self.loitering_threshold) and tracker.time_since_update < 1:
-                duration = time.time() - tracker.loitering_start_time if tracker.loitering_start_time else 0
+                duration = self.clock.now() - tracker.loitering_start_time if tracker.loitering_start_time else 0
                 confidence_level = "HIGH" if duration > self.loitering_threshold * 1.5 else "MEDIUM"
                 
                 loitering_info[tracker.id] = {
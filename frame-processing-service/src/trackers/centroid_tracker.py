@@ -1,9 +1,10 @@
 from collections import OrderedDict
 import numpy as np
-import time
+from frame_clock import WALL_CLOCK
 
 class CentroidTracker:
-    def __init__(self, max_disappeared=50, loitering_time_threshold=10):
+    def __init__(self, max_disappeared=50, loitering_time_threshold=10, clock=WALL_CLOCK):
+        self.clock = clock
         self.next_object_id = 0
         self.objects = OrderedDict()
         self.disappeared = OrderedDict()
@@ -17,7 +18,7 @@ class CentroidTracker:
         self.objects[self.next_object_id] = centroid
         self.disappeared[self.next_object_id] = 0
         self.loitering_info[self.next_object_id] = {
-            'start_time': time.time(),
+            'start_time': self.clock.now(),
             'positions': [centroid]
         }
         self.next_object_id += 1
@@ -70,7 +71,7 @@ class CentroidTracker:
                     self.loitering_start_time[object_id] = None
                 # Se não se moveu e não estava a vadiar, inicia o cronómetro
                 elif self.loitering_start_time[object_id] is None:
-                    self.loitering_start_time[object_id] = time.time()
+                    self.loitering_start_time[object_id] = self.clock.now()
                     
                 used_rows.add(row)
                 used_cols.add(col)
@@ -101,7 +102,7 @@ class CentroidTracker:
     def get_loitering_alerts(self, time_threshold_seconds: int) -> list:
         """Retorna uma lista de IDs de objetos que estão a vadiar."""
         loitering_ids = []
-        current_time = time.time()
+        current_time = self.clock.now()
         for object_id, start_time in self.loitering_start_time.items():
             if start_time is not None:
                 duration = current_time - start_time
@@ -9,6 +9,7 @@ import numpy as np
 from typing import Dict, List, Optional, Union
 from .centroid_tracker import CentroidTracker
 from .advanced_tracker import DeepSORTTracker, AdvancedLoiteringDetector
+from frame_clock import WALL_CLOCK
 
 class HybridTracker:
     """
@@ -20,18 +21,22 @@ class HybridTracker:
                  use_advanced=True, 
                  fallback_on_error=True,
                  max_disappeared=30,
-                 loitering_threshold=15):
+                 loitering_threshold=15,
+                 clock=WALL_CLOCK):
         """
         Args:
             use_advanced: Se True, tenta usar DeepSORT; se False, usa CentroidTracker
             fallback_on_error: Se True, faz fallback para CentroidTracker em caso de erro
             max_disappeared: Máximo de frames que um objeto pode desaparecer
             loitering_threshold: Threshold em segundos para detecção de loitering
+            clock: Relógio (now()) usado nos tempos de loitering; o executor passa o
+                   relógio de frame da câmera, guiado pelo timestamp de captura
         """
         self.use_advanced = use_advanced
         self.fallback_on_error = fallback_on_error
         self.max_disappeared = max_disappeared
         self.loitering_threshold = loitering_threshold
+        self.clock = clock
         
         # Estado atual do tracker
         self.current_tracker_type = None
@@ -67,7 +72,8 @@ class HybridTracker:
         """Inicializa DeepSORT tracker"""
         try:
             self.tracker = AdvancedLoiteringDetector(
-                loitering_threshold=self.loitering_threshold
+                loitering_threshold=self.loitering_threshold,
+                clock=self.clock
             )
             self.current_tracker_type = 'deepsort'
             self.stats['current_mode'] = 'advanced'
@@ -80,7 +86,8 @@ class HybridTracker:
         """Inicializa CentroidTracker (fallback)"""
         self.tracker = CentroidTracker(
             max_disappeared=self.max_disappeared,
-            loitering_time_threshold=self.loitering_threshold
+            loitering_time_threshold=self.loitering_threshold,
+            clock=self.clock
         )
         self.current_tracker_type = 'centroid'
         self.stats['current_mode'] = 'fallback'
@@ -243,12 +250,13 @@ class TrackerFactory:
     """
     
     @staticmethod
-    def create_tracker(config: Dict) -> Union[HybridTracker, CentroidTracker, AdvancedLoiteringDetector]:
+    def create_tracker(config: Dict, clock=WALL_CLOCK) -> Union[HybridTracker, CentroidTracker, AdvancedLoiteringDetector]:
         """
         Cria tracker baseado na configuração
         
         Args:
             config: Dicionário com configurações do tracker
+            clock: Relógio usado nos tempos de loitering (padrão: relógio de parede)
         
         Returns:
             Instância do tracker apropriado
@@ -260,23 +268,26 @@ class TrackerFactory:
                 use_advanced=config.get('use_advanced', True),
                 fallback_on_error=config.get('fallback_on_error', True),
                 max_disappeared=config.get('max_disappeared', 30),
-                loitering_threshold=config.get('loitering_threshold', 15)
+                loitering_threshold=config.get('loitering_threshold', 15),
+                clock=clock
             )
         
         elif tracker_type == 'deepsort':
             return AdvancedLoiteringDetector(
-                loitering_threshold=config.get('loitering_threshold', 15)
+                loitering_threshold=config.get('loitering_threshold', 15),
+                clock=clock
             )
         
         elif tracker_type == 'centroid':
             return CentroidTracker(
                 max_disappeared=config.get('max_disappeared', 50),
-                loitering_time_threshold=config.get('loitering_threshold', 10)
+                loitering_time_threshold=config.get('loitering_threshold', 10),
+                clock=clock
             )
         
         else:
             logging.warning(f"Tipo de tracker desconhecido: {tracker_type}. Usando hybrid.")
-            return TrackerFactory.create_tracker({'type': 'hybrid'})
+            return TrackerFactory.create_tracker({'type': 'hybrid'}, clock)
 
 # Função de conveniência para retrocompatibilidade
 def create_compatible_tracker(use_advanced=True, **kwargs):